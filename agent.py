@@ -1,46 +1,47 @@
-from google.adk.agents import Agent,LoopAgent,BaseAgent,LlmAgent
-from google.adk.sessions import DatabaseSessionService, Session
-from google.adk.runners import Runner
-from google.adk.events import Event, EventActions
-from google.adk.sessions import VertexAiSessionService
+from google.adk.agents import Agent,LoopAgent,LlmAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.models import LlmResponse, LlmRequest
+from google.adk.tools.tool_context import ToolContext
 
 from pydantic import BaseModel # Or from wherever ADK makes it accessible
 from typing import Optional
 from google.genai import types 
-from langchain_community.tools import DuckDuckGoSearchRun
-from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
-import vertexai  
-
-import vertexai.agent_engines
 
 import requests
 import json
-import datetime
 import time
+from datetime import datetime, timezone
 import os
-import uuid # For generating unique IDs or for user_id if not available elsewhere
-from toolbox_core import ToolboxClient
-from .test_pg_vector_openai import generate_combined_embedding
+from .test_pg_vector_openai import generate_combined_embeddings, generate_text_embedding, embedding_cache_stats
+from . import http_client
+from . import lazy_clients
+from . import vm_fleet
+from . import remote_agents
+from . import cpu_utilization
+from .interaction_log import InteractionLogger
+from .toolbox_loader import ToolsetLoader
+from .ttl_cache import TTLCache
+from .response_cache import ResponseCache
+from .fast_path import FastPathRouter
+from .singleflight import AsyncSingleFlight, SingleFlight
 import asyncio # <-- Add this import
+import inspect
+import logging
+import math
+from . import instrumentation
 
-#from toolbox_langchain import ToolboxClient
+# Heavy SDKs (vertexai, toolbox_core, openai) are not imported here. They are
+# created on first use through lazy_clients, which keeps cold start small.
+# Track regressions with: python -m <agent_package>.benchmarks.bench_import_time
 
 load_dotenv()
 
-# Initialize Vertex AI SDK - This is crucial for ReasoningEngine to work
-if os.getenv("GOOGLE_PROJECT_ID") and os.getenv("GOOGLE_ZONE"):
-    # Reasoning Engines are regional, so we extract the region from the zone
-    # e.g., 'us-central1-a' -> 'us-central1'
-    google_region = "-".join(os.getenv("GOOGLE_ZONE").split("-")[:-1])
-    vertexai.init(
-        project=os.getenv("GOOGLE_PROJECT_ID"), location=google_region
-    )
-    print(f"Vertex AI initialized for project '{os.getenv('GOOGLE_PROJECT_ID')}' in region '{google_region}'")
-else:
-    print("Skipping Vertex AI initialization. GOOGLE_PROJECT_ID and/or GOOGLE_ZONE not set in .env file.")
+# Verbose diagnostics (payloads, per-callback chatter) are DEBUG and cost
+# nothing unless enabled with AGENT_LOG_LEVEL=DEBUG. Tool, callback, embedding
+# and MCP insert latencies are recorded by instrumentation.py.
+logger = logging.getLogger(__name__)
+logging.getLogger(__package__).setLevel(os.getenv("AGENT_LOG_LEVEL", "INFO").upper())
 
 GOOGLE_PROJECT_ID=os.getenv("GOOGLE_PROJECT_ID")
 GOOGLE_ZONE=os.getenv("GOOGLE_ZONE")
@@ -49,6 +50,8 @@ GOOGLE_GENAI_USE_VERTEXAI=os.getenv("GOOGLE_GENAI_USE_VERTEXAI")
 REMOTE_CPU_AGENT_RESOURCE_NAME=os.getenv("REMOTE_CPU_AGENT_RESOURCE_NAME")
 
 # --- 1. Define Constants ---
+# USER_ID and the session ids below are the single-user defaults. serving.py
+# runs many users at once, each with their own user and session id.
 APP_NAME = "agent_comparison_app"
 USER_ID = "Robin Varghese"
 BASE_SESSION_ID_TOOL_AGENT = "session_tool_agent_xyz"
@@ -60,22 +63,105 @@ MODEL_NAME = "gemini-2.0-flash"
 class EmptyEventContent(BaseModel):
     pass
 
-# Define at module scope so they are accessible in callbacks
-my_tools = None
-useraction_insert_mcptool = None
+# MCP logging toolset. The ToolboxClient and its aiohttp session are bound to
+# an event loop, so both are created on the interaction logger's loop, where
+# the toolset is preloaded in the background and every insert runs.
+def _create_toolbox_session():
+    import aiohttp
+    connector = aiohttp.TCPConnector(
+        limit=int(os.getenv("MCP_TOOLBOX_POOL_SIZE", "16")),
+        keepalive_timeout=float(os.getenv("MCP_TOOLBOX_KEEPALIVE_SECONDS", "60")),
+    )
+    return aiohttp.ClientSession(connector=connector)
 
-#load the MCP based toolset
-# This will load all tools
-# --- MODIFIED: ToolboxClient Setup ---
+def _create_toolbox_client():
+    from toolbox_core import ToolboxClient
+    return ToolboxClient(os.getenv("MCP_TOOLBOX_URL"), session=lazy_clients.get("toolbox_session"))
 
-client = ToolboxClient(os.getenv("MCP_TOOLBOX_URL"))
-# Define global variables to hold the loaded tools
-my_tools = None
-useraction_insert_mcptool = None
+async def _close_toolbox_client():
+    # ToolboxClient.close leaves a session it was given open, so close ours too.
+    if lazy_clients.is_created("toolbox") and hasattr(lazy_clients.get("toolbox"), "close"):
+        await lazy_clients.get("toolbox").close()
+    if lazy_clients.is_created("toolbox_session"):
+        await lazy_clients.get("toolbox_session").close()
+
+lazy_clients.register("toolbox_session", _create_toolbox_session)
+lazy_clients.register("toolbox", _create_toolbox_client)
+useraction_insert_mcptool = os.getenv("LOGGING_TOOL_NAME")
 
 
 #*************************START: TOOLS Section**************************************
 
+# Cache of /list_vms responses keyed by (project_id, zone). Entries are dropped
+# as soon as a delete in that project/zone succeeds, so a cached listing never
+# shows a VM that this agent has deleted.
+vm_list_cache = TTLCache(
+    maxsize=int(os.getenv("VM_LIST_CACHE_MAXSIZE", "256")),
+    ttl_seconds=float(os.getenv("VM_LIST_CACHE_TTL_SECONDS", "60")),
+)
+
+# Concurrent identical /list_vms loads and remote CPU agent queries (from
+# several sessions, or several tool calls in one turn) share one in-flight
+# request. Disable with REQUEST_COALESCING_ENABLED=false.
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() in ("1", "true", "yes")
+list_vms_flight = SingleFlight(enabled=REQUEST_COALESCING_ENABLED)
+cpu_agent_flight = AsyncSingleFlight(enabled=REQUEST_COALESCING_ENABLED)
+
+# Monthly costs and projected savings come from an offline price snapshot
+# (pricing.py, PRICE_CATALOG_PATH) at the PRICE_COMMITMENT level ("none",
+# "1yr" or "3yr"). Loaded on first use; pricing never makes a network call.
+PRICE_COMMITMENT = os.getenv("PRICE_COMMITMENT", "none")
+
+def _create_price_catalog():
+    from .pricing import DEFAULT_CATALOG_PATH, PriceCatalog
+    return PriceCatalog.from_file(os.getenv("PRICE_CATALOG_PATH") or DEFAULT_CATALOG_PATH)
+
+lazy_clients.register("price_catalog", _create_price_catalog)
+
+def _price_catalog():
+    """Returns the price catalog, or None when the snapshot cannot be loaded."""
+    try:
+        return lazy_clients.get("price_catalog")
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Price catalog unavailable, costs are omitted: %s", e)
+        return None
+
+async def _zone_machine_types(project_id: str, zone: str) -> Optional[dict]:
+    """{instance_id: machine_type} from the (cached) zone listing, or None if it failed."""
+    inventory = await asyncio.to_thread(vm_fleet.collect_inventory, [project_id], [zone], _list_vms)
+    if inventory["failures"]:
+        return None
+    return {row[2]: row[5] for row in inventory["rows"]}
+
+async def _estimate_savings(project_id: str, zone: str, candidates: list, machine_types: dict = None) -> dict:
+    """Adds machine_type, monthly_cost and monthly_savings to each candidate.
+
+    Machine types come from ``machine_types`` or the (cached) zone listing.
+    Returns the savings summary, or {} when there is nothing to price.
+    """
+    if not candidates:
+        return {}
+    catalog = await asyncio.to_thread(_price_catalog)
+    if catalog is None:
+        return {}
+    if machine_types is None:
+        machine_types = await _zone_machine_types(project_id, zone) or {}
+    return catalog.annotate_plan(candidates, machine_types, PRICE_COMMITMENT)
+
+def _delete_vm(project_id: str, instance_id: str, zone: str):
+    """Calls the /delete_vms endpoint and returns its JSON. Raises on any error."""
+    data = {'instance_id': instance_id, 'project_id': project_id, 'zone': zone}
+    # Pooled keep-alive client; raises HTTPError for bad responses (4xx or 5xx)
+    response = http_client.post_json("delete_vms", data)
+    result = response.json()
+    vm_list_cache.invalidate((project_id, zone))
+    list_vms_flight.forget((project_id, zone))
+    response_cache.clear()
+    if lazy_clients.is_created("cpu_timeseries"):
+        lazy_clients.get("cpu_timeseries").drop_instance(project_id, zone, instance_id)
+    return result
+
+@instrumentation.traced("tool")
 def delete_vm_instance(project_id: str, instance_id: str, zone: str):
     """Deletes a VM instance using the /delete_vms endpoint.
 
@@ -83,89 +169,153 @@ def delete_vm_instance(project_id: str, instance_id: str, zone: str):
         project_id: The Google Cloud project ID.
         instance_id: The ID of the instance to delete.
         zone: The zone where the instance is located.
-        service_url: The URL of the Cloud Run service.
 
     Returns:
         The JSON response from the API, or None if an error occurs.
     """
-    print(f" I am inside delete_vm_instances")
-    headers = {'Content-Type': 'application/json'}
-    data = {'instance_id': instance_id, 'project_id': project_id, 'zone': zone}
-    url = f"https://agent-tools-912533822336.us-central1.run.app/delete_vms"
-
+    logger.debug("delete_vm_instance project_id=%s zone=%s instance_id=%s", project_id, zone, instance_id)
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        return response.json()
+        return _delete_vm(project_id, instance_id, zone)
     except requests.exceptions.RequestException as e:
-        print(f"Error deleting instance: {e}")
+        logger.error("Error deleting instance: %s", e)
         return None
 
+@instrumentation.traced("tool")
+def batch_delete_vm_instances(instances: list[dict]):
+    """Deletes many VM instances in one call, issuing the deletes concurrently.
+
+    Args:
+        instances: A list of objects, each with "project_id", "zone" and
+            "instance_id" keys, one per VM to delete.
+
+    Returns:
+        A JSON summary with "requested", "deleted", "failed", "invalid" and
+        "duplicates" (repeated instances, deleted only once) counts and a
+        "results" list holding the status of every distinct instance, in the
+        order they were given.
+    """
+    logger.debug("batch_delete_vm_instances for %d instances", len(instances or []))
+    summary = vm_fleet.batch_delete(instances, _delete_vm)
+    logger.info("batch_delete_vm_instances: %d deleted, %d failed, %d invalid",
+                summary['deleted'], summary['failed'], summary['invalid'])
+    return summary
+
+def _list_vms(project_id: str, zone: str):
+    """Returns the /list_vms JSON for a project and zone, served from
+    vm_list_cache when fresh. Raises on any error; errors are never cached."""
+    def fetch():
+        data = {'project_id': project_id, 'zone': zone}
+        # Pooled keep-alive client; raises HTTPError for bad responses (4xx or 5xx)
+        response = http_client.post_json("list_vms", data)
+        return response.json()
+
+    key = (project_id, zone)
+    return vm_list_cache.get_or_load(key, lambda: list_vms_flight.do(key, fetch))
+
+def vm_list_cache_stats():
+    """Returns hit/miss/eviction counters of the list_vm_instances cache."""
+    return vm_list_cache.stats()
+
+def coalescing_stats() -> dict:
+    """Returns how many list/CPU calls joined an identical call already in flight."""
+    return {"list_vms": list_vms_flight.stats(), "cpu_agent": cpu_agent_flight.stats()}
+
+@instrumentation.traced("tool")
 def list_vm_instances(project_id: str, zone: str):
     """Lists VM instances based on domain, project ID, and zone using the /list_vms endpoint.
 
     Args:
         project_id: The Google Cloud project ID.
         zone: The zone where the instances are located.
-        service_url: The URL of the Cloud Run service.
 
     Returns:
-        The JSON response from the API, or None if an error occurs.
+        The JSON response from the API, in its original shape, with
+        "monthly_cost" added per instance (and a "cost_summary" when the
+        response is an object), or None if an error occurs.
     """
-    print(f" I am inside list_vm_instances 'project_id': {project_id}, 'zone': {zone}")
-    headers = {'Content-Type': 'application/json'}
-    data = {'project_id': project_id, 'zone': zone}
-    url = f"https://agent-tools-912533822336.us-central1.run.app/list_vms"
-
+    logger.debug("list_vm_instances project_id=%s zone=%s", project_id, zone)
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        return response.json()
+        listing = _list_vms(project_id, zone)
     except requests.exceptions.RequestException as e:
-        print(f"Error listing instances: {e}")
+        logger.error("Error listing instances: %s", e)
         return None
+    catalog = _price_catalog()
+    return catalog.annotate_listing(listing, zone, PRICE_COMMITMENT) if catalog else listing
+
+@instrumentation.traced("tool")
+def list_vm_inventory(project_ids: list[str], zones: list[str]):
+    """Lists VM instances across many projects and zones in a single call.
+
+    Args:
+        project_ids: The Google Cloud project IDs to scan.
+        zones: The zones to scan. Pass ["all"] to scan every configured zone.
+
+    Returns:
+        A JSON table with "columns" and "rows" (one row per VM, including its
+        "monthly_cost"), the "total" count, a "cost_summary", and "failures"
+        listing any project/zone that could not be read.
+    """
+    logger.debug("list_vm_inventory project_ids=%s zones=%s", project_ids, zones)
+    inventory = vm_fleet.collect_inventory(project_ids, zones, _list_vms)
+    logger.info("list_vm_inventory: %d VMs from %d zones, %d failures",
+                inventory['total'], inventory['zones_scanned'], len(inventory['failures']))
+    catalog = _price_catalog()
+    return catalog.annotate_inventory(inventory, PRICE_COMMITMENT) if catalog else inventory
+
+# Answers from the search agent are cached by query meaning: an exact match on
+# the normalised query first, then embedding similarity above
+# SEARCH_CACHE_THRESHOLD (default 0.97, for text-embedding-ada-002; see
+# semantic_cache.py for calibrating it to another EMBEDDING_MODEL). Built on
+# first use (it pulls in NumPy).
+def _create_search_cache():
+    from .semantic_cache import SemanticCache
+    return SemanticCache(
+        embed_fn=generate_text_embedding,
+        threshold=float(os.getenv("SEARCH_CACHE_THRESHOLD", "0.97")),
+        ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "86400")),
+        maxsize=int(os.getenv("SEARCH_CACHE_MAXSIZE", "512")),
+    )
+
+lazy_clients.register("search_cache", _create_search_cache)
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
 
 # Create a DuckDuckGo search tool
+@instrumentation.traced("tool")
 def search_tool(query: str):
     # --- Configuration ---
-    # The URL of your deployed Cloud Run service endpoint
-    # Ensure it includes the specific path (/search)
-    CLOUD_RUN_URL = "https://ddsearchlangcagent-qcdyf5u6mq-uc.a.run.app/search"
+    # The URL of your deployed Cloud Run service endpoint (SEARCH_AGENT_URL)
+    # and its timeout (SEARCH_TIMEOUT) live in http_client's endpoint table.
+    CLOUD_RUN_URL = http_client.get_client().endpoint("search").url
 
     # The query you want to send to the agent
     #search_query = "What are the latest developments in AI regulation in Europe?"
 
-    # Optional: If your agent uses chat history, prepare it
-    # This should match the structure expected by your format_chat_history helper
-    chat_history_example = [
-        {"role": "user", "content": "Tell me about large language models."},
-        {"role": "assistant", "content": "Large language models are advanced AI systems..."}
-    ]
-
     # --- Prepare the Request ---
     # This structure MUST match the Pydantic model `SearchRequest` in your FastAPI app
     payload = {
         "query": query,
-        # Uncomment and include if your agent uses history:
-        # "chat_history": chat_history_example
+        # If your agent uses chat history, add it here in the structure your
+        # format_chat_history helper expects, e.g.
+        # "chat_history": [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
     }
 
-    # Set the headers for sending JSON data
-    headers = {
-        "Content-Type": "application/json"
-    }
+    # --- Check the semantic cache before calling the search agent ---
+    if SEARCH_CACHE_ENABLED:
+        cached = lazy_clients.get("search_cache").lookup(query)
+        if cached is not None:
+            result_data, match = cached
+            logger.info("[search_tool] Cache %s hit (similarity %s) for: %s", match['kind'], match['similarity'], match['query'])
+            return result_data
 
     # --- Make the API Call ---
-    print(f"Sending POST request to: {CLOUD_RUN_URL}")
-    print(f"Payload: {json.dumps(payload, indent=2)}") # Log the payload being sent
+    logger.debug("Sending POST request to: %s", CLOUD_RUN_URL)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Payload: %s", json.dumps(payload, indent=2)) # Log the payload being sent
 
     try:
-        # Send the POST request
-        response = requests.post(CLOUD_RUN_URL, headers=headers, json=payload, timeout=120) # Set a reasonable timeout (in seconds)
-
-        # --- Handle the Response ---
-        # Check if the request was successful (status code 2xx)
-        response.raise_for_status() # This will raise an HTTPError for bad responses (4xx or 5xx)
+        # Send the POST request over the shared pooled client. It applies the
+        # endpoint's timeout and raises an HTTPError for bad responses (4xx or 5xx)
+        response = http_client.post_json("search", payload)
 
         # Parse the JSON response from the server
         result_data = response.json() # This should match the `SearchResponse` model
@@ -173,117 +323,463 @@ def search_tool(query: str):
         # Extract the result
         #agent_response = result_data.get("result", "No 'result' field found in response.")
 
-        print("\n--- Agent Response ---")
-        print(result_data)
+        logger.debug("--- Agent Response ---\n%s", result_data)
+        if SEARCH_CACHE_ENABLED and result_data:
+            lazy_clients.get("search_cache").store(query, result_data)
         return result_data
 
     except requests.exceptions.Timeout:
-        print(f"Error: The request to {CLOUD_RUN_URL} timed out.")
+        logger.error("The request to %s timed out.", CLOUD_RUN_URL)
     except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred: {http_err}")
-        print(f"Status Code: {response.status_code}")
-        # Try to print the error detail from the server response if available
+        response = http_err.response
+        logger.error("HTTP error occurred: %s (status %s)", http_err, response.status_code)
+        # Try to log the error detail from the server response if available
         try:
             error_detail = response.json()
-            print(f"Server Error Detail: {error_detail}")
+            logger.error("Server Error Detail: %s", error_detail)
         except json.JSONDecodeError:
-            print(f"Server Response (non-JSON): {response.text}")
+            logger.error("Server Response (non-JSON): %s", response.text)
     except requests.exceptions.RequestException as req_err:
         # Catch other potential errors like connection errors, etc.
-        print(f"An error occurred during the request: {req_err}")
+        logger.error("An error occurred during the request: %s", req_err)
     except json.JSONDecodeError:
-        print("Error: Failed to decode the JSON response from the server.")
-        print(f"Response Text: {response.text}") # Print raw text if JSON decoding fails
+        logger.error("Failed to decode the JSON response from the server. Response Text: %s", response.text)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("An unexpected error occurred: %s", e)
+
+def remote_call_stats() -> dict:
+    """Returns retry/hedge/circuit-breaker counters for the Cloud Run endpoints."""
+    return http_client.resilience_stats()
+
+# The remote CPU agent is reached through remote_agents, which caches the
+# Agent Engine handle per resource name and streams the reply natively async
+# (or on its own bounded executor when only stream_query is available).
+async def _query_cpu_agent(query: str) -> str:
+    """Asks the remote CPU agent; identical concurrent queries share one remote run."""
+    return await cpu_agent_flight.do(
+        query, lambda: remote_agents.query_text(query, REMOTE_CPU_AGENT_RESOURCE_NAME))
+
+# CPU samples are kept per VM in a local time-series store (cpu_timeseries.py,
+# in memory, or persisted to CPU_TIMESERIES_PATH when it is set). Built on
+# first use. A zone refreshed less than CPU_TIMESERIES_REFRESH_SECONDS ago is
+# answered locally.
+#   latest values  (call_cpu_utilization_agent, get_cpu_utilization_records,
+#                  filter_vms_by_cpu) come from a snapshot query that returns
+#                  one value per VM.
+#   history        (get_cpu_utilization_window, recommend_rightsizing) is
+#                  backfilled for CPU_HISTORY_DAYS (or the longer window a tool
+#                  asks for) at CPU_SAMPLE_MINUTES steps, coarser if the window
+#                  would not fit the per-VM capacity. Later refreshes fetch only
+#                  the samples since the last one. Each range is requested in
+#                  CPU_HISTORY_CHUNK_HOURS pieces, at most
+#                  CPU_HISTORY_CONCURRENCY at a time, so no single remote reply
+#                  has to hold days of samples for the whole zone.
+CPU_HISTORY_DAYS = float(os.getenv("CPU_HISTORY_DAYS", "7"))
+CPU_SAMPLE_MINUTES = float(os.getenv("CPU_SAMPLE_MINUTES", "15"))
+CPU_HISTORY_CHUNK_HOURS = float(os.getenv("CPU_HISTORY_CHUNK_HOURS", "24"))
+CPU_HISTORY_CONCURRENCY = int(os.getenv("CPU_HISTORY_CONCURRENCY", "4"))
+
+def _create_cpu_timeseries():
+    from .cpu_timeseries import CpuTimeSeriesStore
+    return CpuTimeSeriesStore(
+        path=os.getenv("CPU_TIMESERIES_PATH") or None,
+        capacity=int(os.getenv("CPU_TIMESERIES_CAPACITY", "2048")),
+        refresh_interval=float(os.getenv("CPU_TIMESERIES_REFRESH_SECONDS", "300")),
+    )
+
+lazy_clients.register("cpu_timeseries", _create_cpu_timeseries)
+cpu_refresh_flight = AsyncSingleFlight(enabled=REQUEST_COALESCING_ENABLED)
 
-# Add this new helper function
-# In your local orchestrator's agent.py file
-# In your local orchestrator's agent.py file
-def _get_streamed_response_sync(query: str, resource_name: str) -> str:
+def _utc_iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+# Every store call runs on a worker thread: the store's lock may be held by a
+# save or a NumPy reduction, and the event loop must not wait for either.
+def _history_covers(store, project_id: str, zone: str, history_seconds: float, now: float) -> bool:
+    history_from, _ = store.history(project_id, zone)
+    return history_from is not None and history_from <= now - history_seconds
+
+def _plan_cpu_refresh(store, project_id: str, zone: str, history_seconds: float, now: float):
+    """``(since, step_seconds, full)`` of the history the zone needs, or None if it is fresh enough."""
+    if not _history_covers(store, project_id, zone, history_seconds, now):
+        step_seconds = max(CPU_SAMPLE_MINUTES * 60.0, 60.0 * math.ceil(history_seconds / store.capacity / 60.0))
+        return now - history_seconds, step_seconds, True
+    if store.history_needs_refresh(project_id, zone):
+        history_from, step_seconds = store.history(project_id, zone)
+        return store.history_to(project_id, zone) or history_from, step_seconds, False
+    return None
+
+async def _known_instance_ids(project_id: str, zone: str) -> set:
+    """Instance ids of the zone's (cached) listing; empty if it failed.
+
+    A prose reply's unlabelled numbers are only taken for ids that are listed.
     """
-    A synchronous helper that calls the agent and correctly parses the
-    streaming response dictionaries to build the final response string.
+    return set(await _zone_machine_types(project_id, zone) or ())
+
+async def _fetch_cpu_history(project_id: str, zone: str, since: float, until: float, step_seconds: float) -> list:
+    """Samples recorded in (since, until], fetched in CPU_HISTORY_CHUNK_HOURS ranges."""
+    chunk_seconds = max(step_seconds, step_seconds * math.floor(CPU_HISTORY_CHUNK_HOURS * 3600.0 / step_seconds))
+    bounds = [since + k * chunk_seconds for k in range(max(1, math.ceil((until - since) / chunk_seconds)))] + [until]
+    step_minutes = int(round(step_seconds / 60.0))
+    semaphore = asyncio.Semaphore(max(1, CPU_HISTORY_CONCURRENCY))
+    known_ids = await _known_instance_ids(project_id, zone)
+
+    async def fetch(start: float, end: float) -> list:
+        query = cpu_utilization.HISTORY_QUERY_TEMPLATE.format(
+            project_id=project_id, zone=zone, since=_utc_iso(start), until=_utc_iso(end), step_minutes=step_minutes)
+        async with semaphore:
+            reply = await _query_cpu_agent(query)
+        return await asyncio.to_thread(cpu_utilization.parse_cpu_utilization, reply, zone, known_ids)
+
+    chunks = await asyncio.gather(*(fetch(start, end) for start, end in zip(bounds, bounds[1:])))
+    return [record for chunk in chunks for record in chunk]
+
+async def _refresh_cpu_timeseries(project_id: str, zone: str, history_seconds: float):
+    """Backfills the zone's history window, or fetches its new samples unless it is fresh enough."""
+    store = await asyncio.to_thread(lazy_clients.get, "cpu_timeseries")
+    fetched_at = time.time()
+    plan = await asyncio.to_thread(_plan_cpu_refresh, store, project_id, zone, history_seconds, fetched_at)
+    if plan is None:
+        return store
+    since, step_seconds, full = plan
+    records = await _fetch_cpu_history(project_id, zone, since, fetched_at, step_seconds)
+    await asyncio.to_thread(store.append, project_id, zone, records, fetched_at, full,
+                            since if full else None, step_seconds if full else None)
+    await asyncio.to_thread(store.save)
+    return store
+
+async def _cpu_history(project_id: str, zone: str, days: float = None):
+    """Returns the CPU store once it holds at least ``days`` (default CPU_HISTORY_DAYS) of the zone's history."""
+    history_seconds = max(float(days or 0.0), CPU_HISTORY_DAYS) * 86400.0
+    refresh = lambda: _refresh_cpu_timeseries(project_id, zone, history_seconds)
+    store = await cpu_refresh_flight.do((project_id, zone), refresh)
+    if not await asyncio.to_thread(_history_covers, store, project_id, zone, history_seconds, time.time()):
+        # Joined a refresh for a shorter window; backfill the longer one now.
+        store = await cpu_refresh_flight.do((project_id, zone), refresh)
+    return store
+
+async def _refresh_cpu_snapshot(project_id: str, zone: str):
+    """Stores the current value of every VM in the zone unless the zone is fresh enough."""
+    store = await asyncio.to_thread(lazy_clients.get, "cpu_timeseries")
+    if not await asyncio.to_thread(store.needs_refresh, project_id, zone):
+        return store
+    fetched_at = time.time()
+    reply, known_ids = await asyncio.gather(
+        _query_cpu_agent(cpu_utilization.STRUCTURED_QUERY_TEMPLATE.format(project_id=project_id, zone=zone)),
+        _known_instance_ids(project_id, zone))
+    records = await asyncio.to_thread(cpu_utilization.parse_cpu_utilization, reply, zone, known_ids)
+    await asyncio.to_thread(store.set_current, project_id, zone, records, fetched_at)
+    await asyncio.to_thread(store.save)
+    return store
+
+async def _fetch_cpu_utilization_records(project_id: str, zone: str) -> list:
+    store = await cpu_refresh_flight.do(("snapshot", project_id, zone),
+                                        lambda: _refresh_cpu_snapshot(project_id, zone))
+    samples = await asyncio.to_thread(store.latest, project_id, zone)
+    return [cpu_utilization.CpuUtilizationRecord(**sample) for sample in samples]
+
+@instrumentation.traced("tool")
+async def call_cpu_utilization_agent(project_id: str, zone: str) -> str:
     """
-    print("Executing synchronous stream_query call in a new thread...")
+    Returns a readable CPU utilization report for all VMs in the given project
+    and zone, one line per VM. Answered from the local CPU store; the remote
+    agent is only asked when the zone's values are stale.
+    """
+    logger.debug("--> [Local Agent Tool] call_cpu_utilization_agent project_id=%s zone=%s", project_id, zone)
+    if not REMOTE_CPU_AGENT_RESOURCE_NAME:
+        return "Error: REMOTE_CPU_AGENT_RESOURCE_NAME is not set in the environment."
+
     try:
-        remote_agent = vertexai.agent_engines.get(resource_name)
-        stream = remote_agent.stream_query(
-            message=query,
-            user_id="local-orchestrator-agent"
-        )
-        
-        response_parts = []
-        
-        # Use a regular 'for' loop
-        for event in stream:
-            print(f"Received stream event: {event}")
-
-            # --- FINAL FIX: Correctly parse the 'content' dictionary ---
-            # Check if the 'content' key exists and is a dictionary
-            if isinstance(event.get("content"), dict):
-                content = event["content"]
-                # Check if 'parts' exists and is a list
-                if isinstance(content.get("parts"), list):
-                    for part in content["parts"]:
-                        # Check if the part is a dictionary and has a 'text' key
-                        if isinstance(part, dict) and "text" in part:
-                            text_chunk = part["text"]
-                            if text_chunk:
-                                print(f"Extracted text chunk: {text_chunk}")
-                                response_parts.append(text_chunk)
-        
-        final_response = "".join(response_parts).strip()
-        
-        # Check if we actually got a response before returning
-        if not final_response:
-             print("WARNING: No text parts found in any event from the stream.")
-             return "No text response could be parsed from the remote agent's stream."
-        
-        return final_response
+        records = await _fetch_cpu_utilization_records(project_id, zone)
+    except Exception as e:
+        logger.error("Error in async tool 'call_cpu_utilization_agent': %s", e)
+        return f"An unexpected error occurred in the async tool wrapper: {str(e)}"
+    if not records:
+        logger.warning("No CPU utilization records for %s/%s.", project_id, zone)
+        return "No CPU utilization data could be parsed from the remote agent's reply."
+    return "\n".join(
+        f"- Instance name: {r.name}, instance ID: {r.instance_id}, zone: {r.zone or zone}, "
+        f"CPU utilization: {r.cpu_percent}%"
+        for r in records
+    )
+
+def cpu_timeseries_stats() -> dict:
+    """Returns zone/VM/sample counts of the local CPU time-series store."""
+    if not lazy_clients.is_created("cpu_timeseries"):
+        return {}
+    return lazy_clients.get("cpu_timeseries").stats()
+
+@instrumentation.traced("tool")
+async def get_cpu_utilization_records(project_id: str, zone: str) -> dict:
+    """Returns typed CPU utilization records for all VMs in a project and zone.
+
+    Args:
+        project_id: The Google Cloud project ID.
+        zone: The zone where the instances are located.
 
+    Returns:
+        A JSON object with "records", each having "instance_id", "name",
+        "zone" and "cpu_percent", or an "error" message.
+    """
+    logger.debug("--> [Local Agent Tool] get_cpu_utilization_records project_id=%s zone=%s", project_id, zone)
+    if not REMOTE_CPU_AGENT_RESOURCE_NAME:
+        return {"error": "REMOTE_CPU_AGENT_RESOURCE_NAME is not set in the environment."}
+    try:
+        records = await _fetch_cpu_utilization_records(project_id, zone)
     except Exception as e:
-        print(f"Error inside synchronous stream helper: {e}")
-        import traceback
-        traceback.print_exc()
-        return f"Error during synchronous stream call: {str(e)}"
-# This is the new, correct implementation that mimics your working notebook
-# This tool remains an 'async def'
-async def call_cpu_utilization_agent(project_id: str, zone: str) -> str:
+        logger.error("Error in async tool 'get_cpu_utilization_records': %s", e)
+        return {"error": str(e)}
+    return {"project_id": project_id, "zone": zone, "records": [r.model_dump() for r in records]}
+
+@instrumentation.traced("tool")
+async def filter_vms_by_cpu(project_id: str, zone: str, cpu_below_percent: float) -> dict:
+    """Finds the VMs in a project and zone whose CPU utilization is below a threshold.
+
+    The utilization data is fetched and filtered locally; only the matching
+    VMs are returned, ready to pass to `batch_delete_vm_instances`. Every
+    candidate is checked against the zone's VM listing first, so an id the
+    report parser got wrong is never proposed for deletion.
+
+    Args:
+        project_id: The Google Cloud project ID.
+        zone: The zone where the instances are located.
+        cpu_below_percent: Return VMs whose CPU percentage is strictly below this value.
+
+    Returns:
+        A JSON object with "candidates" (project_id, zone, instance_id, name,
+        cpu_percent, machine_type, monthly_cost and monthly_savings per VM),
+        "candidate_count", "vms_checked", "unverified_ids" (ids below the
+        threshold that are not in the VM listing; never delete these) and
+        "savings" (projected monthly savings if all candidates are deleted),
+        or an "error".
     """
-    Asynchronously calls the remote Agent Engine agent by running the
-    synchronous stream iteration in a separate thread.
+    logger.debug("--> [Local Agent Tool] filter_vms_by_cpu project_id=%s zone=%s below %s%%", project_id, zone, cpu_below_percent)
+    if not REMOTE_CPU_AGENT_RESOURCE_NAME:
+        return {"error": "REMOTE_CPU_AGENT_RESOURCE_NAME is not set in the environment."}
+    try:
+        records = await _fetch_cpu_utilization_records(project_id, zone)
+    except Exception as e:
+        logger.error("Error in async tool 'filter_vms_by_cpu': %s", e)
+        return {"error": str(e)}
+    matches = cpu_utilization.filter_by_cpu(records, below=float(cpu_below_percent))
+    machine_types = await _zone_machine_types(project_id, zone) if matches else {}
+    if machine_types is None:
+        return {"error": f"Could not list the VMs in {project_id}/{zone} to verify the candidates; not proposing any."}
+    candidates = [
+        {"project_id": project_id, "zone": r.zone or zone, "instance_id": r.instance_id,
+         "name": r.name, "cpu_percent": r.cpu_percent}
+        for r in matches if r.instance_id in machine_types
+    ]
+    savings = await _estimate_savings(project_id, zone, candidates, machine_types)
+    return {
+        "vms_checked": len(records),
+        "candidate_count": len(candidates),
+        "candidates": candidates,
+        "unverified_ids": [r.instance_id for r in matches if r.instance_id not in machine_types],
+        "savings": savings,
+    }
+
+@instrumentation.traced("tool")
+async def get_cpu_utilization_window(project_id: str, zone: str, days: float) -> dict:
+    """Returns average, peak and minimum CPU utilization per VM over the last N days.
+
+    Answered from the local CPU history. The first call for a zone (or for a
+    longer window than is stored) backfills the whole window from the remote
+    agent; later calls fetch only the samples newer than the last stored one.
+
+    Args:
+        project_id: The Google Cloud project ID.
+        zone: The zone where the instances are located.
+        days: Length of the window in days, e.g. 7.
+
+    Returns:
+        A JSON object with "vms" (instance_id, name, zone, samples, coverage,
+        avg_cpu_percent, max_cpu_percent, min_cpu_percent per VM, idlest
+        first), "window_days", "low_coverage_vms" (VMs with samples for less
+        than half the window; their figures are not representative of it)
+        and "history_from" (oldest time the stored history covers), or an
+        "error".
     """
-    print(f"--> [Local Agent Tool] Calling remote agent via asyncio.to_thread")
+    logger.debug("--> [Local Agent Tool] get_cpu_utilization_window project_id=%s zone=%s days=%s", project_id, zone, days)
     if not REMOTE_CPU_AGENT_RESOURCE_NAME:
-        return "Error: REMOTE_CPU_AGENT_RESOURCE_NAME is not set in the environment."
-        
+        return {"error": "REMOTE_CPU_AGENT_RESOURCE_NAME is not set in the environment."}
     try:
-        query = f"What is the CPU utilization for all VMs in project {project_id} and zone {zone}?"
-        
-        # Run the synchronous helper function in a separate thread
-        final_response = await asyncio.to_thread(
-            _get_streamed_response_sync,
-            query,
-            REMOTE_CPU_AGENT_RESOURCE_NAME
-        )
-        
-        print(f"<-- [Remote Agent Final Response] {final_response}")
-        return final_response
+        store = await _cpu_history(project_id, zone, float(days))
+    except Exception as e:
+        logger.error("Error in async tool 'get_cpu_utilization_window': %s", e)
+        return {"error": str(e)}
+    vms = await asyncio.to_thread(store.window_stats, project_id, zone, float(days) * 86400.0)
+    history_from, _ = await asyncio.to_thread(store.history, project_id, zone)
+    return {
+        "project_id": project_id, "zone": zone, "window_days": days,
+        "history_from": _utc_iso(history_from) if history_from is not None else None,
+        "vm_count": len(vms),
+        "low_coverage_vms": sum(1 for vm in vms if vm["coverage"] is not None and vm["coverage"] < 0.5),
+        "vms": vms,
+    }
+
+# Rightsizing scores the zone's CPU history (from the local time-series store,
+# resampled to RIGHTSIZING_STEP_SECONDS steps) with rightsizing.py: percentiles,
+# idle ratio and consecutive low days decide delete / downsize / keep.
+RIGHTSIZING_STEP_SECONDS = float(os.getenv("RIGHTSIZING_STEP_SECONDS", "3600"))
+
+@instrumentation.traced("tool")
+async def recommend_rightsizing(project_id: str, zone: str, days: float) -> dict:
+    """Ranks the VMs in a project and zone as delete or downsize candidates from their CPU history.
+
+    Each VM is scored on p50/p95/p99 CPU, the share of idle samples and the
+    longest run of low-usage days over the window. Only the candidates are
+    returned, "delete" first, each group ordered by p95 CPU ascending.
+
+    Args:
+        project_id: The Google Cloud project ID.
+        zone: The zone where the instances are located.
+        days: Length of the history window in days, e.g. 30.
 
+    Returns:
+        A JSON object with a "warning" when some VMs have too little history
+        to be judged, "insufficient_data" (their count) and
+        "insufficient_data_vms" (instance_id, name, samples, coverage),
+        "counts" per action (VMs with insufficient data are not counted as
+        "keep"), "candidates" (project_id, zone, instance_id, name, action,
+        p50, p95, p99, idle_ratio, longest_low_streak, coverage, machine_type,
+        monthly_cost, monthly_savings and, for downsizes, downsize_to), and
+        "savings" (projected monthly savings of the whole plan), or an "error".
+    """
+    logger.debug("--> [Local Agent Tool] recommend_rightsizing project_id=%s zone=%s days=%s", project_id, zone, days)
+    if not REMOTE_CPU_AGENT_RESOURCE_NAME:
+        return {"error": "REMOTE_CPU_AGENT_RESOURCE_NAME is not set in the environment."}
+    from . import rightsizing
+    try:
+        store = await _cpu_history(project_id, zone, float(days))
     except Exception as e:
-        print(f"Error in async tool 'call_cpu_utilization_agent': {e}")
-        return f"An unexpected error occurred in the async tool wrapper: {str(e)}"
+        logger.error("Error in async tool 'recommend_rightsizing': %s", e)
+        return {"error": str(e)}
+    ids, names, matrix = await asyncio.to_thread(
+        store.matrix, project_id, zone, float(days) * 86400.0, RIGHTSIZING_STEP_SECONDS)
+    policy = rightsizing.RightsizingPolicy(window_samples=max(1, round(86400.0 / RIGHTSIZING_STEP_SECONDS)))
+    result = await asyncio.to_thread(rightsizing.analyze, ids, matrix, policy, 50, names)
+    for candidate in result["candidates"]:
+        candidate.update(project_id=project_id, zone=zone)
+    savings = await _estimate_savings(project_id, zone, result["candidates"])
+    warning = {}
+    if result["insufficient_data"]:
+        warning["warning"] = (
+            f"{result['insufficient_data']} of {result['vms_analyzed']} VMs have less than "
+            f"{policy.min_coverage:.0%} of the {days}-day window's samples. They were not evaluated "
+            "(see insufficient_data_vms); do not report them as keep.")
+    return {**warning, "project_id": project_id, "zone": zone, "window_days": days, **result, "savings": savings}
+
+# Past interactions are recalled by vector similarity, either from the pgvector
+# user-action table (HNSW index, queried through the MCP tool RECALL_TOOL_NAME)
+# or from an in-process ANN index fed by the interaction logger.
+RECALL_TOOL_NAME = os.getenv("RECALL_TOOL_NAME")
+INTERACTION_MEMORY_BACKEND = os.getenv("INTERACTION_MEMORY_BACKEND") or ("pgvector" if RECALL_TOOL_NAME else "local")
+
+def _create_interaction_memory():
+    from .interaction_memory import LocalInteractionMemory
+    return LocalInteractionMemory()
+
+lazy_clients.register("interaction_memory", _create_interaction_memory)
+
+async def _recall_from_pgvector(user_id: str, vector: list, top_k: int) -> list:
+    tools = await logging_toolset.get_tools()
+    response = _find_tool(tools, RECALL_TOOL_NAME)(user_id=user_id, query_vector=str(vector), top_k=top_k)
+    if inspect.isawaitable(response):
+        response = await response
+    return json.loads(response) if isinstance(response, str) else response
+
+@instrumentation.traced("tool")
+async def recall_similar_interactions(query: str, top_k: int, tool_context: ToolContext = None) -> dict:
+    """Fetches the current user's past actions and results most similar to a query.
+
+    Use it before re-running expensive analyses (e.g. CPU utilization checks)
+    to see whether a similar request was already answered.
+
+    Args:
+        query: What to look for, in natural language.
+        top_k: How many past interactions to return (1-20).
+        tool_context: Supplied by ADK; identifies the user whose history is searched.
+
+    Returns:
+        A JSON object with "matches", each holding "action", "result" and
+        "similarity", or an "error" message.
+    """
+    user_id = getattr(tool_context, "user_id", None) or USER_ID
+    top_k = max(1, min(int(top_k or 5), 20))
+    logger.debug("--> [Local Agent Tool] recall_similar_interactions top_k=%d backend=%s", top_k, INTERACTION_MEMORY_BACKEND)
+    vector = await asyncio.to_thread(generate_text_embedding, query)
+    if vector is None:
+        return {"error": "Could not embed the query."}
+    try:
+        if INTERACTION_MEMORY_BACKEND == "pgvector":
+            matches = await asyncio.wrap_future(interaction_logger.schedule(_recall_from_pgvector(user_id, vector, top_k)))
+        else:
+            memory = await asyncio.to_thread(lazy_clients.get, "interaction_memory")
+            matches = await asyncio.to_thread(memory.search, user_id, vector, top_k)
+    except Exception as e:
+        logger.error("Error in async tool 'recall_similar_interactions': %s", e)
+        return {"error": str(e)}
+    return {"matches": matches}
 
 # { ... your existing tools like delete_vm_instance, list_vm_instances, etc. ... }
 #*************************END: TOOLS Section**************************************
 #*************************START: Call BAck ***************************************
-def simple_before_model_modifier(
+INSTRUCTION_PREFIX = "[Modified by Callback] "
+_MAX_COMPILED_INSTRUCTIONS = 64
+# (agent_name, original instruction text) -> prefixed types.Content, built once
+# and reused on every later model call of that agent.
+_compiled_instructions = {}
+
+def _compile_system_instruction(agent_name: str, instruction) -> types.Content:
+    """Returns the prefixed system instruction as a cached types.Content.
+
+    The prefix is applied idempotently, so an instruction that already carries
+    it (e.g. a Content this function returned earlier) is never prefixed
+    again and the prompt cannot grow across turns.
+    """
+    if isinstance(instruction, types.Content):
+        # Already a Content (possibly ours): prefix its first text part in place, once.
+        if not instruction.parts:
+            instruction.parts = [types.Part(text="")]
+        first_text = instruction.parts[0].text or ""
+        if not first_text.startswith(INSTRUCTION_PREFIX):
+            instruction.parts[0].text = INSTRUCTION_PREFIX + first_text
+        return instruction
+
+    text = "" if instruction is None else str(instruction)
+    key = (agent_name, text)
+    compiled = _compiled_instructions.get(key)
+    if compiled is None:
+        prefixed = text if text.startswith(INSTRUCTION_PREFIX) else INSTRUCTION_PREFIX + text
+        compiled = types.Content(role="system", parts=[types.Part(text=prefixed)])
+        if len(_compiled_instructions) >= _MAX_COMPILED_INSTRUCTIONS:
+            # Instructions with per-session state templates vary; keep the newest.
+            _compiled_instructions.pop(next(iter(_compiled_instructions)))
+        _compiled_instructions[key] = compiled
+    return compiled
+
+# Model responses for repeated requests are served from memory (see
+# response_cache.py). Turns that call a side-effect tool are never cached.
+# RESPONSE_CACHE_SCOPE=turn also matches repeated questions inside a session.
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_MAXSIZE", "512")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300")),
+    side_effect_tools=("delete_vm_instance", "batch_delete_vm_instances"),
+    scope=os.getenv("RESPONSE_CACHE_SCOPE", "conversation"),
+)
+
+def response_cache_stats() -> dict:
+    """Returns hit/miss/bypass counters of the LLM response cache."""
+    return response_cache.stats()
+
+@instrumentation.traced("callback")
+async def simple_before_model_modifier(
     callback_context: CallbackContext, llm_request: LlmRequest
 ) -> Optional[LlmResponse]:
     """Inspects/modifies the LLM request or skips the call."""
     agent_name = callback_context.agent_name
-    print(f"[Callback] Before model call for agent: {agent_name}")
+    logger.debug("[Callback] Before model call for agent: %s", agent_name)
 
     # Inspect the last user message in the request contents
     last_user_message = ""
@@ -295,29 +791,19 @@ def simple_before_model_modifier(
                 last_user_message = last_content_item.parts[0].text
             # else: last_user_message_text remains ""
 
-    print(f"[Callback] Inspecting last user message: '{last_user_message}'")
+    logger.debug("[Callback] Inspecting last user message: '%s'", last_user_message)
 
     # --- Modification Example ---
-    # Add a prefix to the system instruction
-    original_instruction = llm_request.config.system_instruction or types.Content(role="system", parts=[])
-    prefix = "[Modified by Callback] "
-    # Ensure system_instruction is Content and parts list exists
-    if not isinstance(original_instruction, types.Content):
-         # Handle case where it might be a string (though config expects Content)
-         original_instruction = types.Content(role="system", parts=[types.Part(text=str(original_instruction))])
-    if not original_instruction.parts:
-        original_instruction.parts.append(types.Part(text="")) # Add an empty part if none exist
-
-    # Modify the text of the first part
-    modified_text = prefix + (original_instruction.parts[0].text or "")
-    original_instruction.parts[0].text = modified_text
-    llm_request.config.system_instruction = original_instruction
-    print(f"[Callback] Modified system instruction to: '{modified_text}'")
+    # Add a prefix to the system instruction (compiled once per agent, see below)
+    llm_request.config.system_instruction = _compile_system_instruction(
+        agent_name, llm_request.config.system_instruction
+    )
+    logger.debug("[Callback] System instruction prefixed (%d chars)", len(llm_request.config.system_instruction.parts[0].text or ''))
 
     # --- Skip Example ---
     # Check if the last user message contains "BLOCK"
     if "BLOCK" in last_user_message.upper():
-        print("[Callback] 'BLOCK' keyword found. Skipping LLM call.")
+        logger.info("[Callback] 'BLOCK' keyword found. Skipping LLM call.")
         # Return an LlmResponse to skip the actual LLM call
         return LlmResponse(
             content=types.Content(
@@ -325,102 +811,190 @@ def simple_before_model_modifier(
                 parts=[types.Part(text="LLM call was blocked by before_model_callback.")],
             )
         )
-    else:
-        print("[Callback] Proceeding with LLM call.")
-        # Return None to allow the (modified) request to go to the LLM
-        return None
+
+    # --- Cache Example ---
+    # A cached response skips the LLM call exactly like the BLOCK path above.
+    # Fingerprinting the request and copying a hit are CPU work, so they run
+    # on a worker thread instead of the event loop.
+    cached_response = None
+    if response_cache.enabled:
+        cached_response = await asyncio.to_thread(
+            response_cache.lookup, (callback_context.invocation_id, agent_name), llm_request)
+    if cached_response is not None:
+        logger.info("[Callback] Serving response from cache. Skipping LLM call.")
+        # The model never ran, so the after-model callback will not either.
+        await log_interaction_after_model(callback_context, cached_response)
+        return cached_response
+
+    logger.debug("[Callback] Proceeding with LLM call.")
+    # Return None to allow the (modified) request to go to the LLM
+    return None
     
 #*************************START: Call Back ***************************************
-# (Global initializations for client/my_tools, USER_ID, LOGGING_TOOL_NAME, generate_combined_embedding remain)
-# Ensure 'client' is your initialized ToolboxClient instance, not 'my_tools' for calling methods.
-# I've changed 'my_tools' back to 'client' in the logging check and call_tool.
+# Interaction logging runs on the interaction_logger worker (see
+# interaction_log.py). The after-model callback only enqueues a record; the
+# embedding and the MCP insert happen in batches off the model path.
+
+async def _load_logging_toolset():
+    logger.info("[Logging] Loading MCP toolset...")
+    return await lazy_clients.get("toolbox").load_toolset(os.getenv("TOOLSET_NAME_FOR_LOGGING"))
+
+async def _get_logging_tool():
+    """Returns the MCP insert tool, waiting for the background preload if it
+    has not finished yet."""
+    tools = await logging_toolset.get_tools()
+    return _find_tool(tools, useraction_insert_mcptool)
+
+def _find_tool(tools, tool_name: str):
+    # load_toolset returns a list of tools; older toolbox clients returned an
+    # object exposing each tool as an attribute.
+    py_tool_name = tool_name.replace("-", "_")
+    if isinstance(tools, (list, tuple)):
+        for tool in tools:
+            if getattr(tool, "__name__", None) in (tool_name, py_tool_name):
+                return tool
+        raise AttributeError(f"Tool '{tool_name}' not found in the loaded toolset.")
+    return getattr(tools, py_tool_name)
+
+def _embed_interactions(records: list) -> list:
+    # One bulk embeddings request per batch instead of one per record.
+    return generate_combined_embeddings([(r["user_id"], r["action"], r["result"]) for r in records])
+
+async def _insert_interactions(rows: list):
+    if INTERACTION_MEMORY_BACKEND == "local":
+        lazy_clients.get("interaction_memory").add(rows)
+    if not useraction_insert_mcptool:
+        return
+    tool_to_call = await _get_logging_tool()
 
-# Ensure 'toolbox_client' is defined and initialized at the module level as previously discussed
-# For example:
-# try:
-#     toolbox_client = ToolboxClient(os.getenv("MCP_TOOLBOX_URL"))
-#     toolbox_client.load_toolset(os.getenv("TOOLSET_NAME_FOR_LOGGING", "my_googleaiagent_toolset"))
-#     print("ToolboxClient initialized and toolset loaded.")
-# except Exception as e:
-#     print(f"CRITICAL: Failed to initialize ToolboxClient: {e}")
-#     toolbox_client = None
+    async def insert(row):
+        tool_params = {
+            "user_id": row["user_id"],
+            "action": row["action"],
+            "result": row["result"],
+            "vector_value": str(row["vector"])
+        }
+        with instrumentation.span("mcp_insert", useraction_insert_mcptool):
+            response = tool_to_call(**tool_params)
+            if inspect.isawaitable(response):
+                response = await response
+        return response
+
+    rows = [row for row in rows if row.get("vector") is not None]
+    responses = await asyncio.gather(*(insert(row) for row in rows), return_exceptions=True)
+    errors = [r for r in responses if isinstance(r, Exception)]
+    logger.info("[Logging] Inserted %d interaction rows, %d failed. Embedding cache hit rate: %.1f%%",
+                len(rows) - len(errors), len(errors), 100 * embedding_cache_stats()['hit_rate'])
+    if errors:
+        raise errors[0]
+
+interaction_logger = InteractionLogger(
+    embed_fn=_embed_interactions,
+    insert_fn=_insert_interactions,
+    max_queue=int(os.getenv("INTERACTION_LOG_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("INTERACTION_LOG_BATCH_SIZE", "32")),
+    flush_interval=float(os.getenv("INTERACTION_LOG_FLUSH_SECONDS", "2.0")),
+    # The toolbox client and its aiohttp session live on the logger's loop.
+    close_fn=_close_toolbox_client,
+)
 
+logging_toolset = ToolsetLoader(
+    load_fn=_load_logging_toolset,
+    schedule_fn=interaction_logger.schedule,
+    max_attempts=int(os.getenv("MCP_TOOLBOX_LOAD_ATTEMPTS", "5")),
+    initial_backoff=float(os.getenv("MCP_TOOLBOX_LOAD_BACKOFF_SECONDS", "1.0")),
+)
 
-# Find this function in your code and replace it completely with the following:
+def logging_toolset_status() -> dict:
+    """Readiness of the MCP logging toolset: state, attempts and last error."""
+    return logging_toolset.status()
 
-def log_interaction_after_model(
+def preload_logging_toolset():
+    """Starts loading the MCP logging toolset in the background. Never blocks."""
+    if (useraction_insert_mcptool or INTERACTION_MEMORY_BACKEND == "pgvector") and os.getenv("MCP_TOOLBOX_URL"):
+        logging_toolset.start()
+
+@instrumentation.traced("callback")
+async def log_interaction_after_model(
     callback_context: CallbackContext,
     llm_response: LlmResponse
 ) -> None:
     """
-    Logs the LLM response. On the first run, it will load the async toolset.
+    Queues the LLM interaction for logging. Never waits on the network.
     """
-    global my_tools, useraction_insert_mcptool
-    print("[Callback] After model call triggered.")
-
-    # --- NEW LAZY-LOADING LOGIC ---
-    # Check if the tools have been loaded. If not, load them now.
-    if my_tools is None:
-        print("[Callback] First run: Loading MCP toolset asynchronously...")
-        try:
-            # Use asyncio.run() to execute and wait for the async function
-            # from this synchronous context.
-            loaded_tools = asyncio.run(client.load_toolset(os.getenv("TOOLSET_NAME_FOR_LOGGING")))
-            
-            # This check is important because toolbox-core might return None on failure
-            if loaded_tools:
-                my_tools = loaded_tools
-                useraction_insert_mcptool = os.getenv("LOGGING_TOOL_NAME")
-                print(f"[Callback] MCP toolset loaded successfully: {my_tools}")
-            else:
-                # Use a sentinel value to indicate failure and prevent retries
-                print("[Callback] MCP toolset loading returned None. Disabling logging.")
-                my_tools = "FAILED_TO_LOAD" 
-        except Exception as e:
-            print(f"[Callback] CRITICAL ERROR loading MCP toolset: {e}")
-            my_tools = "FAILED_TO_LOAD" # Mark as failed to prevent retrying every time
-    
-    # If loading failed or hasn't succeeded, skip the rest of the function.
-    if not my_tools or my_tools == "FAILED_TO_LOAD" or not useraction_insert_mcptool:
-        print("[Callback] MCP Toolset not available. Skipping logging.")
+    logger.debug("[Callback] After model call triggered.")
+    if response_cache.enabled:
+        # The stored copy is a deep copy; make it off the event loop.
+        await asyncio.to_thread(response_cache.store,
+                                (callback_context.invocation_id, callback_context.agent_name), llm_response)
+    if not useraction_insert_mcptool and INTERACTION_MEMORY_BACKEND != "local":
+        logger.debug("[Callback] LOGGING_TOOL_NAME not set. Skipping logging.")
         return
 
-    # --- Your original logging logic can now proceed safely ---
-    try:
-        user_id_to_log = USER_ID
-        session_id_to_log = "unknown_session"
-        if hasattr(callback_context, 'invocation_context') and hasattr(callback_context.invocation_context, 'session_id'):
-            session_id_to_log = callback_context.invocation_context.session_id
-
-        # ... (Your logic to prepare action_json_string, result_json_string, vector_string) ...
-        # (This is just a placeholder for your actual logic which seems correct)
-        action_json_string = json.dumps({"agent": callback_context.agent_name})
-        result_json_string = json.dumps({"response": "..."})
-        vector_list = generate_combined_embedding(user_id_to_log, action_json_string, result_json_string)
-        vector_string = str(vector_list)
+    session_id_to_log = "unknown_session"
+    if getattr(callback_context, "session", None) is not None:
+        session_id_to_log = callback_context.session.id
+    elif hasattr(callback_context, 'invocation_context') and hasattr(callback_context.invocation_context, 'session_id'):
+        session_id_to_log = callback_context.invocation_context.session_id
+
+    # The action is what the user asked; the result is the model's text, or
+    # the tool calls it made when it answered with function calls.
+    response_parts = (llm_response.content.parts or []) if llm_response.content else []
+    result = {"response": "".join(part.text for part in response_parts if part.text)}
+    tool_calls = [{"name": part.function_call.name, "args": part.function_call.args or {}}
+                  for part in response_parts if part.function_call]
+    if tool_calls:
+        result["tool_calls"] = tool_calls
+    if llm_response.error_message:
+        result["error"] = llm_response.error_message
+    user_content = getattr(callback_context, "user_content", None)
+    record = {
+        "user_id": getattr(callback_context, "user_id", None) or USER_ID,
+        "session_id": session_id_to_log,
+        "action": json.dumps({
+            "agent": callback_context.agent_name,
+            "user_message": "".join(part.text for part in (user_content.parts or []) if part.text) if user_content else "",
+        }),
+        "result": json.dumps(result, default=str),
+    }
+    if not interaction_logger.submit(record):
+        logger.warning("[Callback] Logging queue is full. Interaction record dropped.")
 
-        tool_params = {
-            "user_id": user_id_to_log,
-            "action": action_json_string,
-            "result": result_json_string,
-            "vector_value": vector_string
-        }
-        
-        py_tool_name = useraction_insert_mcptool.replace("-", "_")
-        tool_to_call = getattr(my_tools, py_tool_name)
-        
-        # NOTE: If tool_to_call is ALSO async, you would need asyncio.run here too.
-        # Assuming it is a synchronous method on the loaded toolset object.
-        response = tool_to_call(**tool_params)
-        print(f"[Callback] MCP tool call response: {response}")
-
-    except AttributeError:
-        py_tool_name = useraction_insert_mcptool.replace("-", "_")
-        print(f"[Callback] Error: Tool '{py_tool_name}' not found in the loaded toolset object.")
-    except Exception as e:
-        print(f"[Callback] Error during logging execution: {e}")
-        import traceback
-        traceback.print_exc()
+
+# Fully specified "list VMs ..." / "CPU utilization ..." commands are answered
+# by calling the tool directly (see fast_path.py); anything else, and any tool
+# error, falls through to the model. Disable with FAST_PATH_ENABLED=false.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+fast_path_router = FastPathRouter(list_vm_instances, call_cpu_utilization_agent)
+
+def fast_path_stats() -> dict:
+    """Returns how many turns the fast-path router answered or handed to the model."""
+    return fast_path_router.stats()
+
+def instrumentation_summary() -> dict:
+    """Returns count, mean, p50/p95 and errors per traced tool, callback and I/O call."""
+    return instrumentation.summary()
+
+@instrumentation.traced("callback")
+async def fast_path_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """Answers well-formed commands without calling the model; None falls back to it."""
+    if not FAST_PATH_ENABLED or not llm_request.contents:
+        return None
+    # Only at the start of a turn, never while the model is mid tool-calling.
+    last_content_item = llm_request.contents[-1]
+    if last_content_item.role != 'user' or not last_content_item.parts or not last_content_item.parts[0].text:
+        return None
+
+    answer = await fast_path_router.route(last_content_item.parts[0].text)
+    if answer is None:
+        return None
+    logger.info("[Callback] Command answered by the fast-path router. Skipping LLM call.")
+    llm_response = LlmResponse(content=types.Content(role="model", parts=[types.Part(text=answer)]))
+    # The model never ran, so the after-model callback will not either.
+    await log_interaction_after_model(callback_context, llm_response)
+    return llm_response
 
 
 #**************************END: Call Back *****************************************
@@ -473,35 +1047,47 @@ root_agent = LlmAgent(
 
         **Core Capabilities:**
         - Greet the user with the `greeting_agent`.
-        - List running VMs using the `list_vm_instances` tool.
+        - List running VMs in one project and zone using the `list_vm_instances` tool. Listings, delete candidates and rightsizing plans include each VM's estimated `monthly_cost` and `monthly_savings`; quote them when reporting.
+        - List VMs across several projects and/or zones (or "all" zones) in ONE call using the `list_vm_inventory` tool. Prefer it over repeated `list_vm_instances` calls.
         - Delete a single VM using the `delete_vm_instance` tool.
-        - Delete multiple VMs using the `delete_multiple_ins_loop_agent`.
-        - Check CPU usage for all VMs in a zone using the `call_cpu_utilization_agent` tool.
+        - Delete multiple VMs in one call using the `batch_delete_vm_instances` tool.
+        - Check CPU usage for all VMs in a zone using the `call_cpu_utilization_agent` tool (readable report) or `get_cpu_utilization_records` (structured records).
+        - Find VMs below a CPU threshold using the `filter_vms_by_cpu` tool.
+        - Get average and peak CPU per VM over the last N days using the `get_cpu_utilization_window` tool. Always state each VM's `samples` and `coverage`; never present a VM with low coverage as a full-window average.
+        - Recommend which VMs to delete or downsize from their CPU history (percentiles, idle time, sustained low usage) using the `recommend_rightsizing` tool. Use it when the user asks what can be cleaned up or rightsized rather than giving a fixed CPU threshold. If the result has a `warning` or a non-zero `insufficient_data`, say so first and list those VMs as "not enough data"; never present them as "keep", and never read a low "keep" count as a verdict on the fleet.
         - Answer general finops questions using the `search_tool`.
+        - Recall similar past requests and their results using the `recall_similar_interactions` tool. Check it before re-running an expensive analysis the user may already have asked for.
 
         **IMPORTANT REASONING PROCESS for Deletion by CPU Utilization:**
         When a user asks you to delete VMs based on a condition like "CPU utilization below 30%", you MUST follow this multi-step process:
 
-        1.  **Step 1: Gather Data.** You DO NOT have a tool to directly filter VMs by CPU. Your first action MUST be to call the `call_cpu_utilization_agent` tool with the correct `project_id` and `zone` to get the list of all VMs and their current CPU usage.
-
-        2.  **Step 2: Analyze and Plan.** After you get the text output from `call_cpu_utilization_agent`, you must carefully read it. Parse the text to identify the `Instance ID` of every VM that meets the user's criteria (e.g., CPU percentage is less than 30). Create a list of these target Instance IDs. If no VMs meet the criteria, inform the user and stop.
+        1.  **Step 1: Find Candidates.** Call the `filter_vms_by_cpu` tool ONCE with the `project_id`, `zone` and the threshold (e.g. `cpu_below_percent=30`). It fetches the CPU usage and applies the threshold for you, and returns only the matching VMs as `candidates`. Do not filter the VMs yourself. If `candidate_count` is 0, inform the user and stop. Never delete an id from `unverified_ids`; mention them to the user as not found in the VM listing.
 
-        3.  **Step 3: Execute Deletion.** Based on the list of Instance IDs you created in Step 2:
-            - If your list contains EXACTLY ONE `Instance ID`, your next action is to call the `delete_vm_instance` tool for that single instance.
-            - If your list contains MORE THAN ONE `Instance ID`, your next action is to call the `delete_multiple_ins_loop_agent` sub-agent. When calling the loop agent, you must provide the necessary information for all target VMs.
+        2.  **Step 2: Execute Deletion.** Based on the `candidates` list:
+            - If it contains EXACTLY ONE VM, call the `delete_vm_instance` tool for that single instance.
+            - If it contains MORE THAN ONE VM, call the `batch_delete_vm_instances` tool ONCE, passing the `candidates` entries (each has `project_id`, `zone` and `instance_id`). Do not split the list into several calls.
 
-        4.  **Step 4: Report to User.** After the deletion tools have finished, provide a clear summary of which VMs were deleted to the user.
+        3.  **Step 3: Report to User.** After the deletion tools have finished, provide a clear summary of which VMs were deleted to the user, with each VM's `monthly_savings` and the total `projected_monthly_savings` from the candidates' `savings`.
         """
     ),
     tools=[
         delete_vm_instance, 
+        batch_delete_vm_instances,
         list_vm_instances, 
+        list_vm_inventory,
         search_tool, 
-        call_cpu_utilization_agent
+        call_cpu_utilization_agent,
+        get_cpu_utilization_records,
+        filter_vms_by_cpu,
+        get_cpu_utilization_window,
+        recommend_rightsizing,
+        recall_similar_interactions
     ],
-    sub_agents=[delete_multiple_ins_loop_agent, greeting_agent],
-    # Your callbacks remain the same
-    before_model_callback=simple_before_model_modifier,
+    # delete_multiple_ins_loop_agent is no longer attached: it cost one LLM turn
+    # per VM and stopped at max_iterations. batch_delete_vm_instances replaces it.
+    sub_agents=[greeting_agent],
+    # The fast-path router runs first; it returns None for anything it cannot answer.
+    before_model_callback=[fast_path_before_model, simple_before_model_modifier],
     after_model_callback=log_interaction_after_model
 )
 
@@ -516,3 +1102,14 @@ Initial_state = {
         My LinkedIn profile can be found at https://www.linkedin.com/in/robinkoikkara/
         """
 }
+
+# Load the MCP logging toolset in the background as soon as the agent starts,
+# so the first model response is neither delayed nor left unlogged.
+if os.getenv("MCP_TOOLBOX_PRELOAD", "true").lower() in ("1", "true", "yes"):
+    preload_logging_toolset()
+
+# Prometheus text exposition of the latency histograms on
+# http://127.0.0.1:$METRICS_PORT/metrics (see instrumentation.py).
+METRICS_PORT = os.getenv("METRICS_PORT")
+if METRICS_PORT:
+    instrumentation.start_metrics_server(int(METRICS_PORT))
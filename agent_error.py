@@ -1,5 +1,5 @@
 from google.adk.agents import Agent, LoopAgent, BaseAgent, LlmAgent
-from google.adk.sessions import DatabaseSessionService, Session
+from google.adk.sessions import Session
 from google.adk.runners import Runner
 from google.adk.events import Event, EventActions
 from google.adk.sessions import VertexAiSessionService
@@ -16,9 +16,11 @@ import requests
 import json
 import datetime
 import time
+import asyncio
 import os
 import uuid
 from .test_pg_vector_openai import generate_combined_embedding
+from .session_store import WriteBehindSqliteSessionService
 
 load_dotenv()
 
@@ -278,46 +280,58 @@ Initial_state = {
 }
 
 # Create a new session
-db_url = "sqlite:///./my_agent_data.db"
-session_service = DatabaseSessionService(db_url=db_url)
-session = session_service.create_session(
-    app_name=APP_NAME,
-    user_id=USER_ID,
-    session_id=current_session_id_tool_agent,
-    state={"user:login_count": 0, "task_status": "idle"}
-)
+# WAL SQLite with write-behind event batching (see session_store.py); a
+# separate file, since my_agent_data.db uses the DatabaseSessionService schema.
+# It lives in AGENT_STATE_DIR (or at SESSION_DB_PATH), not in the source tree.
+state_dir = os.getenv("AGENT_STATE_DIR", os.path.join(os.path.expanduser("~"), ".finoptiagents"))
+os.makedirs(state_dir, exist_ok=True)
+db_url = "sqlite:///" + (os.getenv("SESSION_DB_PATH") or os.path.join(state_dir, "my_agent_sessions.db"))
+session_service = WriteBehindSqliteSessionService(db_path=db_url)
 
-print(f"Initial state for session {current_session_id_tool_agent}: {session.state}")
+async def record_login_event():
+    session = await session_service.create_session(
+        app_name=APP_NAME,
+        user_id=USER_ID,
+        session_id=current_session_id_tool_agent,
+        state={"user:login_count": 0, "task_status": "idle"}
+    )
 
-# --- Define State Changes ---
-current_time = time.time()
-state_changes = {
-    "task_status": "active",
-    "user:login_count": session.state.get("user:login_count", 0) + 1,
-    "user:last_login_ts": current_time,
-    "temp:validation_needed": True
-}
+    print(f"Initial state for session {current_session_id_tool_agent}: {session.state}")
 
-# --- Create Event with Actions ---
-actions_with_update = EventActions(state_delta=state_changes)
-system_event = Event(
-    invocation_id="inv_login_update",
-    author="system",
-    actions=actions_with_update,
-    timestamp=current_time,
-    content=EmptyEventContent()
-)
+    # --- Define State Changes ---
+    current_time = time.time()
+    state_changes = {
+        "task_status": "active",
+        "user:login_count": session.state.get("user:login_count", 0) + 1,
+        "user:last_login_ts": current_time,
+        "temp:validation_needed": True
+    }
 
-# --- Append the Event ---
-session_service.append_event(session, system_event)
-print("`append_event` called with explicit state delta.")
+    # --- Create Event with Actions ---
+    actions_with_update = EventActions(state_delta=state_changes)
+    system_event = Event(
+        invocation_id="inv_login_update",
+        author="system",
+        actions=actions_with_update,
+        timestamp=current_time,
+    )
+
+    # --- Append the Event ---
+    # Buffered; committed with other events in one transaction by the writer thread.
+    await session_service.append_event(session, system_event)
+    print("`append_event` called with explicit state delta.")
+
+    # --- Check Updated State ---
+    # Served from storage plus the write-behind buffer, so the event above is visible.
+    updated_session = await session_service.get_session(app_name=APP_NAME,
+                                                        user_id=USER_ID,
+                                                        session_id=current_session_id_tool_agent)
+    if updated_session:
+        print(f"State after event for session {current_session_id_tool_agent}: {updated_session.state}")
+    else:
+        print(f"Could not retrieve session with ID: {current_session_id_tool_agent}")
+    await session_service.flush()
 
-# --- Check Updated State ---
-updated_session = session_service.get_session(app_name=APP_NAME,
-                                             user_id=USER_ID,
-                                             session_id=current_session_id_tool_agent)
-if updated_session:
-    print(f"State after event for session {current_session_id_tool_agent}: {updated_session.state}")
-else:
-    print(f"Could not retrieve session with ID: {current_session_id_tool_agent}")
-#*************************END: Agent Common Section**************************************
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(record_login_event())
+#*************************END: Agent Common Section**************************************
@@ -0,0 +1,5 @@
+"""Offline benchmarks for the FinOps agent.
+
+Each module is runnable on its own from the directory that contains the agent
+package, e.g. ``python -m multi_tool_agent.benchmarks.bench_http_client``.
+"""
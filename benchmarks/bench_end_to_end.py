@@ -0,0 +1,278 @@
+"""End-to-end latency of root_agent with every external dependency stood in locally.
+
+Turns go through the real ADK Runner, the real callbacks, tools, caches,
+HTTP client and interaction-logging pipeline. Only the far ends are replaced:
+
+    agent-tools /list_vms, /delete_vms   StandInServer (HTTP, keep-alive)
+    search endpoint                      StandInServer /search
+    OpenAI embeddings API                StandInServer /v1/embeddings (real openai client)
+    Vertex AI Agent Engine stream        StandInRemoteAgent
+    MCP toolbox                          StandInToolboxClient
+    Gemini                               ScriptedGemini
+
+Every stand-in has its own latency and payload-size flag. The agent reads
+its configuration at import time, so it runs in a child process whose
+environment points at the stand-ins. The report lists
+p50/p95/p99 per tool, per callback and per turn (overall and per scenario).
+It runs with no network access and no credentials.
+
+Usage:
+    python -m <agent_package>.benchmarks.bench_end_to_end --sessions 8 --iterations 5 \\
+        --model-latency-ms 300 --http-latency-ms 40
+"""
+import argparse
+import asyncio
+import contextlib
+import inspect
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from .stand_ins import StandInServer
+
+APP_NAME = "finops_bench"
+PROJECT_ID = "bench-proj"
+REMOTE_AGENT = "projects/bench/locations/us-central1/reasoningEngines/stand-in"
+LOGGING_TOOL = "insert_user_action"
+
+SCENARIOS = [
+    ("fast_path_list", f"list VMs in project {PROJECT_ID} zone us-central1-a", []),
+    ("list_vms", f"Which VMs are running in {PROJECT_ID}, us-central1-a?",
+     [("list_vm_instances", {"project_id": PROJECT_ID, "zone": "us-central1-a"})]),
+    ("cpu_report", f"How busy are the VMs in {PROJECT_ID} us-central1-b?",
+     [("call_cpu_utilization_agent", {"project_id": PROJECT_ID, "zone": "us-central1-b"})]),
+    ("cleanup_below_cpu", f"Delete the VMs in {PROJECT_ID} us-central1-c that are below 30% CPU",
+     [("filter_vms_by_cpu", {"project_id": PROJECT_ID, "zone": "us-central1-c", "cpu_below_percent": 30}),
+      ("batch_delete_vm_instances", lambda response: {"instances": response.get("candidates", [])})]),
+    ("search", "What are FinOps best practices for idle VMs?",
+     [("search_tool", {"query": "FinOps best practices for idle VMs"})]),
+    ("recall", "Have I cleaned up idle VMs before?",
+     [("recall_similar_interactions", {"query": "clean up idle VMs below CPU threshold", "top_k": 5})]),
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def timed_callback(self, name: str, fn):
+        """Wraps an ADK callback (sync or async) so each call is recorded under ``name``."""
+        if inspect.iscoroutinefunction(fn):
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+        else:
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+        wrapper.__name__ = getattr(fn, "__name__", name)
+        return wrapper
+
+    def report(self):
+        print(f"{'measurement':<48} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name in sorted(self.samples):
+            ms = np.array(self.samples[name]) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            print(f"{name:<48} {len(ms):>6} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}")
+
+
+def _timing_plugin(recorder: Recorder):
+    from google.adk.plugins.base_plugin import BasePlugin
+
+    class ToolTimingPlugin(BasePlugin):
+        def __init__(self):
+            super().__init__(name="tool_timing")
+            self._started = {}
+
+        async def before_tool_callback(self, *, tool, tool_args, tool_context):
+            self._started[tool_context.function_call_id] = time.perf_counter()
+
+        async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+            started = self._started.pop(tool_context.function_call_id, None)
+            if started is not None:
+                recorder.add(f"tool:{tool.name}", time.perf_counter() - started)
+
+        async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+            self._started.pop(tool_context.function_call_id, None)
+            recorder.add(f"tool_error:{tool.name}", 0.0)
+
+    return ToolTimingPlugin()
+
+
+def _agent_environment(args, server: StandInServer) -> dict:
+    """Environment for the measured process, pointing every dependency at a stand-in."""
+    try:
+        import openai  # noqa: F401
+        provider = "openai"
+    except ImportError:
+        provider = "local"
+    env = dict(os.environ)
+    env.pop("RECALL_TOOL_NAME", None)
+    env.update({
+        "AGENT_TOOLS_URL": server.base_url,
+        "SEARCH_AGENT_URL": f"{server.base_url}/search",
+        "EMBEDDING_PROVIDER": provider,
+        "OPENAI_BASE_URL": f"{server.base_url}/v1",
+        "OPENAI_API_KEY": "stand-in",
+        "LOCAL_EMBEDDING_DIMENSION": str(args.embedding_dim),
+        "REMOTE_CPU_AGENT_RESOURCE_NAME": REMOTE_AGENT,
+        "LOGGING_TOOL_NAME": LOGGING_TOOL,
+        "TOOLSET_NAME_FOR_LOGGING": "bench-toolset",
+        "MCP_TOOLBOX_URL": "http://mcp-toolbox.stand-in",
+        "MCP_TOOLBOX_PRELOAD": "false",
+        "INTERACTION_MEMORY_BACKEND": "local",
+        "INTERACTION_LOG_FLUSH_SECONDS": "0.2",
+        "RESPONSE_CACHE_TTL_SECONDS": "300" if args.response_cache else "0",
+        "FAST_PATH_ENABLED": "false" if args.no_fast_path else "true",
+        "CPU_TIMESERIES_PATH": "",
+    })
+    return env
+
+
+def _session_service(kind: str, tmp: str):
+    if kind == "sqlite":
+        from ..session_store import WriteBehindSqliteSessionService
+        return WriteBehindSqliteSessionService(os.path.join(tmp, "sessions.db"))
+    from google.adk.sessions import InMemorySessionService
+    return InMemorySessionService()
+
+
+async def _drive(runner, recorder: Recorder, sessions: int, iterations: int):
+    from google.genai import types
+
+    async def one_session(n: int):
+        user_id = f"bench-user-{n}"
+        for iteration in range(iterations):
+            session = await runner.session_service.create_session(
+                app_name=APP_NAME, user_id=user_id, session_id=f"s{n}-{iteration}")
+            for name, message, _ in SCENARIOS:
+                start = time.perf_counter()
+                async for _ in runner.run_async(user_id=user_id, session_id=session.id,
+                                                new_message=types.Content(role="user", parts=[types.Part(text=message)])):
+                    pass
+                elapsed = time.perf_counter() - start
+                recorder.add("turn", elapsed)
+                recorder.add(f"turn:{name}", elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_session(n) for n in range(sessions)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions.")
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over all scenarios per session.")
+    parser.add_argument("--model-latency-ms", type=float, default=200.0)
+    parser.add_argument("--model-output-chars", type=int, default=400)
+    parser.add_argument("--http-latency-ms", type=float, default=30.0, help="/list_vms and /delete_vms.")
+    parser.add_argument("--search-latency-ms", type=float, default=300.0)
+    parser.add_argument("--search-answer-chars", type=int, default=2000)
+    parser.add_argument("--embedding-latency-ms", type=float, default=60.0)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--instances-per-zone", type=int, default=20)
+    parser.add_argument("--remote-first-chunk-ms", type=float, default=400.0)
+    parser.add_argument("--remote-chunk-ms", type=float, default=20.0)
+    parser.add_argument("--remote-chunk-chars", type=int, default=200)
+    parser.add_argument("--toolbox-load-ms", type=float, default=150.0)
+    parser.add_argument("--toolbox-insert-ms", type=float, default=15.0)
+    parser.add_argument("--session-store", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the LLM response cache on.")
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every turn to the model.")
+    parser.add_argument("--verbose", action="store_true", help="Show the agent's own prints.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        _run_agent(args)
+        return
+
+    # The agent reads its configuration when the package is imported, so the
+    # measured agent runs in a child process configured through its environment.
+    server = StandInServer(
+        latency_s=args.http_latency_ms / 1000.0,
+        instances_per_zone=args.instances_per_zone,
+        search_answer_chars=args.search_answer_chars,
+        embedding_dim=args.embedding_dim,
+        path_latency_s={"/search": args.search_latency_ms / 1000.0,
+                        "/v1/embeddings": args.embedding_latency_ms / 1000.0},
+    )
+    with server:
+        subprocess.run([sys.executable, "-m", __spec__.name, *sys.argv[1:], "--worker"],
+                       env=_agent_environment(args, server), check=True)
+    print(f"http stand-in:    {server.request_counts}")
+
+
+def _run_agent(args):
+    from google.adk.runners import Runner
+    from .. import agent as agent_module
+    from .. import lazy_clients, remote_agents
+    from .stand_in_clients import ScriptedGemini, StandInRemoteAgent, StandInToolboxClient
+
+    if not args.verbose:
+        logging.getLogger("google_adk").setLevel(logging.ERROR)
+    toolbox = StandInToolboxClient(LOGGING_TOOL, args.toolbox_load_ms / 1000.0, args.toolbox_insert_ms / 1000.0)
+    lazy_clients.register("toolbox", lambda: toolbox, replace=True)
+    remote_agents.set_remote_agent(REMOTE_AGENT, StandInRemoteAgent(
+        args.instances_per_zone, args.remote_first_chunk_ms / 1000.0,
+        args.remote_chunk_ms / 1000.0, args.remote_chunk_chars))
+    model = ScriptedGemini(scripts={message: steps for _, message, steps in SCENARIOS},
+                           latency_s=args.model_latency_ms / 1000.0, output_chars=args.model_output_chars)
+
+    recorder = Recorder()
+    root = agent_module.root_agent
+    root.model = model
+    before = root.before_model_callback if isinstance(root.before_model_callback, list) else [root.before_model_callback]
+    after = root.after_model_callback if isinstance(root.after_model_callback, list) else [root.after_model_callback]
+    root.before_model_callback = [recorder.timed_callback(f"callback:{fn.__name__}", fn) for fn in before]
+    root.after_model_callback = [recorder.timed_callback(f"callback:{fn.__name__}", fn) for fn in after]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runner = Runner(app_name=APP_NAME, agent=root, session_service=_session_service(args.session_store, tmp),
+                        plugins=[_timing_plugin(recorder)])
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            agent_module.preload_logging_toolset()
+            wall = asyncio.run(_drive(runner, recorder, args.sessions, args.iterations))
+            asyncio.run(runner.close())
+            # Drain the background logging pipeline so its numbers are complete.
+            agent_module.interaction_logger.shutdown()
+
+    turns = len(recorder.samples["turn"])
+    print(f"{turns} turns across {args.sessions} concurrent sessions in {wall:.2f}s "
+          f"({turns / wall:.1f} turns/s), {model.calls} model calls")
+    recorder.report()
+    if toolbox.call_seconds:
+        ms = np.array(toolbox.call_seconds) * 1000.0
+        print(f"{'mcp insert (background)':<48} {len(ms):>6} " + " ".join(
+            f"{v:>9.2f}" for v in np.percentile(ms, [50, 95, 99])))
+    for key, entry in agent_module.instrumentation_summary().items():
+        if key.split(":")[0] in ("embedding", "mcp_insert", "http"):
+            print(f"span {key:<43} {entry['count']:>6} mean {entry['mean_s'] * 1000:.2f} ms, {entry['errors']} errors")
+    print(f"fast path:        {agent_module.fast_path_stats()}")
+    print(f"response cache:   {agent_module.response_cache_stats()}")
+    print(f"vm list cache:    {agent_module.vm_list_cache_stats()}")
+    print(f"resilience:       {agent_module.remote_call_stats()}")
+    print(f"coalescing:       {agent_module.coalescing_stats()}")
+    print(f"cpu time series:  {agent_module.cpu_timeseries_stats()}")
+    print(f"embedding cache:  {agent_module.embedding_cache_stats()}")
+    print(f"interaction log:  {agent_module.interaction_logger.stats}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Import-time benchmark for the agent package, based on ``python -X importtime``.
+
+Imports ``<package>.agent`` in a fresh interpreter several times and reports
+the median cumulative import time, plus the slowest modules from the last
+run. It exits non-zero when:
+
+    * the median exceeds ``--budget-ms``, or
+    * a module from ``--forbid`` (heavy SDKs that must stay lazy) was imported.
+
+Usage (from the directory containing the agent package):
+    python -m <agent_package>.benchmarks.bench_import_time --runs 5 --budget-ms 4000
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+DEFAULT_FORBIDDEN = ("vertexai", "google.cloud", "openai", "langchain_community", "toolbox_core")
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _root(module_name: str) -> str:
+    # "google" is a namespace package; report google.adk, google.genai, ... separately.
+    parts = module_name.split(".")
+    return ".".join(parts[:2]) if parts[0] == "google" and len(parts) > 1 else parts[0]
+
+
+def _package_name() -> str:
+    return __name__.split(".")[0] if "." in __name__ else os.path.basename(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def profile_import(module: str, cwd: str) -> list:
+    """Imports ``module`` in a fresh interpreter and returns (self_us, cumulative_us, depth, name) rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the median exceeds this.")
+    parser.add_argument("--forbid", nargs="*", default=list(DEFAULT_FORBIDDEN),
+                        help="Top-level packages that must not be imported at startup.")
+    args = parser.parse_args()
+
+    package = _package_name()
+    module = f"{package}.agent"
+    cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    totals_ms, rows = [], []
+    for _ in range(args.runs):
+        rows = profile_import(module, cwd)
+        total = next((cumulative for _, cumulative, _, name in rows if name == package), 0)
+        totals_ms.append(total / 1000.0)
+
+    print(f"Import of {module}: median={statistics.median(totals_ms):.1f}ms "
+          f"min={min(totals_ms):.1f}ms max={max(totals_ms):.1f}ms over {args.runs} runs")
+
+    # Self time summed per top-level package, so nested imports are not double counted.
+    self_by_root = {}
+    for self_us, _, _, name in rows:
+        root = _root(name)
+        self_by_root[root] = self_by_root.get(root, 0) + self_us
+    print("\nSlowest packages by self time (last run):")
+    for root, self_us in sorted(self_by_root.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_us / 1000.0:9.1f}ms  {root}")
+
+    failed = False
+    imported = {_root(name) for *_, name in rows}
+    leaked = sorted(imported & set(args.forbid))
+    if leaked:
+        print(f"\nFAIL: heavy packages imported at startup: {', '.join(leaked)}")
+        failed = True
+    if args.budget_ms is not None and statistics.median(totals_ms) > args.budget_ms:
+        print(f"\nFAIL: median import time exceeds budget of {args.budget_ms:.0f}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
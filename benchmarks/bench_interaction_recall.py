@@ -0,0 +1,76 @@
+"""Query latency of interaction recall versus table size.
+
+Compares exact (brute-force) search with the in-process ANN indexes used by
+the local interaction memory. It reports p50/p95 latency and recall@k against
+the exact answer. Vectors are random points around a set of cluster centres,
+which is roughly how logged interactions cluster by topic.
+
+Usage:
+    python -m <agent_package>.benchmarks.bench_interaction_recall --sizes 1000 10000 100000 --dim 256
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ..interaction_memory import HnswIndex, IVFFlatIndex, _normalize, _top_k
+
+
+def _clustered_vectors(rng, n: int, dim: int, clusters: int = 64) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return _normalize(centres[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def _measure(search, queries, k: int, truth: list) -> tuple:
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids, _ = search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        hits += len(set(ids.tolist()) & expected)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), hits / (k * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    print(f"{'rows':>8} {'index':<10} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+    for size in args.sizes:
+        data = _clustered_vectors(rng, size, args.dim)
+        queries = _clustered_vectors(rng, args.queries, args.dim)
+        owners = np.zeros(size, dtype=np.int32)
+        truth = [set(_top_k(data @ q, args.k).tolist()) for q in queries]
+
+        def brute(query, k):
+            scores = data @ query
+            best = _top_k(scores, k)
+            return best, scores[best]
+
+        p50, p95, recall = _measure(brute, queries, args.k, truth)
+        print(f"{size:>8} {'exact':<10} {0.0:>8.2f} {p50:>8.3f} {p95:>8.3f} {recall:>9.3f}")
+
+        candidates = [("ivf-flat", lambda: IVFFlatIndex(args.dim))]
+        try:
+            import hnswlib  # noqa: F401
+            candidates.append(("hnsw", lambda: HnswIndex(args.dim)))
+        except ImportError:
+            pass
+        for name, factory in candidates:
+            start = time.perf_counter()
+            index = factory()
+            for offset in range(0, size, 4096):
+                index.add(data[offset:offset + 4096], owners[offset:offset + 4096])
+            build = time.perf_counter() - start
+            p50, p95, recall = _measure(lambda q, k: index.search(q, k), queries, args.k, truth)
+            print(f"{size:>8} {name:<10} {build:>8.2f} {p50:>8.3f} {p95:>8.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
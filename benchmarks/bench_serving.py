@@ -0,0 +1,196 @@
+"""Turns per second and turn latency of the serving mode as concurrency grows.
+
+The agent runs behind serving.py's HTTP front end. The same stand-ins as
+bench_end_to_end.py replace its dependencies: the HTTP endpoints,
+embeddings, remote CPU agent, MCP toolbox and a scripted Gemini. For each
+level in ``--concurrency``, that many virtual users send turns at the same
+time. Each user has its own keep-alive connection, user id and session, and
+cycles through the bench_end_to_end scenarios. One untimed pass over all
+scenarios warms the lazy clients first. The report per level:
+
+    turns/s       completed turns over the level's wall time
+    p50/p95/p99   turn latency seen by the client
+    wait          mean time a turn waited for a concurrency slot
+    loop lag      worst delay of a 10 ms ticker on the server's event loop,
+                  i.e. how long the loop was blocked
+
+``--tool-threads 0`` runs the synchronous tools on the event loop, to see what
+the tool thread pool buys.
+
+Usage:
+    python -m <agent_package>.benchmarks.bench_serving --concurrency 1,4,16,64 --turns-per-user 6
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .bench_end_to_end import LOGGING_TOOL, REMOTE_AGENT, SCENARIOS, _agent_environment
+from .stand_ins import StandInServer
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic ticker wakes up on the running loop."""
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.max_lag_s = 0.0
+        self._task = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.max_lag_s = max(self.max_lag_s, loop.time() - expected)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._tick())
+
+    def reset(self):
+        self.max_lag_s = 0.0
+
+    def stop(self):
+        self._task.cancel()
+
+
+async def _post_turn(reader, writer, payload: dict) -> tuple:
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(b"POST /turn HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _run_level(port: int, level: int, turns_per_user: int) -> dict:
+    latencies, waits, failures = [], [], []
+
+    async def user(n: int):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for i in range(turns_per_user):
+                _, message, _ = SCENARIOS[(n + i) % len(SCENARIOS)]
+                start = time.perf_counter()
+                status, response = await _post_turn(reader, writer, {"user_id": f"c{level}-user-{n}", "message": message})
+                if status != 200:
+                    failures.append(status)
+                    continue
+                latencies.append(time.perf_counter() - start)
+                waits.append(response["wait_ms"])
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(level)))
+    return {"wall": time.perf_counter() - start, "latencies": latencies, "waits": waits, "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated numbers of concurrent users.")
+    parser.add_argument("--turns-per-user", type=int, default=6)
+    parser.add_argument("--max-concurrent-turns", type=int, default=32)
+    parser.add_argument("--tool-threads", type=int, default=16, help="0 runs sync tools on the event loop.")
+    parser.add_argument("--model-latency-ms", type=float, default=200.0)
+    parser.add_argument("--http-latency-ms", type=float, default=30.0)
+    parser.add_argument("--search-latency-ms", type=float, default=300.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=60.0)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--instances-per-zone", type=int, default=20)
+    parser.add_argument("--remote-first-chunk-ms", type=float, default=400.0)
+    parser.add_argument("--session-store", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    # Read by bench_end_to_end._agent_environment.
+    args.response_cache, args.no_fast_path = False, False
+    if args.worker:
+        asyncio.run(_serve_and_load(args))
+        return
+
+    server = StandInServer(
+        latency_s=args.http_latency_ms / 1000.0,
+        instances_per_zone=args.instances_per_zone,
+        embedding_dim=args.embedding_dim,
+        path_latency_s={"/search": args.search_latency_ms / 1000.0,
+                        "/v1/embeddings": args.embedding_latency_ms / 1000.0},
+    )
+    with server:
+        subprocess.run([sys.executable, "-m", __spec__.name, *sys.argv[1:], "--worker"],
+                       env=_agent_environment(args, server), check=True)
+    print(f"http stand-in: {server.request_counts}")
+
+
+async def _serve_and_load(args):
+    from .. import agent as agent_module
+    from .. import lazy_clients, remote_agents, serving
+    from .stand_in_clients import ScriptedGemini, StandInRemoteAgent, StandInToolboxClient
+
+    logging.getLogger("google_adk").setLevel(logging.ERROR)
+    toolbox = StandInToolboxClient(LOGGING_TOOL, 0.15, 0.015)
+    lazy_clients.register("toolbox", lambda: toolbox, replace=True)
+    remote_agents.set_remote_agent(REMOTE_AGENT, StandInRemoteAgent(
+        args.instances_per_zone, args.remote_first_chunk_ms / 1000.0, 0.02, 200))
+    model = ScriptedGemini(scripts={message: steps for _, message, steps in SCENARIOS},
+                           latency_s=args.model_latency_ms / 1000.0, output_chars=400)
+    agent_module.root_agent.model = model
+
+    with tempfile.TemporaryDirectory() as tmp:
+        session_service = None
+        if args.session_store == "sqlite":
+            from ..session_store import WriteBehindSqliteSessionService
+            session_service = WriteBehindSqliteSessionService(os.path.join(tmp, "sessions.db"))
+        server = serving.create_server(session_service=session_service,
+                                       max_concurrent_turns=args.max_concurrent_turns,
+                                       tool_threads=args.tool_threads)
+        http_server = await server.serve("127.0.0.1", 0)
+        port = http_server.sockets[0].getsockname()[1]
+        monitor = LoopLagMonitor()
+        monitor.start()
+        print(f"max concurrent turns {args.max_concurrent_turns}, tool threads {args.tool_threads}, "
+              f"model latency {args.model_latency_ms:.0f} ms")
+        print(f"{'users':>6} {'turns':>6} {'turns/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'wait ms':>8} {'loop lag ms':>12} {'errors':>7}")
+        with contextlib.redirect_stdout(io.StringIO()) as agent_output:
+            agent_module.preload_logging_toolset()
+            # One untimed pass over every scenario, so lazy clients and imports
+            # are not charged to the first level.
+            await _run_level(port, 1, len(SCENARIOS))
+        for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            monitor.reset()
+            with contextlib.redirect_stdout(agent_output):
+                result = await _run_level(port, level, args.turns_per_user)
+            ms = np.array(result["latencies"]) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (np.nan,) * 3
+            print(f"{level:>6} {len(ms):>6} {len(ms) / result['wall']:>8.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} "
+                  f"{np.mean(result['waits']) if result['waits'] else 0.0:>8.1f} "
+                  f"{monitor.max_lag_s * 1000.0:>12.1f} {len(result['failures']):>7}", flush=True)
+        monitor.stop()
+        http_server.close()
+        await http_server.wait_closed()
+        await server.close()
+        agent_module.interaction_logger.shutdown()
+    print(f"server: {server.stats()}")
+    print(f"coalescing: {agent_module.coalescing_stats()}")
+    print(f"{model.calls} model calls")
+
+
+if __name__ == "__main__":
+    main()
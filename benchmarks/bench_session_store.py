@@ -0,0 +1,97 @@
+"""Events per second appended across N concurrent sessions.
+
+Each session appends ``--events`` events, each carrying a session-state
+delta and a user-state delta. This is what a turn with state changes writes.
+All sessions run concurrently on one event loop. Timing stops only after the
+service has flushed everything. Every session is then read back to check
+that no event was lost. Appends that fail, such as "database is locked"
+under contention, are counted in the "failed" column.
+
+Compares ADK's SqliteSessionService (one transaction per event) with
+WriteBehindSqliteSessionService (WAL, reader pool, batched write-behind).
+
+Usage:
+    python -m <agent_package>.benchmarks.bench_session_store --sessions 1 16 64 --events 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from ..session_store import WriteBehindSqliteSessionService
+
+APP_NAME = "bench_app"
+
+
+def _services():
+    services = [("write-behind", lambda path: WriteBehindSqliteSessionService(path))]
+    try:
+        from google.adk.sessions.sqlite_session_service import SqliteSessionService
+        services.insert(0, ("adk-sqlite", SqliteSessionService))
+    except ImportError:
+        print("google.adk SqliteSessionService (aiosqlite) not available; skipping the baseline.")
+    return services
+
+
+async def _drive_session(service, user_id: str, session_id: str, events: int) -> int:
+    """Appends ``events`` events; returns how many appends failed (e.g. "database is locked")."""
+    try:
+        session = await service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id,
+                                               state={"task_status": "idle"})
+    except Exception:
+        return events
+    errors = 0
+    for i in range(events):
+        event = Event(
+            invocation_id=f"inv-{session_id}-{i // 4}",
+            author="finops_optimization_agent",
+            content=types.Content(role="model", parts=[types.Part(text=f"step {i}")]),
+            actions=EventActions(state_delta={"task_status": f"step-{i}", "user:last_step": i}),
+        )
+        try:
+            await service.append_event(session, event)
+        except Exception:
+            errors += 1
+    return errors
+
+
+async def _run(factory, path: str, sessions: int, events: int) -> tuple:
+    service = factory(path)
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(
+        _drive_session(service, f"user-{n % 8}", f"session-{n}", events) for n in range(sessions)
+    ))
+    await service.flush()
+    elapsed = time.perf_counter() - start
+    errors = sum(errors)
+    for n in range(sessions if not errors else 0):
+        session = await service.get_session(app_name=APP_NAME, user_id=f"user-{n % 8}", session_id=f"session-{n}")
+        assert len(session.events) == events, (n, len(session.events))
+        assert session.state["task_status"] == f"step-{events - 1}"
+    close = getattr(service, "close", None)
+    if close is not None:
+        await close()
+    return elapsed, (sessions * events - errors) / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--events", type=int, default=50, help="Events appended per session.")
+    args = parser.parse_args()
+
+    print(f"{'service':<14} {'sessions':>8} {'events':>8} {'seconds':>8} {'events/s':>10} {'failed':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for sessions in args.sessions:
+            for name, factory in _services():
+                path = os.path.join(tmp, f"{name}-{sessions}.db")
+                elapsed, rate, errors = asyncio.run(_run(factory, path, sessions, args.events))
+                print(f"{name:<14} {sessions:>8} {sessions * args.events:>8} {elapsed:>8.2f} {rate:>10.0f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Tail latency of /list_vms calls with and without hedging, and fail-fast on a degraded endpoint.
+
+The stand-in answers every request in ``--latency-ms``. Every
+``--slow-every``-th request instead takes ``--slow-ms``, which models a
+request that lands on a cold Cloud Run instance. Calls run one after
+another, so each slow request shows up directly in the percentiles.
+
+It then points both clients at a zone the stand-in always fails with
+HTTP 500. Every plain call pays the full round trip. With the circuit
+breaker open, calls fail in microseconds.
+
+Usage:
+    python -m <agent_package>.benchmarks.bench_tail_latency --calls 400 --slow-every 25 --slow-ms 1500
+"""
+import argparse
+import time
+
+import numpy as np
+import requests
+
+from ..http_client import Endpoint, PooledHttpClient
+from ..resilience import ResilientClient
+from .stand_ins import StandInServer
+
+PAYLOAD = {"project_id": "bench-project", "zone": "us-central1-a"}
+FAILING = {"project_id": "bench-project", "zone": "us-east1-b"}
+
+
+def _measure(call, calls: int, payload: dict) -> tuple:
+    samples, errors = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            call(payload)
+        except requests.exceptions.RequestException:
+            errors += 1
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return np.array(samples), errors
+
+
+def _report(label: str, samples, errors: int):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    print(f"{label:<34} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {samples.max():>9.2f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--slow-every", type=int, default=25)
+    parser.add_argument("--slow-ms", type=float, default=1500.0)
+    parser.add_argument("--hedge-after-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    with StandInServer(latency_s=args.latency_ms / 1000.0, failing_zones=[FAILING["zone"]],
+                       slow_every=args.slow_every, slow_latency_s=args.slow_ms / 1000.0) as server:
+        url = f"{server.base_url}/list_vms"
+        plain_client = PooledHttpClient({"list_vms": Endpoint("list_vms", url, 5.0, 30.0)})
+        hedged_client = ResilientClient(
+            PooledHttpClient({"list_vms": Endpoint("list_vms", url, 5.0, 30.0, idempotent=True, max_attempts=3,
+                                                   hedge_after=args.hedge_after_ms / 1000.0)}),
+            failure_threshold=5, reset_timeout=60.0, initial_backoff=0.01)
+
+        def plain(payload):
+            return plain_client.post_json("list_vms", payload).json()
+
+        def hedged(payload):
+            return hedged_client.post_json("list_vms", payload).json()
+
+        plain(PAYLOAD), hedged(PAYLOAD)  # warm-up (establishes the pooled connections)
+        print(f"{'ms per call':<34} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'errors':>7}")
+        _report("healthy, single attempt", *_measure(plain, args.calls, PAYLOAD))
+        _report("healthy, hedged + retries", *_measure(hedged, args.calls, PAYLOAD))
+        degraded = max(20, args.calls // 10)
+        _report("degraded, single attempt", *_measure(plain, degraded, FAILING))
+        _report("degraded, retries + breaker", *_measure(hedged, degraded, FAILING))
+        print(f"resilience counters: {hedged_client.stats()['list_vms']}")
+        plain_client.close()
+        hedged_client.client.close()
+        hedged_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""In-process stand-ins for the agent's non-HTTP dependencies.
+
+    StandInRemoteAgent   Vertex AI Agent Engine handle (async_stream_query / stream_query)
+    StandInToolboxClient MCP toolbox client whose load_toolset returns an insert tool
+    ScriptedGemini       ADK BaseLlm that follows a per-message script of tool calls
+
+Each one takes its latency and payload size as arguments. None of them opens a
+network connection.
+"""
+import asyncio
+import json
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncGenerator
+
+from google.adk.models import LlmResponse
+from google.adk.models.base_llm import BaseLlm
+from google.genai import types
+
+from .stand_ins import make_instances
+
+_PROJECT_ZONE = re.compile(r"project\s+(\S+?)\s+and\s+zone\s+([a-z]+-[a-z]+[0-9]+-[a-z])")
+_HISTORY = re.compile(r"recorded after (\S+) and up to (\S+) \(UTC\), at most one sample per VM every ([0-9]+) minutes")
+_MAX_CHUNKS = 32
+
+
+def cpu_percent(instance_id: str) -> float:
+    """Deterministic fake CPU utilization for an instance, 0-99.9."""
+    return (zlib.crc32(instance_id.encode()) % 1000) / 10.0
+
+
+class StandInRemoteAgent:
+    """Streams a CPU utilization report for the instances the HTTP stand-in lists.
+
+    History queries ("recorded after ... and up to ... every N minutes") are
+    answered with timestamped samples around each VM's fixed CPU value at
+    the requested step, so the whole range is covered.
+
+    Args:
+        instances_per_zone: Must match the StandInServer so ids line up.
+        first_chunk_latency_s: Delay before the first streamed event.
+        chunk_latency_s: Delay between streamed events.
+        chunk_chars: Approximate characters per streamed text chunk (raised
+            so that no reply takes more than 32 chunks).
+    """
+
+    def __init__(self, instances_per_zone: int = 5, first_chunk_latency_s: float = 0.0,
+                 chunk_latency_s: float = 0.0, chunk_chars: int = 200):
+        self.instances_per_zone = instances_per_zone
+        self.first_chunk_latency_s = first_chunk_latency_s
+        self.chunk_latency_s = chunk_latency_s
+        self.chunk_chars = max(1, chunk_chars)
+        self.queries = 0
+
+    def _report(self, message: str) -> str:
+        match = _PROJECT_ZONE.search(message)
+        project_id, zone = match.groups() if match else ("unknown-project", "unknown-zone")
+        instances = make_instances(project_id, zone, self.instances_per_zone)
+        history = _HISTORY.search(message)
+        if history:
+            return json.dumps(self._history(instances, zone, *history.groups()))
+        if "JSON array" in message:
+            return json.dumps([
+                {"instance_id": vm["id"], "name": vm["name"], "zone": zone, "cpu_percent": cpu_percent(vm["id"])}
+                for vm in instances
+            ])
+        return "\n".join(
+            f"- Instance name: {vm['name']}, instance ID: {vm['id']}, zone: {zone}, CPU utilization: {cpu_percent(vm['id'])}%"
+            for vm in instances
+        )
+
+    def _history(self, instances: list, zone: str, since_iso: str, until_iso: str, step_minutes: str) -> list:
+        since = datetime.fromisoformat(since_iso.replace("Z", "+00:00")).timestamp()
+        until = datetime.fromisoformat(until_iso.replace("Z", "+00:00")).timestamp()
+        step = int(step_minutes) * 60.0
+        times = [k * step for k in range(int(since // step) + 1, int(until // step) + 1)]
+        return [
+            {"instance_id": vm["id"], "name": vm["name"], "zone": zone,
+             "timestamp": datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+             "cpu_percent": round(cpu_percent(vm["id"]) * (0.8 + 0.4 * ((int(t // step) * 7919) % 11) / 10.0), 1)}
+            for vm in instances for t in times
+        ]
+
+    def _chunks(self, message: str) -> list:
+        report = self._report(message)
+        size = max(self.chunk_chars, -(-len(report) // _MAX_CHUNKS))
+        return [report[i:i + size] for i in range(0, len(report), size)]
+
+    @staticmethod
+    def _event(text: str) -> dict:
+        return {"content": {"role": "model", "parts": [{"text": text}]}}
+
+    async def async_stream_query(self, message: str, user_id: str):
+        self.queries += 1
+        await asyncio.sleep(self.first_chunk_latency_s)
+        # A real remote agent builds its reply elsewhere; keep it off the
+        # event loop so the bench's loop lag is the agent's own.
+        for i, chunk in enumerate(await asyncio.to_thread(self._chunks, message)):
+            if i:
+                await asyncio.sleep(self.chunk_latency_s)
+            yield self._event(chunk)
+
+    def stream_query(self, message: str, user_id: str):
+        self.queries += 1
+        time.sleep(self.first_chunk_latency_s)
+        for i, chunk in enumerate(self._chunks(message)):
+            if i:
+                time.sleep(self.chunk_latency_s)
+            yield self._event(chunk)
+
+
+class StandInToolboxClient:
+    """MCP toolbox client whose toolset holds one async insert tool.
+
+    Args:
+        tool_name: Name of the insert tool (LOGGING_TOOL_NAME).
+        load_latency_s: Time ``load_toolset`` takes.
+        call_latency_s: Time each insert takes.
+    """
+
+    def __init__(self, tool_name: str, load_latency_s: float = 0.0, call_latency_s: float = 0.0):
+        self.tool_name = tool_name
+        self.load_latency_s = load_latency_s
+        self.call_latency_s = call_latency_s
+        self.inserted = 0
+        self.call_seconds = []
+
+    async def load_toolset(self, name: str = None) -> list:
+        await asyncio.sleep(self.load_latency_s)
+        client = self
+
+        async def insert_tool(**params):
+            start = time.perf_counter()
+            await asyncio.sleep(client.call_latency_s)
+            client.inserted += 1
+            client.call_seconds.append(time.perf_counter() - start)
+            return "ok"
+
+        insert_tool.__name__ = self.tool_name
+        return [insert_tool]
+
+
+class ScriptedGemini(BaseLlm):
+    """Stand-in Gemini that plays back a script of tool calls per user message.
+
+    ``scripts`` maps a user message to a list of steps. A step is
+    ``(tool_name, args)``, where ``args`` is a dict or a callable that builds
+    the args from the previous function response. Each model call emits the
+    next step as a function call. Once the steps run out, it emits a text
+    answer of ``output_chars`` characters. Unknown messages get the text
+    answer straight away.
+    """
+
+    model: str = "scripted-gemini"
+    scripts: dict = {}
+    latency_s: float = 0.0
+    output_chars: int = 400
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        contents = llm_request.contents or []
+        start = max((i for i, c in enumerate(contents)
+                     if c.role == "user" and any(p.text for p in c.parts or [])), default=0)
+        user_text = next((p.text for p in contents[start].parts if p.text), "") if contents else ""
+        responses = [p.function_response for c in contents[start + 1:] for p in c.parts or [] if p.function_response]
+        steps = self.scripts.get(user_text, [])
+        if len(responses) < len(steps):
+            name, args = steps[len(responses)]
+            if callable(args):
+                args = args(responses[-1].response if responses else {})
+            part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+        else:
+            summary = f"Done: {user_text} ({len(responses)} tool call(s)). "
+            part = types.Part(text=summary.ljust(self.output_chars, "."))
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
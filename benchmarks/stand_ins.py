@@ -0,0 +1,153 @@
+"""Local stand-in for the agent-tools and search Cloud Run services.
+
+The server speaks HTTP/1.1 with keep-alive so connection reuse can be
+measured. Latency and payload size are configurable per instance. It also
+answers POST /v1/embeddings like the OpenAI embeddings API, so the real
+OpenAI client can be pointed at it with OPENAI_BASE_URL=<base_url>/v1.
+"""
+import base64
+import json
+import socket
+import threading
+import time
+import zlib
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..embedding_providers import LocalHashEmbeddingProvider
+
+
+def make_instances(project_id: str, zone: str, count: int) -> list:
+    """Builds ``count`` fake instance records shaped like the /list_vms output."""
+    return [
+        {
+            "id": f"{zlib.crc32((project_id + '/' + zone).encode()):012d}{i:06d}",
+            "name": f"vm-{zone}-{i}",
+            "zone": zone,
+            "status": "RUNNING",
+            "machine_type": "e2-standard-4" if i % 2 else "n2-standard-8",
+        }
+        for i in range(count)
+    ]
+
+
+class StandInServer:
+    """Threaded HTTP server answering /list_vms, /delete_vms, /search and /v1/embeddings.
+
+    Args:
+        latency_s: Artificial service time added to every request.
+        instances_per_zone: Number of instances /list_vms returns per zone.
+        failing_zones: Zones for which /list_vms answers with HTTP 500.
+        search_answer_chars: Length of the /search answer text.
+        embedding_dim: Dimension of the vectors /v1/embeddings returns.
+        path_latency_s: Per-path overrides of ``latency_s``, e.g. {"/search": 0.5}.
+        slow_every: Every ``slow_every``-th request is slow, like a request
+            that lands on a cold Cloud Run instance (0 disables).
+        slow_latency_s: Service time of those slow requests.
+    """
+
+    def __init__(self, latency_s: float = 0.0, instances_per_zone: int = 5, failing_zones=(),
+                 search_answer_chars: int = 0, embedding_dim: int = 1536, path_latency_s: dict = None,
+                 slow_every: int = 0, slow_latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.instances_per_zone = instances_per_zone
+        self.failing_zones = set(failing_zones)
+        self.search_answer_chars = search_answer_chars
+        self.path_latency_s = dict(path_latency_s or {})
+        self.slow_every = slow_every
+        self.slow_latency_s = slow_latency_s
+        self._requests = 0
+        self._embedder = LocalHashEmbeddingProvider(dimension=embedding_dim)
+        self.request_counts = {}
+        self._counts_lock = threading.Lock()
+        # A deep accept backlog keeps concurrent fan-out benchmarks from
+        # hitting SYN retransmits (1s) instead of measuring the client.
+        server_class = type("StandInHTTPServer", (ThreadingHTTPServer,), {"request_queue_size": 512})
+        self._httpd = server_class(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _count(self, path: str) -> int:
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+            self._requests += 1
+            return self._requests
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Avoid Nagle/delayed-ACK stalls on reused keep-alive connections.
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                n = server._count(self.path)
+                latency_s = server.path_latency_s.get(self.path, server.latency_s)
+                if server.slow_every and n % server.slow_every == 0:
+                    latency_s = server.slow_latency_s
+                if latency_s:
+                    time.sleep(latency_s)
+                status, payload = server.respond(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def respond(self, path: str, body: dict):
+        if path == "/list_vms":
+            if body.get("zone") in self.failing_zones:
+                return 500, {"error": f"zone {body.get('zone')} unavailable"}
+            return 200, {"instances": make_instances(body.get("project_id", ""), body.get("zone", ""), self.instances_per_zone)}
+        if path == "/delete_vms":
+            return 200, {"status": "DELETED", "instance_id": body.get("instance_id")}
+        if path == "/search":
+            answer = f"Stand-in answer for: {body.get('query')}"
+            return 200, {"result": answer.ljust(self.search_answer_chars, ".")}
+        if path == "/v1/embeddings":
+            return 200, self._embeddings(body)
+        return 404, {"error": f"unknown path {path}"}
+
+    def _embeddings(self, body: dict) -> dict:
+        texts = body.get("input") or []
+        texts = [texts] if isinstance(texts, str) else texts
+        data = []
+        for index, vector in enumerate(self._embedder.embed(texts)):
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(text.split()) for text in texts)
+        return {"object": "list", "data": data, "model": body.get("model", ""),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,438 @@
+"""Local time-series store for per-VM CPU utilization samples.
+
+Every CPU question used to start a remote agent run for the whole zone, and
+the answer was thrown away afterwards. This store keeps the samples instead.
+There is one ``_Series`` per (project_id, zone). It holds a NumPy ring
+buffer per VM: row ``i`` of ``ts``/``cpu`` holds the last ``capacity``
+samples of instance ``ids[i]``.
+
+    snapshot    ``set_current`` stores one current value per VM, e.g. from
+                a "CPU utilization now" query. It replaces the zone's fleet
+                but leaves the history alone, so latest-value questions
+                never need a history backfill.
+    history     The first history refresh of a zone is a full one: it
+                fetches the whole window (``append(..., full=True,
+                history_from=...)``) at a fixed sample step. ``history_from``
+                then tells how far back the stored history goes, and a
+                longer window triggers another full refresh. Later history
+                refreshes request only the samples after ``history_to``, at
+                the same step.
+    freshness   ``needs_refresh`` is False for ``refresh_interval`` seconds
+                after any refresh, and ``history_needs_refresh`` for as long
+                after a history refresh. Cleanup conversations inside that
+                interval make no remote call at all.
+    queries     ``window_stats`` computes avg/max/min, sample count and
+                coverage over any window with masked array reductions over
+                all VMs at once. ``latest`` returns the newest value of every
+                VM in the zone's fleet, from its snapshot or its history.
+    persistence ``save``/``load`` keep everything in one .npz file, so
+                history survives restarts. The file is written to a temp file
+                and then renamed over the old one.
+
+Samples that are not newer than a VM's last stored sample are dropped, so
+overlapping fetches never store the same sample twice.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_CAPACITY = 2048  # 7 days at 5-minute resolution is 2016 samples.
+
+
+class _Series:
+    """Ring buffers for the VMs of one (project_id, zone)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ids = []
+        self.names = []
+        self.index = {}
+        self.ts = np.full((0, capacity), np.nan)
+        self.cpu = np.full((0, capacity), np.nan, dtype=np.float32)
+        self.head = np.zeros(0, dtype=np.int64)
+        self.last = np.zeros(0)
+        self.seen = np.zeros(0, dtype=bool)
+        self.current_ts = np.zeros(0)
+        self.current_cpu = np.zeros(0, dtype=np.float32)
+        self.refreshed_at = 0.0
+        self.history_from = np.inf  # Complete history from this time on (epoch seconds).
+        self.history_to = -np.inf  # ... up to this time.
+        self.step_seconds = None  # Sample step the history was requested at.
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _grow(self, rows: int):
+        extra = rows - len(self.ts)
+        self.ts = np.vstack([self.ts, np.full((extra, self.capacity), np.nan)])
+        self.cpu = np.vstack([self.cpu, np.full((extra, self.capacity), np.nan, dtype=np.float32)])
+        self.head = np.concatenate([self.head, np.zeros(extra, dtype=np.int64)])
+        self.last = np.concatenate([self.last, np.full(extra, -np.inf)])
+        self.seen = np.concatenate([self.seen, np.zeros(extra, dtype=bool)])
+        self.current_ts = np.concatenate([self.current_ts, np.full(extra, np.nan)])
+        self.current_cpu = np.concatenate([self.current_cpu, np.full(extra, np.nan, dtype=np.float32)])
+
+    def row(self, instance_id: str, name: str = "") -> int:
+        row = self.index.get(instance_id)
+        if row is None:
+            row = self.index[instance_id] = len(self.ids)
+            self.ids.append(instance_id)
+            self.names.append(name)
+            if row >= len(self.ts):
+                self._grow(max(16, 2 * len(self.ts)))
+        elif name:
+            self.names[row] = name
+        return row
+
+    def append(self, rows: np.ndarray, ts: np.ndarray, cpu: np.ndarray) -> int:
+        """Writes samples into the ring buffers; returns how many were new."""
+        fresh = ts > self.last[rows]
+        rows, ts, cpu = rows[fresh], ts[fresh], cpu[fresh]
+        if not len(rows):
+            return 0
+        # Unique (row, ts) pairs in time order per row. Only the newest
+        # ``capacity`` samples of each row survive the wrap-around.
+        order = np.lexsort((ts, rows))
+        rows, ts, cpu = rows[order], ts[order], cpu[order]
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (ts[1:] != ts[:-1])
+        rows, ts, cpu = rows[keep], ts[keep], cpu[keep]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        counts = np.diff(np.r_[starts, len(rows)])
+        offset = np.arange(len(rows)) - np.repeat(starts, counts)
+        from_end = np.repeat(counts, counts) - offset
+        keep = from_end <= self.capacity
+        rows, ts, cpu, offset = rows[keep], ts[keep], cpu[keep], offset[keep]
+        slots = (self.head[rows] + offset) % self.capacity
+        self.ts[rows, slots] = ts
+        self.cpu[rows, slots] = cpu
+        unique_rows = rows[np.r_[True, rows[1:] != rows[:-1]]]
+        self.head[unique_rows] += counts
+        self.head[unique_rows] %= self.capacity
+        np.maximum.at(self.last, rows, ts)
+        return len(rows)
+
+    def drop(self, instance_id: str) -> bool:
+        row = self.index.get(instance_id)
+        if row is None:
+            return False
+        self.ts[row] = np.nan
+        self.cpu[row] = np.nan
+        self.current_ts[row] = np.nan
+        self.current_cpu[row] = np.nan
+        self.seen[row] = False
+        return True
+
+    def clear_samples(self):
+        self.ts[:] = np.nan
+        self.cpu[:] = np.nan
+        self.head[:] = 0
+        self.last[:] = -np.inf
+
+
+class CpuTimeSeriesStore:
+    """Per-VM CPU utilization history for many (project_id, zone) pairs.
+
+    Args:
+        path: .npz file to load from and save to; None keeps everything in memory.
+        capacity: Samples kept per VM (older samples are overwritten).
+        refresh_interval: Seconds after a refresh during which ``needs_refresh``
+            is False and queries are answered from the store alone.
+        clock: Wall-clock time source (epoch seconds); samples carry epoch timestamps.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = DEFAULT_CAPACITY,
+                 refresh_interval: float = 300.0, clock=time.time):
+        self.path = path
+        self.capacity = max(1, capacity)
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._series = {}
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.samples_added = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def _get(self, project_id: str, zone: str, create: bool = False) -> Optional[_Series]:
+        series = self._series.get((project_id, zone))
+        if series is None and create:
+            series = self._series[(project_id, zone)] = _Series(self.capacity)
+        return series
+
+    def needs_refresh(self, project_id: str, zone: str) -> bool:
+        """True unless the zone had a snapshot or history refresh in the last ``refresh_interval``."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            return series is None or self.clock() - series.refreshed_at >= self.refresh_interval
+
+    def history_needs_refresh(self, project_id: str, zone: str) -> bool:
+        """True unless the zone had a history refresh in the last ``refresh_interval``."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            return series is None or self.clock() - series.history_to >= self.refresh_interval
+
+    def last_timestamp(self, project_id: str, zone: str) -> Optional[float]:
+        """Newest stored sample time for the zone, or None if nothing is stored."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            if series is None or not len(series):
+                return None
+            newest = series.last[:len(series)].max()
+            return float(newest) if np.isfinite(newest) else None
+
+    def history(self, project_id: str, zone: str) -> tuple:
+        """``(history_from, step_seconds)`` of the zone's last full refresh, or ``(None, None)``."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            if series is None or not np.isfinite(series.history_from):
+                return None, None
+            return float(series.history_from), series.step_seconds
+
+    def history_to(self, project_id: str, zone: str) -> Optional[float]:
+        """Time up to which the zone's history was last fetched, or None before the first history refresh."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            if series is None or not np.isfinite(series.history_to):
+                return None
+            return float(series.history_to)
+
+    def set_current(self, project_id: str, zone: str, records: list, fetched_at: Optional[float] = None) -> int:
+        """Stores a snapshot: one current value per VM of the zone.
+
+        The zone's fleet becomes exactly the VMs in ``records``; their
+        history is kept, and no sample is added to it.
+
+        Args:
+            records: Objects with ``instance_id``, ``name`` and ``cpu_percent``
+                (and optionally ``timestamp``), e.g.
+                ``cpu_utilization.CpuUtilizationRecord``.
+            fetched_at: When the records were fetched; defaults to now.
+
+        Returns:
+            The number of VMs with a current value.
+        """
+        fetched_at = self.clock() if fetched_at is None else fetched_at
+        with self._lock:
+            series = self._get(project_id, zone, create=True)
+            series.seen[:] = False
+            stored = 0
+            for record in records:
+                row = series.row(record.instance_id, getattr(record, "name", "") or "")
+                series.seen[row] = True
+                if record.cpu_percent is None:
+                    continue
+                timestamp = getattr(record, "timestamp", None)
+                series.current_ts[row] = fetched_at if timestamp is None else timestamp
+                series.current_cpu[row] = record.cpu_percent
+                stored += 1
+            series.refreshed_at = fetched_at
+            self.refreshes += 1
+            return stored
+
+    def append(self, project_id: str, zone: str, records: list, fetched_at: Optional[float] = None,
+               full: bool = False, history_from: Optional[float] = None, step_seconds: Optional[float] = None) -> int:
+        """Stores the samples from one history refresh and marks the zone as refreshed.
+
+        Args:
+            records: Objects with ``instance_id``, ``name``, ``cpu_percent`` and
+                an optional ``timestamp`` (epoch seconds), e.g.
+                ``cpu_utilization.CpuUtilizationRecord``. Samples without a
+                timestamp are stamped with ``fetched_at``.
+            fetched_at: When the records were fetched; defaults to now. The
+                history counts as fetched up to this time.
+            full: True when ``records`` list every VM of the zone and hold
+                its whole history since ``history_from``. The stored samples
+                are replaced, and VMs missing from ``records`` leave the
+                fleet. An incremental refresh omits VMs with no new samples.
+            history_from: Start of the history a full refresh requested;
+                defaults to ``fetched_at``.
+            step_seconds: Sample step a full refresh requested.
+
+        Returns:
+            The number of new samples stored.
+        """
+        fetched_at = self.clock() if fetched_at is None else fetched_at
+        with self._lock:
+            series = self._get(project_id, zone, create=True)
+            seen, rows, ts, cpu = [], [], [], []
+            for record in records:
+                row = series.row(record.instance_id, getattr(record, "name", "") or "")
+                seen.append(row)
+                if record.cpu_percent is None:
+                    continue
+                rows.append(row)
+                ts.append(record.timestamp if getattr(record, "timestamp", None) is not None else fetched_at)
+                cpu.append(record.cpu_percent)
+            if full:
+                series.clear_samples()
+                series.seen[:] = False
+                series.history_from = fetched_at if history_from is None else history_from
+                series.step_seconds = step_seconds
+            series.seen[seen] = True
+            added = series.append(np.array(rows, dtype=np.int64), np.array(ts, dtype=np.float64),
+                                  np.array(cpu, dtype=np.float32))
+            series.refreshed_at = series.history_to = fetched_at
+            self.refreshes += 1
+            self.samples_added += added
+            return added
+
+    def drop_instance(self, project_id: str, zone: str, instance_id: str) -> bool:
+        """Forgets a VM's history, e.g. after it was deleted."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            return bool(series and series.drop(instance_id))
+
+    def latest(self, project_id: str, zone: str) -> list:
+        """Newest value (snapshot or history sample) of every VM in the zone's fleet, as dicts."""
+        with self._lock:
+            series = self._get(project_id, zone)
+            if series is None or not len(series):
+                return []
+            n = len(series)
+            rows = np.flatnonzero(series.seen[:n] & (np.isfinite(series.last[:n]) | np.isfinite(series.current_ts[:n])))
+            slots = (series.head[rows] - 1) % series.capacity
+            ts, cpu = series.ts[rows, slots], series.cpu[rows, slots]
+            current_ts, current_cpu = series.current_ts[rows], series.current_cpu[rows]
+            with np.errstate(invalid="ignore"):
+                use_current = np.isfinite(current_ts) & ~(ts >= current_ts)
+            ts, cpu = np.where(use_current, current_ts, ts), np.where(use_current, current_cpu, cpu)
+            return [
+                {"instance_id": series.ids[r], "name": series.names[r], "zone": zone,
+                 "cpu_percent": round(float(c), 2), "timestamp": float(t)}
+                for r, t, c in zip(rows, ts, cpu) if np.isfinite(t)
+            ]
+
+    def window_stats(self, project_id: str, zone: str, window_seconds: float, now: Optional[float] = None) -> list:
+        """Avg/max/min CPU, sample count and coverage per VM over the last ``window_seconds``.
+
+        Returns:
+            One dict per VM that has samples in the window, sorted by
+            average CPU ascending (the idlest VMs first). "coverage" is the
+            share of the window's expected samples (at the zone's sample
+            step) that are present, or None when the step is unknown.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            series = self._get(project_id, zone)
+            if series is None or not len(series):
+                return []
+            n = len(series)
+            ts, cpu = series.ts[:n], series.cpu[:n]
+            with np.errstate(invalid="ignore"):
+                mask = (ts >= now - window_seconds) & (ts <= now)
+            counts = mask.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                avg = np.where(mask, cpu, 0.0).sum(axis=1) / counts
+            peak = np.where(mask, cpu, -np.inf).max(axis=1)
+            low = np.where(mask, cpu, np.inf).min(axis=1)
+            ids, names = list(series.ids), list(series.names)
+            expected = window_seconds / series.step_seconds if series.step_seconds else None
+        rows = np.flatnonzero(counts)
+        rows = rows[np.argsort(avg[rows], kind="stable")]
+        return [
+            {"instance_id": ids[r], "name": names[r], "zone": zone, "samples": int(counts[r]),
+             "avg_cpu_percent": round(float(avg[r]), 2), "max_cpu_percent": round(float(peak[r]), 2),
+             "min_cpu_percent": round(float(low[r]), 2),
+             "coverage": round(min(1.0, float(counts[r]) / expected), 3) if expected else None}
+            for r in rows
+        ]
+
+    def matrix(self, project_id: str, zone: str, window_seconds: float, step_seconds: float,
+               now: Optional[float] = None) -> tuple:
+        """Resamples the last ``window_seconds`` onto a regular time grid.
+
+        Only VMs in the zone's fleet are included (see ``latest``).
+
+        Returns:
+            ``(instance_ids, names, matrix)``. ``matrix[i, j]`` is the mean
+            CPU of VM ``i`` in step ``j`` (oldest first), as float32, or NaN
+            when the VM has no sample in that step.
+        """
+        now = self.clock() if now is None else now
+        steps = max(1, int(np.ceil(window_seconds / step_seconds)))
+        start = now - steps * step_seconds
+        with self._lock:
+            series = self._get(project_id, zone)
+            if series is None or not len(series):
+                return [], [], np.full((0, steps), np.nan, dtype=np.float32)
+            rows = np.flatnonzero(series.seen[:len(series)])
+            ts, cpu = series.ts[rows], series.cpu[rows]
+            ids, names = [series.ids[r] for r in rows], [series.names[r] for r in rows]
+        with np.errstate(invalid="ignore"):
+            r, c = np.nonzero((ts > start) & (ts <= now))
+        bins = np.minimum(((ts[r, c] - start) // step_seconds).astype(np.intp), steps - 1)
+        flat = r * steps + bins
+        sums = np.bincount(flat, weights=cpu[r, c], minlength=len(rows) * steps)
+        counts = np.bincount(flat, minlength=len(rows) * steps)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grid = (sums / counts).astype(np.float32).reshape(len(rows), steps)
+        return ids, names, grid
+
+    def save(self):
+        """Writes every series to ``path`` (atomically); no-op without a path."""
+        if not self.path:
+            return
+        with self._lock:
+            arrays, meta = {}, []
+            for i, ((project_id, zone), series) in enumerate(self._series.items()):
+                n = len(series)
+                meta.append({"project_id": project_id, "zone": zone, "capacity": series.capacity,
+                             "ids": series.ids, "names": series.names, "refreshed_at": series.refreshed_at,
+                             "history_from": series.history_from if np.isfinite(series.history_from) else None,
+                             "history_to": series.history_to if np.isfinite(series.history_to) else None,
+                             "step_seconds": series.step_seconds})
+                arrays.update({f"s{i}_ts": series.ts[:n], f"s{i}_cpu": series.cpu[:n],
+                               f"s{i}_head": series.head[:n], f"s{i}_last": series.last[:n],
+                               f"s{i}_seen": series.seen[:n], f"s{i}_current_ts": series.current_ts[:n],
+                               f"s{i}_current_cpu": series.current_cpu[:n]})
+            arrays["meta"] = np.array(json.dumps(meta))
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self):
+        """Replaces the in-memory series with the contents of ``path``."""
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            loaded = {}
+            for i, entry in enumerate(meta):
+                series = _Series(entry["capacity"])
+                series.ids, series.names = list(entry["ids"]), list(entry["names"])
+                series.index = {instance_id: row for row, instance_id in enumerate(series.ids)}
+                series.refreshed_at = entry["refreshed_at"]
+                series.history_from = entry.get("history_from") or np.inf
+                series.history_to = entry.get("history_to") or -np.inf
+                series.step_seconds = entry.get("step_seconds")
+                series.ts, series.cpu = data[f"s{i}_ts"], data[f"s{i}_cpu"]
+                series.head, series.last = data[f"s{i}_head"], data[f"s{i}_last"]
+                series.seen = data[f"s{i}_seen"]
+                if f"s{i}_current_ts" in data.files:
+                    series.current_ts, series.current_cpu = data[f"s{i}_current_ts"], data[f"s{i}_current_cpu"]
+                else:
+                    series.current_ts = np.full(len(series.seen), np.nan)
+                    series.current_cpu = np.full(len(series.seen), np.nan, dtype=np.float32)
+                loaded[(entry["project_id"], entry["zone"])] = series
+        with self._lock:
+            self._series = loaded
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "zones": len(self._series),
+                "vms": sum(len(series) for series in self._series.values()),
+                "samples": int(sum(np.isfinite(series.ts[:len(series)]).sum() for series in self._series.values())),
+                "refreshes": self.refreshes,
+                "samples_added": self.samples_added,
+            }
@@ -0,0 +1,164 @@
+"""Typed CPU utilization records parsed from the remote CPU agent's reply.
+
+The remote agent is asked for a JSON array. If it answers in prose anyway,
+a line-oriented parser recovers the instance id, name, zone and CPU
+percentage. In prose an id must be labelled ("instance ID: ..."), or be one
+of the ``known_ids`` from the zone's VM listing. Any other bare number, such
+as a project number or a byte count, is never taken for an instance id.
+
+Threshold filtering then happens here in Python instead of the model
+reading the report and picking instance IDs itself.
+
+``STRUCTURED_QUERY_TEMPLATE`` asks for the current value of every VM in a
+zone (a snapshot, one record per VM). ``HISTORY_QUERY_TEMPLATE`` asks for
+the timestamped samples recorded in a time range at a given step, to feed
+cpu_timeseries.py. A history window is fetched as several such ranges, so
+no single reply has to hold days of samples for the whole zone.
+"""
+import json
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class CpuUtilizationRecord(BaseModel):
+    instance_id: str
+    name: str = ""
+    zone: str = ""
+    cpu_percent: Optional[float] = None
+    timestamp: Optional[float] = None  # Sample time, epoch seconds, when the agent reports it.
+
+
+STRUCTURED_QUERY_TEMPLATE = (
+    "What is the CPU utilization for all VMs in project {project_id} and zone {zone}? "
+    "Respond ONLY with a JSON array, one object per VM, with the keys "
+    '"instance_id", "name", "zone" and "cpu_percent" (a number, no % sign).'
+)
+
+HISTORY_QUERY_TEMPLATE = (
+    "List the CPU utilization samples for all VMs in project {project_id} and zone {zone} "
+    "recorded after {since} and up to {until} (UTC), at most one sample per VM every {step_minutes} minutes "
+    "(average the samples within each interval). Respond ONLY with a JSON array, one object per sample, with the keys "
+    '"instance_id", "name", "zone", "timestamp" (ISO 8601, UTC) and "cpu_percent" (a number, no % sign).'
+)
+
+_JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+_INSTANCE_ID = re.compile(r"instance[\s_-]*id\W*\s*([0-9]{6,})", re.IGNORECASE)
+_BARE_ID = re.compile(r"\b([0-9]{10,})\b")
+_NAME = re.compile(r"(?:instance[\s_-]*)?name\W*\s*([a-z][-a-z0-9]*)", re.IGNORECASE)
+_ZONE = re.compile(r"\b([a-z]+-[a-z]+[0-9]+-[a-z])\b")
+_PERCENT = re.compile(r"(-?[0-9]+(?:\.[0-9]+)?)\s*%")
+_CPU_VALUE = re.compile(r"cpu[^0-9\n]*?(-?[0-9]+(?:\.[0-9]+)?)", re.IGNORECASE)
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"-?[0-9]+(?:\.[0-9]+)?", str(value))
+    return float(match.group()) if match else None
+
+
+def _to_epoch(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return _to_float(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _records_from_json(text: str, default_zone: str) -> Optional[list]:
+    match = _JSON_ARRAY.search(text)
+    if not match:
+        return None
+    try:
+        items = json.loads(match.group())
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(items, list):
+        return None
+    records = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        instance_id = item.get("instance_id") or item.get("id") or item.get("instanceId")
+        if not instance_id:
+            continue
+        cpu = item.get("cpu_percent", item.get("cpu_utilization", item.get("cpu")))
+        records.append(CpuUtilizationRecord(
+            instance_id=str(instance_id),
+            name=str(item.get("name") or item.get("instance_name") or ""),
+            zone=str(item.get("zone") or default_zone),
+            cpu_percent=_to_float(cpu),
+            timestamp=_to_epoch(item.get("timestamp", item.get("time"))),
+        ))
+    return records
+
+
+def _records_from_text(text: str, default_zone: str, known_ids=None) -> list:
+    # One record per instance id; name/zone/CPU on the same or following
+    # lines are attached to the most recent id.
+    records, current = [], None
+    for line in text.splitlines():
+        id_match = _INSTANCE_ID.search(line)
+        if id_match is None and known_ids:
+            id_match = next((m for m in _BARE_ID.finditer(line) if m.group(1) in known_ids), None)
+        if id_match:
+            current = {"instance_id": id_match.group(1), "name": "", "zone": default_zone, "cpu_percent": None}
+            records.append(current)
+        if current is None:
+            continue
+        name_match = _NAME.search(line)
+        if name_match and not current["name"]:
+            current["name"] = name_match.group(1)
+        zone_match = _ZONE.search(line)
+        if zone_match:
+            current["zone"] = zone_match.group(1)
+        cpu_match = _PERCENT.search(line) or _CPU_VALUE.search(line)
+        if cpu_match and current["cpu_percent"] is None:
+            current["cpu_percent"] = float(cpu_match.group(1))
+    return [CpuUtilizationRecord(**record) for record in records]
+
+
+def parse_cpu_utilization(text: str, default_zone: str = "", known_ids=None) -> list:
+    """Parses the remote agent reply into ``CpuUtilizationRecord`` objects.
+
+    Args:
+        text: The concatenated text returned by the remote CPU agent.
+        default_zone: Zone used when a record does not name one.
+        known_ids: Optional set of instance ids from the VM inventory. In a
+            prose reply, unlabelled numbers are only taken as ids if listed.
+
+    Returns:
+        One record per instance, in the order they appear in ``text``.
+    """
+    if not text:
+        return []
+    records = _records_from_json(text, default_zone)
+    if records is None:
+        records = _records_from_text(text, default_zone, known_ids)
+    return records
+
+
+def filter_by_cpu(records: list, below: Optional[float] = None, above: Optional[float] = None) -> list:
+    """Returns the records whose CPU percentage is strictly below/above the thresholds.
+
+    Records with an unknown CPU value never match, so they are never
+    proposed for deletion. Results are sorted by CPU ascending.
+    """
+    matches = [
+        r for r in records
+        if r.cpu_percent is not None
+        and (below is None or r.cpu_percent < below)
+        and (above is None or r.cpu_percent > above)
+    ]
+    return sorted(matches, key=lambda r: r.cpu_percent)
@@ -0,0 +1,100 @@
+"""Content-addressed cache for embedding vectors.
+
+Keys are the SHA-256 of the model name and the exact text embedded, so an
+identical (user, action, result) text never goes to the embeddings API
+twice. There are two tiers:
+
+    memory  an LRU dict of the most recent ``maxsize`` vectors.
+    disk    an optional SQLite file that survives restarts (set ``path``).
+
+A disk hit is promoted into the memory tier.
+"""
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+
+def embedding_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + optional SQLite) embedding cache.
+
+    Args:
+        maxsize: Number of vectors kept in memory.
+        path: SQLite file for the persistent tier; None keeps it memory-only.
+    """
+
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def _remember(self, key: str, vector: list):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str, model: str) -> Optional[list]:
+        key = embedding_key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = array("d", row[0]).tolist()
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model: str, vector: list):
+        if vector is None:
+            return
+        key = embedding_key(text, model)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, array("d", vector).tobytes()),
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_size": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,118 @@
+"""Embedding backends behind one small interface.
+
+    openai  OpenAI embeddings API. Many texts are packed into each request,
+            within the API's per-request input and token limits.
+    local   Deterministic feature-hashing embedder with no network and no
+            extra dependencies, for tests, benchmarks and air-gapped runs.
+
+Select with EMBEDDING_PROVIDER (default "openai").
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class EmbeddingProvider(ABC):
+    """Base class: subclasses set ``model`` and implement ``_embed_batch``."""
+    model = ""
+    max_batch_inputs = 2048
+    max_batch_tokens = 250_000
+
+    @abstractmethod
+    def _embed_batch(self, texts: list) -> list:
+        """Embeds one batch that fits the limits; one vector per text, in order."""
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # Conservative (~3 chars per token) so batches stay under the limit.
+        return len(text) // 3 + 1
+
+    def iter_batches(self, texts: list):
+        """Yields consecutive slices of ``texts`` that fit one request."""
+        batch, tokens = [], 0
+        for text in texts:
+            cost = self.estimate_tokens(text)
+            if batch and (len(batch) >= self.max_batch_inputs or tokens + cost > self.max_batch_tokens):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += cost
+        if batch:
+            yield batch
+
+    def embed(self, texts: list) -> list:
+        """Embeds ``texts`` with as few requests as the limits allow, preserving order."""
+        vectors = []
+        for batch in self.iter_batches(texts):
+            vectors.extend(self._embed_batch(batch))
+        return vectors
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings; ``openai`` is imported on first use."""
+
+    def __init__(self, model: str = "text-embedding-ada-002", api_key: str = None):
+        self.model = model
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(api_key=self._api_key)
+        return self._client
+
+    def _embed_batch(self, texts: list) -> list:
+        response = self._get_client().embeddings.create(input=texts, model=self.model)
+        # The API may return items out of order; ``index`` maps them back.
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalHashEmbeddingProvider(EmbeddingProvider):
+    """Signed feature hashing of word unigrams and bigrams, L2-normalised.
+
+    The same text always gives the same vector, and texts that share words
+    have a positive cosine similarity. That is enough for cache and recall
+    tests, though it is not a semantic model.
+    """
+    max_batch_inputs = 100_000
+    max_batch_tokens = 10**12
+
+    def __init__(self, dimension: int = 1536):
+        self.dimension = dimension
+        self.model = f"local-hash-{dimension}"
+
+    def _embed_one(self, text: str) -> list:
+        vector = [0.0] * self.dimension
+        tokens = _TOKEN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def _embed_batch(self, texts: list) -> list:
+        return [self._embed_one(text) for text in texts]
+
+
+def get_embedding_provider(name: str = None) -> EmbeddingProvider:
+    """Builds the provider named by ``name`` or EMBEDDING_PROVIDER."""
+    name = (name or os.getenv("EMBEDDING_PROVIDER") or "openai").lower()
+    if name == "local":
+        return LocalHashEmbeddingProvider(dimension=int(os.getenv("LOCAL_EMBEDDING_DIMENSION", "1536")))
+    if name == "openai":
+        return OpenAIEmbeddingProvider(
+            model=os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002"),
+            api_key=os.getenv("OPENAI_KEY"),
+        )
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER '{name}'. Use 'openai' or 'local'.")
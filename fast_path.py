@@ -0,0 +1,146 @@
+"""Deterministic router for fully specified commands, ahead of the model.
+
+Commands such as
+
+    list VMs in project my-proj zone us-central1-a
+    show instances in zone us-central1-a of project my-proj
+    CPU utilization for project my-proj zone us-central1-a
+    what is the cpu usage of all vms in project my-proj and zone us-central1-a?
+
+name the tool and all of its arguments, so they are answered by calling the
+tool directly and filling in a template. That skips both model calls, the one
+that picks the tool and the one that phrases the result. The grammar has to
+match the whole message. Anything else, such as a threshold, a second
+project, or a word like "delete", returns None. A tool error also returns
+None, and the caller then hands the turn to the model as usual.
+"""
+import asyncio
+import re
+import threading
+from dataclasses import dataclass
+
+from . import vm_fleet
+
+# GCE naming rules: project ids are 6-30 chars, zones look like us-central1-a.
+_PROJECT = r"(?P<project>[a-z][a-z0-9-]{4,28}[a-z0-9])"
+_ZONE = r"(?P<zone>[a-z]+-[a-z]+[0-9]+-[a-z])"
+_SEP = r"(?:\s*,\s*|\s+and\s+|\s+)"
+_LOCATIONS = (
+    rf"(?:in\s+)?project\s+{_PROJECT}{_SEP}(?:in\s+)?zone\s+{_ZONE}",
+    rf"(?:in\s+)?zone\s+{_ZONE}{_SEP}(?:(?:in|of|for)\s+)?project\s+{_PROJECT}",
+)
+_POLITE = r"(?:(?:please|can you|could you)\s+)?"
+_END = r"\s*(?:please\s*)?[.!?]?"
+
+_LIST_VERB = r"(?:list|show|get|display)(?:\s+(?:me|all|my|the))*"
+_VM_NOUN = r"(?:vms?|vm instances|instances|virtual machines)"
+_CPU_LEAD = r"(?:(?:what is|what's|show|get|check|report)(?:\s+me)?\s+)?(?:the\s+)?"
+_CPU_NOUN = r"cpu\s+(?:utili[sz]ation|usage|load)"
+_CPU_SUBJECT = rf"(?:\s+(?:of|for)\s+(?:all\s+)?(?:the\s+)?{_VM_NOUN})?"
+
+_GRAMMAR = (
+    [("list_vms", re.compile(rf"{_POLITE}{_LIST_VERB}\s+{_VM_NOUN}\s+{loc}{_END}"))
+     for loc in _LOCATIONS]
+    + [("cpu_utilization", re.compile(rf"{_POLITE}{_CPU_LEAD}{_CPU_NOUN}{_CPU_SUBJECT}\s+(?:(?:for|in|of)\s+)?{loc}{_END}"))
+       for loc in _LOCATIONS]
+)
+
+# Prefixes call_cpu_utilization_agent uses for the errors it returns as text.
+_CPU_ERROR_PREFIXES = ("Error", "An unexpected error", "No CPU utilization data")
+
+
+@dataclass(frozen=True)
+class FastPathCommand:
+    kind: str
+    project_id: str
+    zone: str
+
+
+def parse_command(text: str):
+    """Returns the FastPathCommand ``text`` spells out completely, else None."""
+    text = " ".join((text or "").split()).lower()
+    for kind, pattern in _GRAMMAR:
+        match = pattern.fullmatch(text)
+        if match:
+            return FastPathCommand(kind, match.group("project"), match.group("zone"))
+    return None
+
+
+def render_vm_list(command: FastPathCommand, result) -> str:
+    """Templated answer for a /list_vms result; None if the shape is not recognised.
+
+    Accepts every shape ``vm_fleet`` does: a bare list, or an object holding
+    the list under "instances", "vms", "items" or "result".
+    """
+    if not isinstance(result, list) and not (
+            isinstance(result, dict) and any(isinstance(result.get(key), list) for key in ("instances", "vms", "items", "result"))):
+        return None
+    instances = vm_fleet._instances_from_response(result)
+    rows = [vm_fleet.normalize_instance(command.project_id, command.zone, instance) for instance in instances]
+    if not rows:
+        return f"There are no VM instances in project {command.project_id}, zone {command.zone}."
+    summary = (result.get("cost_summary") if isinstance(result, dict) else None) or {}
+    currency = summary.get("currency", "USD")
+    costs = [instance.get("monthly_cost") if isinstance(instance, dict) else None for instance in instances]
+    lines = [f"Found {len(rows)} VM instance(s) in project {command.project_id}, zone {command.zone}:"]
+    for (_, _, instance_id, name, status, machine_type), cost in zip(rows, costs):
+        details = ", ".join(value for value in (status, machine_type, _money(cost, currency)) if value)
+        lines.append(f"- {name or instance_id} (id: {instance_id or 'unknown'})" + (f" - {details}" if details else ""))
+    priced = [cost for cost in costs if cost is not None]
+    if summary.get("priced_vms"):
+        lines.append(f"Estimated total: {_money(summary['total_monthly_cost'], currency)}.")
+    elif priced:
+        # A bare-list response has no cost_summary.
+        lines.append(f"Estimated total: {_money(round(sum(priced), 2), currency)}.")
+    return "\n".join(lines)
+
+
+def _money(amount, currency: str = "USD") -> str:
+    if amount is None:
+        return ""
+    return f"${amount:,.2f}/month" if currency == "USD" else f"{amount:,.2f} {currency}/month"
+
+
+def render_cpu_report(command: FastPathCommand, report) -> str:
+    """Templated answer around call_cpu_utilization_agent's report; None if it is an error."""
+    if not isinstance(report, str) or not report.strip() or report.startswith(_CPU_ERROR_PREFIXES):
+        return None
+    return f"CPU utilization for the VMs in project {command.project_id}, zone {command.zone}:\n\n{report.strip()}"
+
+
+class FastPathRouter:
+    """Answers parsed commands with the tools directly and counts the outcomes.
+
+    Args:
+        list_vms_fn: Blocking ``(project_id, zone)`` callable, run in a worker thread.
+        cpu_report_fn: Async ``(project_id, zone)`` callable returning the report text.
+    """
+
+    def __init__(self, list_vms_fn, cpu_report_fn):
+        self.list_vms_fn = list_vms_fn
+        self.cpu_report_fn = cpu_report_fn
+        self._lock = threading.Lock()
+        self.counts = {"answered": 0, "not_matched": 0, "fallbacks": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    async def route(self, text: str):
+        """Returns the answer text for ``text``, or None to let the model handle it."""
+        command = parse_command(text)
+        if command is None:
+            self._count("not_matched")
+            return None
+        if command.kind == "list_vms":
+            result = await asyncio.to_thread(self.list_vms_fn, command.project_id, command.zone)
+            answer = render_vm_list(command, result)
+        else:
+            report = await self.cpu_report_fn(command.project_id, command.zone)
+            answer = render_cpu_report(command, report)
+        self._count("fallbacks" if answer is None else "answered")
+        return answer
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,271 @@
+"""Shared pooled HTTP client for the agent-tools and search Cloud Run endpoints.
+
+Every tool in agent.py used to call ``requests.post`` directly, paying a new
+TCP+TLS handshake per call. This module keeps one process-wide client with
+keep-alive connection pooling, a per-host connection limit, per-endpoint
+timeouts and optional HTTP/2 (through ``httpx`` when it is installed).
+
+Configuration (all optional, read from the environment / .env file):
+    AGENT_TOOLS_URL          Base URL of the agent-tools Cloud Run service.
+    SEARCH_AGENT_URL         Full URL of the DuckDuckGo search endpoint.
+    HTTP_POOL_CONNECTIONS    Number of per-host pools kept alive (default 10).
+    HTTP_POOL_MAXSIZE        Max open connections per host (default 32).
+    HTTP_CONNECT_TIMEOUT     Connect timeout in seconds for every endpoint.
+    LIST_VMS_TIMEOUT         Read timeout for /list_vms (default 30).
+    DELETE_VMS_TIMEOUT       Read timeout for /delete_vms (default 60).
+    SEARCH_TIMEOUT           Read timeout for /search (default 120).
+    HTTP_CLIENT_HTTP2        "true" to use HTTP/2 (requires httpx[http2]).
+
+Resilience policy applied by the module-level ``post_json`` (see resilience.py):
+    LIST_VMS_DEADLINE        Total budget for a /list_vms call incl. retries (default 45).
+    DELETE_VMS_DEADLINE      Total budget for a /delete_vms call (default 60).
+    SEARCH_DEADLINE          Total budget for a /search call incl. retries and hedges
+                             (default: connect + read timeout, i.e. 125).
+    HTTP_MAX_ATTEMPTS        Attempts for idempotent endpoints (default 3).
+                             /delete_vms is never retried or hedged.
+    LIST_VMS_HEDGE_AFTER     Seconds before a hedged /list_vms request is sent (default 2; 0 disables).
+    SEARCH_HEDGE_AFTER       Seconds before a hedged /search request is sent (default 10; 0 disables).
+    HTTP_BREAKER_FAILURES    Consecutive failures that open an endpoint's breaker (default 5).
+    HTTP_BREAKER_RESET       Seconds an open breaker fails fast before probing (default 30).
+
+Behaviour change for /search: the baseline gave every search a single
+120 s read timeout. A search now gets SEARCH_DEADLINE in total, so a
+retry only happens when an earlier attempt failed quickly. A lower
+SEARCH_DEADLINE also caps each attempt's read timeout.
+"""
+import atexit
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import instrumentation
+from .resilience import ResilientClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_TOOLS_URL = "https://agent-tools-912533822336.us-central1.run.app"
+DEFAULT_SEARCH_AGENT_URL = "https://ddsearchlangcagent-qcdyf5u6mq-uc.a.run.app/search"
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """A remote endpoint together with its timeouts and resilience policy (in seconds).
+
+    ``deadline`` defaults to one full connect + read. Retries (up to
+    ``max_attempts``) and hedging after ``hedge_after`` seconds only apply
+    when ``idempotent`` is set.
+    """
+    name: str
+    url: str
+    connect_timeout: float
+    read_timeout: float
+    deadline: Optional[float] = None
+    idempotent: bool = False
+    max_attempts: int = 1
+    hedge_after: Optional[float] = None
+
+    def __post_init__(self):
+        if self.deadline is None:
+            object.__setattr__(self, "deadline", self.connect_timeout + self.read_timeout)
+
+    @property
+    def timeout(self) -> tuple:
+        return (self.connect_timeout, self.read_timeout)
+
+
+def _default_endpoints() -> dict:
+    # Read at first use rather than import time so values from .env apply.
+    connect_timeout = _env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+    base_url = os.getenv("AGENT_TOOLS_URL", DEFAULT_AGENT_TOOLS_URL).rstrip("/")
+    search_url = os.getenv("SEARCH_AGENT_URL", DEFAULT_SEARCH_AGENT_URL)
+    max_attempts = _env_int("HTTP_MAX_ATTEMPTS", 3)
+    return {
+        "list_vms": Endpoint("list_vms", f"{base_url}/list_vms", connect_timeout, _env_float("LIST_VMS_TIMEOUT", 30.0),
+                             deadline=_env_float("LIST_VMS_DEADLINE", 45.0), idempotent=True,
+                             max_attempts=max_attempts, hedge_after=_env_float("LIST_VMS_HEDGE_AFTER", 2.0)),
+        # Deletes are not idempotent from the caller's side: a retried delete
+        # whose first attempt did go through reports an error. One attempt only.
+        "delete_vms": Endpoint("delete_vms", f"{base_url}/delete_vms", connect_timeout, _env_float("DELETE_VMS_TIMEOUT", 60.0),
+                               deadline=_env_float("DELETE_VMS_DEADLINE", 60.0)),
+        "search": Endpoint("search", search_url, connect_timeout, _env_float("SEARCH_TIMEOUT", 120.0),
+                           deadline=_env_float("SEARCH_DEADLINE", None), idempotent=True,
+                           max_attempts=max_attempts, hedge_after=_env_float("SEARCH_HEDGE_AFTER", 10.0)),
+    }
+
+
+class PooledHttpClient:
+    """Thread-safe JSON-over-HTTP client that reuses connections across tool calls.
+
+    Args:
+        endpoints: Mapping of endpoint name to ``Endpoint``.
+        pool_connections: Number of per-host connection pools to keep.
+        pool_maxsize: Maximum number of connections kept open per host.
+        http2: Use HTTP/2 through ``httpx`` if it is installed.
+    """
+
+    def __init__(self, endpoints: dict, pool_connections: int = 10, pool_maxsize: int = 32, http2: bool = False):
+        self.endpoints = dict(endpoints)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.http2 = http2 and _httpx_available()
+        self._lock = threading.Lock()
+        self._session = None
+
+    def _get_session(self):
+        # Created on first use so importing this module never opens sockets.
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
+        if self.http2:
+            import httpx
+            limits = httpx.Limits(
+                max_connections=self.pool_connections * self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            )
+            return httpx.Client(http2=True, limits=limits, headers={"Content-Type": "application/json"})
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, pool_block=False)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Content-Type": "application/json"})
+        return session
+
+    def endpoint(self, name: str) -> Endpoint:
+        try:
+            return self.endpoints[name]
+        except KeyError:
+            raise ValueError(f"Unknown endpoint '{name}'. Known endpoints: {sorted(self.endpoints)}")
+
+    def post_json(self, endpoint_name: str, payload: dict, timeout: Optional[tuple] = None):
+        """POSTs ``payload`` as JSON to a named endpoint.
+
+        Args:
+            endpoint_name: Key into ``self.endpoints`` (e.g. "list_vms").
+            payload: JSON-serialisable request body.
+            timeout: Optional (connect, read) override for this call.
+
+        Returns:
+            The response object; it exposes ``json()``, ``text`` and ``status_code``.
+
+        Raises:
+            requests.exceptions.RequestException: On timeouts, connection errors
+                and 4xx/5xx responses, regardless of the underlying transport.
+        """
+        endpoint = self.endpoint(endpoint_name)
+        timeout = timeout or endpoint.timeout
+        session = self._get_session()
+        if not self.http2:
+            response = session.post(endpoint.url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response
+        return self._post_json_httpx(session, endpoint.url, payload, timeout)
+
+    @staticmethod
+    def _post_json_httpx(session, url: str, payload: dict, timeout: tuple):
+        # Map httpx errors onto requests' exception hierarchy so callers only
+        # have to handle one set of exceptions.
+        import httpx
+        try:
+            response = session.post(url, json=payload, timeout=httpx.Timeout(timeout[1], connect=timeout[0]))
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        if response.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{response.status_code} Error for url: {url}", response=response
+            )
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+def _httpx_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP/2 requested but httpx[http2] is not installed. Falling back to HTTP/1.1 keep-alive.")
+        return False
+    return True
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> PooledHttpClient:
+    """Returns the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PooledHttpClient(
+                    _default_endpoints(),
+                    pool_connections=_env_int("HTTP_POOL_CONNECTIONS", 10),
+                    pool_maxsize=_env_int("HTTP_POOL_MAXSIZE", 32),
+                    http2=_env_bool("HTTP_CLIENT_HTTP2"),
+                )
+                atexit.register(_client.close)
+    return _client
+
+
+_resilient_client = None
+
+
+def get_resilient_client() -> ResilientClient:
+    """Returns the process-wide ``ResilientClient`` around ``get_client()``."""
+    global _resilient_client
+    if _resilient_client is None:
+        client = get_client()
+        with _client_lock:
+            if _resilient_client is None:
+                _resilient_client = ResilientClient(
+                    client,
+                    failure_threshold=_env_int("HTTP_BREAKER_FAILURES", 5),
+                    reset_timeout=_env_float("HTTP_BREAKER_RESET", 30.0),
+                )
+                atexit.register(_resilient_client.close)
+    return _resilient_client
+
+
+def post_json(endpoint_name: str, payload: dict):
+    """POSTs through ``get_resilient_client()`` (deadline, retries, hedging,
+    circuit breaker), timed as an "http" span."""
+    with instrumentation.span("http", endpoint_name):
+        return get_resilient_client().post_json(endpoint_name, payload)
+
+
+def resilience_stats() -> dict:
+    """Per-endpoint retry/hedge/breaker counters of the shared client."""
+    return get_resilient_client().stats()
@@ -0,0 +1,212 @@
+"""Spans and latency histograms for tools, callbacks, embeddings and MCP inserts.
+
+Wrap a function with ``traced(kind)`` or a block with ``span(kind, name)``.
+Each run is recorded in three places:
+
+    local histogram  Prometheus-style cumulative buckets, one series per
+                     (kind, name, outcome). ``render_prometheus()`` returns the
+                     text exposition format, and ``start_metrics_server(port)``
+                     serves it on /metrics (agent.py starts it when METRICS_PORT
+                     is set).
+    OpenTelemetry    When ``opentelemetry-api`` is importable (ADK depends on
+                     it), every run is an OTel span, and the duration is also
+                     recorded on the ``finops_agent.operation.duration``
+                     histogram. Both are no-ops until an SDK/exporter is
+                     configured, e.g. by ``adk web --trace_to_cloud`` or
+                     OTEL_* settings.
+
+Spans and histograms cost a few microseconds, so they stay on all the time.
+"""
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry import metrics as _otel_metrics
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_metrics = _otel_trace = None
+
+METRIC_NAME = "finops_agent_operation_seconds"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_tracer = _otel_trace.get_tracer("finops_agent") if _otel_trace else None
+_otel_histogram = (
+    _otel_metrics.get_meter("finops_agent").create_histogram(
+        "finops_agent.operation.duration", unit="s", description="Duration of agent tools, callbacks and I/O calls.")
+    if _otel_metrics else None
+)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket latency histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound below which a fraction ``q`` of observations fall."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target, running = q * self.count, 0
+            for bound, n in zip(self.buckets, self.counts):
+                running += n
+                if running >= target:
+                    return bound
+            return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"count": self.count, "sum": self.sum, "counts": list(self.counts)}
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(kind: str, name: str, seconds: float, outcome: str = "ok"):
+    """Records one duration for the (kind, name, outcome) series."""
+    key = (kind, name, outcome)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(seconds)
+    if _otel_histogram is not None:
+        _otel_histogram.record(seconds, {"kind": kind, "name": name, "outcome": outcome})
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """Times the block as one ``kind``/``name`` operation; outcome is "error" if it raises."""
+    otel_span = _tracer.start_as_current_span(f"{kind} {name}", attributes=attributes) if _tracer else None
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        if otel_span is None:
+            yield
+        else:
+            with otel_span:
+                yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        observe(kind, name, time.perf_counter() - start, outcome)
+
+
+def traced(kind: str, name: str = None):
+    """Decorator form of ``span`` for sync and async functions.
+
+    ``functools.wraps`` keeps the name, docstring and signature, so ADK still
+    builds the same tool declaration from a decorated tool function.
+    """
+    def decorator(fn):
+        label = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary() -> dict:
+    """{"kind:name": {count, mean_s, p50_s, p95_s, errors}} over all recorded series."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    result = {}
+    for (kind, name, outcome), histogram in sorted(items):
+        entry = result.setdefault(f"{kind}:{name}", {"count": 0, "errors": 0})
+        snapshot = histogram.snapshot()
+        if outcome == "error":
+            entry["errors"] += snapshot["count"]
+            continue
+        entry.update(count=snapshot["count"],
+                     mean_s=round(snapshot["sum"] / snapshot["count"], 6) if snapshot["count"] else 0.0,
+                     p50_s=histogram.quantile(0.5), p95_s=histogram.quantile(0.95))
+    return result
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    """All histograms in the Prometheus text exposition format (version 0.0.4)."""
+    lines = [f"# HELP {METRIC_NAME} Duration of agent tools, callbacks and I/O calls.",
+             f"# TYPE {METRIC_NAME} histogram"]
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    for (kind, name, outcome), histogram in items:
+        labels = f'kind="{_escape(kind)}",name="{_escape(name)}",outcome="{_escape(outcome)}"'
+        snapshot = histogram.snapshot()
+        running = 0
+        for bound, n in zip(histogram.buckets, snapshot["counts"]):
+            running += n
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {running}')
+        lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {snapshot["count"]}')
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {snapshot['sum']:.6f}")
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {snapshot['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serves ``render_prometheus()`` on http://host:port/metrics from a daemon thread (once)."""
+    global _server
+    with _histograms_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
@@ -0,0 +1,165 @@
+"""Background pipeline that embeds and stores interaction records off the model path.
+
+``log_interaction_after_model`` only calls ``InteractionLogger.submit``, which
+never blocks on the network. A single worker thread drains the queue in
+batches and flushes when ``batch_size`` records are waiting or when
+``flush_interval`` seconds have passed. For each batch it calls:
+
+    embed_fn(records) -> list of vectors      (blocking, on the worker thread)
+    insert_fn(rows)   -> coroutine            (awaited on the worker's own loop)
+
+The worker owns one long-lived asyncio event loop, so async clients such as
+the MCP ToolboxClient keep their connections across batches instead of being
+rebuilt by ``asyncio.run`` on every call. The queue is bounded. When it is
+full, ``submit`` waits at most ``enqueue_timeout`` seconds and then drops the
+record and counts it. ``shutdown`` (also registered with atexit) flushes
+whatever is still queued, then awaits ``close_fn`` on the worker's loop so
+the clients that lived on it are closed before the loop stops.
+"""
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class InteractionLogger:
+    """Bounded queue plus one worker thread that flushes interaction records in batches.
+
+    Args:
+        embed_fn: Callable taking a list of record dicts and returning one
+            vector (or None) per record.
+        insert_fn: Async callable taking a list of row dicts to persist.
+        max_queue: Queue capacity; records beyond it are dropped.
+        batch_size: Flush as soon as this many records are waiting.
+        flush_interval: Flush at least this often (seconds) while records wait.
+        enqueue_timeout: How long ``submit`` may block when the queue is full.
+        close_fn: Optional async callable awaited on the worker's loop at
+            shutdown, after the last batch.
+    """
+
+    def __init__(self, embed_fn, insert_fn, max_queue: int = 1000, batch_size: int = 32,
+                 flush_interval: float = 2.0, enqueue_timeout: float = 0.0, close_fn=None):
+        self.embed_fn = embed_fn
+        self.insert_fn = insert_fn
+        self.close_fn = close_fn
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._closed = False
+        self.stats = {"enqueued": 0, "dropped": 0, "written": 0, "failed": 0, "batches": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run, name="interaction-logger", daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+        return self
+
+    def submit(self, record: dict) -> bool:
+        """Queues one record for logging. Returns False if it was dropped."""
+        if self._closed:
+            self._count("dropped")
+            return False
+        if self._thread is None:
+            self.start()
+        try:
+            if self.enqueue_timeout > 0:
+                self._queue.put(record, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def schedule(self, coro):
+        """Schedules ``coro`` on the worker's event loop; returns a concurrent Future."""
+        if self._thread is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run_coroutine(self, coro, timeout: float = None):
+        """Runs ``coro`` on the worker's event loop from any other thread and waits for it."""
+        return self.schedule(coro).result(timeout)
+
+    def _run(self):
+        loop = self._loop
+        runner = threading.Thread(target=loop.run_forever, name="interaction-logger-loop", daemon=True)
+        runner.start()
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._flush(batch)
+        finally:
+            if self.close_fn is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(self.close_fn(), loop).result(timeout=5)
+                except Exception:
+                    logger.exception("[InteractionLogger] close_fn failed")
+            loop.call_soon_threadsafe(loop.stop)
+            runner.join(timeout=5)
+
+    def _next_batch(self) -> tuple:
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch, False
+
+    def _flush(self, batch: list):
+        self._count("batches")
+        try:
+            vectors = self.embed_fn(batch)
+            rows = [dict(record, vector=vector) for record, vector in zip(batch, vectors)]
+            asyncio.run_coroutine_threadsafe(self.insert_fn(rows), self._loop).result()
+            self._count("written", len(rows))
+        except Exception:
+            self._count("failed", len(batch))
+            logger.exception("[InteractionLogger] Failed to write batch of %d", len(batch))
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stops accepting records, flushes what is queued and stops the worker."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        # The sentinel must get in even when the queue is full.
+        while True:
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                if not thread.is_alive():
+                    return
+        thread.join(timeout)
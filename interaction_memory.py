@@ -0,0 +1,259 @@
+"""Recall of similar past interactions through an approximate-nearest-neighbour index.
+
+Two backends, selected with INTERACTION_MEMORY_BACKEND:
+
+    pgvector  Queries the user-action table through an MCP toolbox tool
+              (RECALL_TOOL_NAME). The table should carry an HNSW index, see
+              ``PGVECTOR_HNSW_DDL`` and ``PGVECTOR_RECALL_TOOL_YAML`` below.
+              The search settings are configured once for the toolbox's
+              role or database (``PGVECTOR_SEARCH_SETTINGS_DDL``), not in
+              the tool statement.
+    local     An in-process index fed by the interaction logger. It uses
+              ``hnswlib`` when installed and otherwise an IVF-flat index
+              (k-means partitions, probe the closest ``nprobe``) in NumPy.
+              Searches are always restricted to one user's rows; users with
+              few rows are scanned exactly.
+
+All vectors are L2-normalised, so inner product equals cosine similarity.
+"""
+import threading
+
+import numpy as np
+
+# Run once against the logging database (adjust table/column names to yours).
+PGVECTOR_HNSW_DDL = """
+CREATE INDEX IF NOT EXISTS user_actions_vector_hnsw
+    ON user_actions USING hnsw (vector_value vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+"""
+
+# Search settings for the role the MCP toolbox connects as (or use ALTER
+# DATABASE ... SET for every role). The toolbox may run a statement outside a
+# transaction, where SET LOCAL has no effect. iterative_scan (pgvector 0.8+)
+# keeps scanning the index until the user_id filter has top_k rows.
+PGVECTOR_SEARCH_SETTINGS_DDL = """
+ALTER ROLE toolbox_user SET hnsw.ef_search = 64;
+ALTER ROLE toolbox_user SET hnsw.iterative_scan = relaxed_order;
+"""
+
+# tools.yaml entry for the recall tool served by the MCP toolbox.
+PGVECTOR_RECALL_TOOL_YAML = """
+  recall-user-actions:
+    kind: postgres-sql
+    source: my-pg-source
+    description: Top-k past actions and results most similar to a query vector.
+    parameters:
+      - name: user_id
+        type: string
+        description: User whose history is searched.
+      - name: query_vector
+        type: string
+        description: Query embedding as a '[x1,x2,...]' literal.
+      - name: top_k
+        type: integer
+        description: Number of rows to return.
+    statement: |
+      SELECT action, result, 1 - (vector_value <=> $2::vector) AS similarity
+      FROM user_actions WHERE user_id = $1
+      ORDER BY vector_value <=> $2::vector LIMIT $3;
+"""
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if scores.shape[0] <= k:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class IVFFlatIndex:
+    """Inverted-file index over normalised vectors; exact search until trained.
+
+    A search for one owner scans that owner's rows exactly while they are
+    fewer than ``exact_owner_limit``. Above that it probes the partitions,
+    keeps only the owner's rows, and falls back to the exact scan when the
+    probed partitions hold fewer than ``k`` of them.
+
+    Args:
+        dim: Vector dimension.
+        nprobe: Partitions scanned per query.
+        train_threshold: Size at which the first k-means training happens. The
+            index retrains whenever it has doubled since the last training.
+        exact_owner_limit: Owners with fewer rows are always scanned exactly.
+    """
+
+    def __init__(self, dim: int, nprobe: int = 8, train_threshold: int = 4096, seed: int = 0,
+                 exact_owner_limit: int = 4096):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.exact_owner_limit = exact_owner_limit
+        self._rng = np.random.default_rng(seed)
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._owners = np.zeros(1024, dtype=np.int32)
+        self.size = 0
+        self._centroids = None
+        self._lists = []
+        self._assignments = np.zeros(1024, dtype=np.int32)
+        self._trained_size = 0
+        self._owner_rows = {}
+
+    def _grow(self, needed: int):
+        capacity = self._vectors.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        if capacity != self._vectors.shape[0]:
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._owners = np.resize(self._owners, capacity)
+            self._assignments = np.resize(self._assignments, capacity)
+
+    def add(self, vectors: np.ndarray, owners: np.ndarray):
+        vectors = _normalize(vectors)
+        start, end = self.size, self.size + vectors.shape[0]
+        self._grow(end)
+        self._vectors[start:end] = vectors
+        self._owners[start:end] = owners
+        self.size = end
+        ids = np.arange(start, end)
+        owners = self._owners[start:end]
+        for owner in np.unique(owners):
+            rows = self._owner_rows.get(int(owner), np.zeros(0, dtype=np.int64))
+            self._owner_rows[int(owner)] = np.concatenate([rows, ids[owners == owner]])
+        if self.size >= self.train_threshold and self.size >= 2 * max(self._trained_size, self.train_threshold // 2):
+            self._train()
+        elif self._centroids is not None:
+            self._assign(start, end)
+
+    def _train(self, iterations: int = 10):
+        data = self._vectors[:self.size]
+        nlist = max(1, int(np.sqrt(self.size)))
+        sample = data[self._rng.choice(self.size, size=min(self.size, nlist * 64), replace=False)]
+        centroids = sample[self._rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self._centroids = centroids
+        self._lists = [np.zeros(0, dtype=np.int64) for _ in range(nlist)]
+        self._trained_size = self.size
+        self._assign(0, self.size)
+
+    def _assign(self, start: int, end: int):
+        labels = np.argmax(self._vectors[start:end] @ self._centroids.T, axis=1)
+        self._assignments[start:end] = labels
+        ids = np.arange(start, end)
+        for c in np.unique(labels):
+            self._lists[c] = np.concatenate([self._lists[c], ids[labels == c]])
+
+    def search(self, query: np.ndarray, k: int, owner: int = None) -> tuple:
+        """Returns (ids, similarities) of the ``k`` nearest vectors, optionally for one owner."""
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = _normalize(query)[0]
+        owned = None if owner is None else self._owner_rows.get(int(owner), np.zeros(0, dtype=np.int64))
+        if owned is not None and (self._centroids is None or len(owned) < self.exact_owner_limit):
+            candidates = owned
+        elif self._centroids is None:
+            candidates = np.arange(self.size)
+        else:
+            probes = _top_k(self._centroids @ query, min(self.nprobe, len(self._lists)))
+            candidates = np.concatenate([self._lists[c] for c in probes])
+            if owned is not None:
+                candidates = candidates[self._owners[candidates] == owner]
+                if len(candidates) < min(k, len(owned)):
+                    candidates = owned
+        scores = self._vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+class HnswIndex:
+    """hnswlib-backed index with the same interface as ``IVFFlatIndex``."""
+
+    def __init__(self, dim: int, ef_search: int = 64, m: int = 16, ef_construction: int = 100):
+        import hnswlib
+        self.dim = dim
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(max_elements=1024, M=m, ef_construction=ef_construction)
+        self._index.set_ef(ef_search)
+        self._owners = np.zeros(1024, dtype=np.int32)
+        self.size = 0
+
+    def add(self, vectors: np.ndarray, owners: np.ndarray):
+        vectors = _normalize(vectors)
+        end = self.size + vectors.shape[0]
+        if end > self._index.get_max_elements():
+            self._index.resize_index(max(end, 2 * self._index.get_max_elements()))
+            self._owners = np.resize(self._owners, self._index.get_max_elements())
+        self._index.add_items(vectors, np.arange(self.size, end))
+        self._owners[self.size:end] = owners
+        self.size = end
+
+    def search(self, query: np.ndarray, k: int, owner: int = None) -> tuple:
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        owners = self._owners
+        filter_fn = None if owner is None else (lambda i: owners[i] == owner)
+        # knn_query fails when fewer than k rows pass the filter.
+        k = min(k, self.size if owner is None else int(np.count_nonzero(owners[:self.size] == owner)))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        try:
+            labels, distances = self._index.knn_query(_normalize(query), k=k, filter=filter_fn)
+        except RuntimeError:
+            # The filtered graph search found fewer than k of the owner's rows.
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+
+def create_local_index(dim: int):
+    """HNSW when ``hnswlib`` is installed, otherwise the NumPy IVF-flat index."""
+    try:
+        return HnswIndex(dim)
+    except ImportError:
+        return IVFFlatIndex(dim)
+
+
+class LocalInteractionMemory:
+    """Thread-safe in-process store of logged interactions with ANN recall."""
+
+    def __init__(self, index_factory=create_local_index):
+        self._index_factory = index_factory
+        self._index = None
+        self._records = []
+        self._owner_codes = {}
+        self._lock = threading.Lock()
+
+    def add(self, rows: list):
+        """Adds logged rows (dicts with user_id, action, result, vector)."""
+        rows = [row for row in rows if row.get("vector") is not None]
+        if not rows:
+            return
+        with self._lock:
+            if self._index is None:
+                self._index = self._index_factory(len(rows[0]["vector"]))
+            owners = np.array([self._owner_codes.setdefault(r["user_id"], len(self._owner_codes)) for r in rows])
+            self._index.add(np.array([r["vector"] for r in rows], dtype=np.float32), owners)
+            self._records.extend({"action": r["action"], "result": r["result"]} for r in rows)
+
+    def search(self, user_id: str, query_vector: list, top_k: int = 5) -> list:
+        with self._lock:
+            if self._index is None or user_id not in self._owner_codes:
+                return []
+            ids, scores = self._index.search(np.asarray(query_vector), top_k, owner=self._owner_codes[user_id])
+            return [dict(self._records[i], similarity=round(float(s), 4)) for i, s in zip(ids, scores)]
+
+    def __len__(self):
+        return len(self._records)
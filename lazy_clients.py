@@ -0,0 +1,50 @@
+"""Registry of heavy SDK clients that are created on first use, not at import.
+
+Importing agent.py used to run ``vertexai.init`` and build a ``ToolboxClient``
+at module load, which dominated Cloud Run cold starts. Modules now register
+a zero-argument factory under a name, and ``get(name)`` runs it exactly once,
+the first time the client is actually needed.
+
+    lazy_clients.register("vertexai", _init_vertexai)
+    vertexai = lazy_clients.get("vertexai")
+"""
+import threading
+
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+
+def register(name: str, factory, replace: bool = False):
+    """Registers ``factory`` for ``name``. An existing registration wins unless ``replace``."""
+    with _lock:
+        if replace or name not in _factories:
+            _factories[name] = factory
+            if replace:
+                _instances.pop(name, None)
+
+
+def get(name: str):
+    """Returns the client registered as ``name``, creating it on the first call."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            try:
+                factory = _factories[name]
+            except KeyError:
+                raise KeyError(f"No lazy client registered as '{name}'. Registered: {sorted(_factories)}")
+            _instances[name] = factory()
+        return _instances[name]
+
+
+def is_created(name: str) -> bool:
+    return name in _instances
+
+
+def reset(name: str):
+    """Forgets the created instance so the next ``get`` builds a fresh one."""
+    with _lock:
+        _instances.pop(name, None)
@@ -0,0 +1,231 @@
+"""Offline machine-type price catalog and vectorized VM cost / savings estimates.
+
+The catalog is loaded from a JSON snapshot (PRICE_CATALOG_PATH, default
+price_catalog.json next to this module). No VM needs a network call to be
+priced. Hourly prices are indexed by (machine type, region, commitment).
+A type missing from the snapshot, e.g. a custom type such as
+n2-custom-6-24576, is priced from its family's per-vCPU and per-GB rates
+in that region.
+
+Fleet listings are priced in bulk:
+
+    1. Each distinct (type, region) pair is resolved once.
+    2. ``np.unique``'s inverse index spreads the prices back over all VMs.
+    3. Costs and savings are computed as array arithmetic.
+
+Savings rules:
+
+    delete     saves the VM's whole monthly cost.
+    downsize   saves the difference to the next smaller size of the same
+               family and class that the catalog lists for the region
+               (``PriceCatalog.downsize_target``), e.g. n2-standard-8 ->
+               n2-standard-4, c2-standard-30 -> c2-standard-16.
+
+Snapshot format::
+
+    {"currency": "USD", "hours_per_month": 730,
+     "prices": [{"machine_type", "region", "commitment", "hourly"}, ...],
+     "family_rates": [{"family", "region", "commitment", "vcpu_hourly", "gb_hourly"}, ...]}
+"""
+import json
+import os
+import re
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_catalog.json")
+
+# GB of memory per vCPU for predefined classes; N1 has its own ratios.
+_MEMORY_PER_VCPU = {"standard": 4.0, "highmem": 8.0, "highcpu": 1.0}
+_N1_MEMORY_PER_VCPU = {"standard": 3.75, "highmem": 6.5, "highcpu": 0.9}
+_PREDEFINED = re.compile(r"^([a-z][a-z0-9]*)-(standard|highmem|highcpu)-([0-9]+)$")
+_CUSTOM = re.compile(r"^([a-z][a-z0-9]*)-custom-([0-9]+)-([0-9]+)(?:-ext)?$")
+# Keys a /list_vms object may hold its instance list under (as in vm_fleet).
+_LISTING_KEYS = ("instances", "vms", "items", "result")
+
+
+def region_of(zone: str) -> str:
+    """'us-central1-a' -> 'us-central1'."""
+    return zone.rsplit("-", 1)[0] if zone and zone.count("-") >= 2 else zone or ""
+
+
+def parse_machine_type(machine_type: str) -> Optional[tuple]:
+    """Returns (family, vcpus, memory_gb) for predefined and custom types, else None."""
+    machine_type = str(machine_type or "").rsplit("/", 1)[-1]
+    match = _PREDEFINED.match(machine_type)
+    if match:
+        family, machine_class, vcpus = match.group(1), match.group(2), int(match.group(3))
+        ratios = _N1_MEMORY_PER_VCPU if family == "n1" else _MEMORY_PER_VCPU
+        return family, vcpus, vcpus * ratios[machine_class]
+    match = _CUSTOM.match(machine_type)
+    if match:
+        # Custom N1 types are spelled "custom-<vcpus>-<mb>", handled by the caller.
+        return match.group(1), int(match.group(2)), int(match.group(3)) / 1024.0
+    match = re.match(r"^custom-([0-9]+)-([0-9]+)(?:-ext)?$", machine_type)
+    if match:
+        return "n1", int(match.group(1)), int(match.group(2)) / 1024.0
+    return None
+
+
+class PriceCatalog:
+    """Hourly machine-type prices keyed by (machine_type, region, commitment).
+
+    Args:
+        prices: {(machine_type, region, commitment): hourly price}.
+        family_rates: {(family, region, commitment): (vcpu_hourly, gb_hourly)}
+            used for types missing from ``prices``.
+        hours_per_month: Hours billed per month (730 on GCP price pages).
+        currency: Currency of all prices.
+        snapshot_date: When the snapshot was taken, reported with the estimates.
+    """
+
+    def __init__(self, prices: dict, family_rates: dict = None, hours_per_month: float = 730.0,
+                 currency: str = "USD", snapshot_date: str = ""):
+        self.prices = dict(prices)
+        self.family_rates = dict(family_rates or {})
+        self.hours_per_month = hours_per_month
+        self.currency = currency
+        self.snapshot_date = snapshot_date
+        # (family, class, region, commitment) -> listed vCPU sizes, ascending.
+        self._sizes = {}
+        for machine_type, region, commitment in self.prices:
+            match = _PREDEFINED.match(machine_type)
+            if match:
+                self._sizes.setdefault((match.group(1), match.group(2), region, commitment), []).append(int(match.group(3)))
+        for sizes in self._sizes.values():
+            sizes.sort()
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_CATALOG_PATH) -> "PriceCatalog":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            prices={(p["machine_type"], p["region"], p.get("commitment", "none")): float(p["hourly"])
+                    for p in data.get("prices", [])},
+            family_rates={(r["family"], r["region"], r.get("commitment", "none")): (float(r["vcpu_hourly"]), float(r["gb_hourly"]))
+                          for r in data.get("family_rates", [])},
+            hours_per_month=float(data.get("hours_per_month", 730.0)),
+            currency=data.get("currency", "USD"),
+            snapshot_date=data.get("snapshot_date", ""),
+        )
+
+    def hourly_price(self, machine_type: str, region: str, commitment: str = "none") -> Optional[float]:
+        """Exact snapshot price, else the family-rate estimate, else None."""
+        machine_type = str(machine_type or "").rsplit("/", 1)[-1]
+        price = self.prices.get((machine_type, region, commitment))
+        if price is not None:
+            return price
+        shape = parse_machine_type(machine_type)
+        rates = self.family_rates.get((shape[0], region, commitment)) if shape else None
+        if rates is None:
+            return None
+        return shape[1] * rates[0] + shape[2] * rates[1]
+
+    def downsize_target(self, machine_type: str, region: str, commitment: str = "none") -> Optional[str]:
+        """The next smaller catalog-listed size of the same family and class in ``region``.
+
+        None for custom types, and when the catalog lists no smaller size.
+        """
+        match = _PREDEFINED.match(str(machine_type or "").rsplit("/", 1)[-1])
+        if not match:
+            return None
+        sizes = self._sizes.get((match.group(1), match.group(2), region, commitment), [])
+        smaller = [vcpus for vcpus in sizes if vcpus < int(match.group(3))]
+        return f"{match.group(1)}-{match.group(2)}-{smaller[-1]}" if smaller else None
+
+    def monthly_costs(self, machine_types, regions, commitment: str = "none") -> np.ndarray:
+        """Monthly cost per VM (float64 array, NaN where the type cannot be priced)."""
+        if not len(machine_types):
+            return np.zeros(0)
+        keys = np.char.add(np.char.add(np.asarray(machine_types, dtype=str), "|"), np.asarray(regions, dtype=str))
+        unique, inverse = np.unique(keys, return_inverse=True)
+        hourly = np.array([
+            np.nan if (price := self.hourly_price(*key.split("|"), commitment)) is None else price
+            for key in unique
+        ])
+        return hourly[inverse] * self.hours_per_month
+
+    def _totals(self, costs: np.ndarray) -> dict:
+        priced = np.isfinite(costs)
+        return {
+            "currency": self.currency,
+            "price_snapshot": self.snapshot_date,
+            "priced_vms": int(priced.sum()),
+            "unpriced_vms": int((~priced).sum()),
+        }
+
+    def annotate_inventory(self, inventory: dict, commitment: str = "none") -> dict:
+        """Adds a "monthly_cost" column and a cost summary to a vm_fleet inventory table."""
+        columns = inventory["columns"]
+        type_col, zone_col = columns.index("machine_type"), columns.index("zone")
+        rows = inventory["rows"]
+        costs = self.monthly_costs([r[type_col] for r in rows], [region_of(r[zone_col]) for r in rows], commitment)
+        return {
+            **inventory,
+            "columns": columns + ["monthly_cost"],
+            "rows": [row + [_money(cost)] for row, cost in zip(rows, costs)],
+            "cost_summary": {**self._totals(costs), "total_monthly_cost": _money(np.nansum(costs))},
+        }
+
+    def annotate_listing(self, response, zone: str, commitment: str = "none"):
+        """A copy of a /list_vms response with "monthly_cost" added per instance.
+
+        The response keeps its shape. A bare list stays a list. An object
+        keeps its instance list under the same key and also gets a
+        "cost_summary". Unknown shapes are returned unchanged. The response
+        may be cached, so it is never modified.
+        """
+        if isinstance(response, list):
+            key, instances = None, response
+        else:
+            key = next((k for k in _LISTING_KEYS if isinstance(response, dict) and isinstance(response.get(k), list)), None)
+            if key is None:
+                return response
+            instances = response[key]
+        types = [str(vm.get("machine_type") or vm.get("machineType") or "") if isinstance(vm, dict) else ""
+                 for vm in instances]
+        costs = self.monthly_costs(types, [region_of(zone)] * len(types), commitment)
+        annotated = [{**vm, "monthly_cost": _money(cost)} if isinstance(vm, dict) else vm
+                     for vm, cost in zip(instances, costs)]
+        if key is None:
+            return annotated
+        return {
+            **response,
+            key: annotated,
+            "cost_summary": {**self._totals(costs), "total_monthly_cost": _money(np.nansum(costs))},
+        }
+
+    def annotate_plan(self, candidates: list, machine_types: dict, commitment: str = "none") -> dict:
+        """Adds "machine_type", "monthly_cost" and "monthly_savings" to delete/downsize candidates.
+
+        Args:
+            candidates: Dicts with "instance_id", "zone" and optionally
+                "action" ("delete" when absent, or "downsize").
+            machine_types: {instance_id: machine_type}, e.g. from list_vm_instances.
+            commitment: Pricing commitment ("none", "1yr", "3yr").
+
+        Returns:
+            A savings summary; the candidate dicts are updated in place.
+        """
+        types = [str(machine_types.get(c.get("instance_id"), "")).rsplit("/", 1)[-1] for c in candidates]
+        regions = [region_of(c.get("zone", "")) for c in candidates]
+        costs = self.monthly_costs(types, regions, commitment)
+        targets = [self.downsize_target(t, region, commitment) or "" for t, region in zip(types, regions)]
+        target_costs = self.monthly_costs(targets, regions, commitment)
+        downsize = np.array([c.get("action") == "downsize" for c in candidates], dtype=bool)
+        savings = np.where(downsize, costs - target_costs, costs) if len(candidates) else np.zeros(0)
+        for candidate, machine_type, target, cost, saving, is_downsize in zip(
+                candidates, types, targets, costs, savings, downsize):
+            candidate.update(machine_type=machine_type or None, monthly_cost=_money(cost), monthly_savings=_money(saving))
+            if is_downsize:
+                candidate["downsize_to"] = target or None
+        return {
+            **self._totals(costs),
+            "projected_monthly_savings": _money(np.nansum(savings)),
+            "current_monthly_cost": _money(np.nansum(costs)),
+        }
+
+
+def _money(value) -> Optional[float]:
+    return round(float(value), 2) if np.isfinite(value) else None
@@ -0,0 +1,199 @@
+"""Cached handles and async streaming for remote Vertex AI Agent Engine agents.
+
+``vertexai.agent_engines.get`` is a network round trip, so handles are
+resolved once per resource name and reused. Streams are consumed natively
+with ``async_stream_query`` when the remote agent exposes it. Otherwise the
+blocking ``stream_query`` iterator runs on a dedicated bounded executor and
+text chunks are handed to the event loop as they arrive. Concurrent sessions
+therefore never queue behind each other on the default thread pool.
+
+Each ``query_text`` call runs under a deadline and a per-agent circuit
+breaker (see resilience.py). A remote agent run is expensive and not
+idempotent, so it is never retried or hedged.
+
+Configuration:
+    REMOTE_AGENT_MAX_WORKERS   Max blocking streams consumed at once (default 8).
+    REMOTE_AGENT_DEADLINE      Seconds a whole remote answer may take (default 120).
+    REMOTE_AGENT_BREAKER_FAILURES  Consecutive failures that open the breaker (default 3).
+    REMOTE_AGENT_BREAKER_RESET     Seconds an open breaker fails fast (default 60).
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import lazy_clients
+from .resilience import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+_handles = {}
+_handles_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+_END_OF_STREAM = object()
+_breakers = {}
+
+
+def _init_vertexai():
+    """Imports and initialises the Vertex AI SDK; registered as lazy client "vertexai"."""
+    import vertexai
+    project_id = os.getenv("GOOGLE_PROJECT_ID")
+    zone = os.getenv("GOOGLE_ZONE")
+    # Initialize Vertex AI SDK - This is crucial for ReasoningEngine to work
+    if project_id and zone:
+        # Reasoning Engines are regional, so we extract the region from the zone
+        # e.g., 'us-central1-a' -> 'us-central1'
+        google_region = "-".join(zone.split("-")[:-1])
+        vertexai.init(project=project_id, location=google_region)
+        logger.info("Vertex AI initialized for project '%s' in region '%s'", project_id, google_region)
+    else:
+        logger.warning("Skipping Vertex AI initialization. GOOGLE_PROJECT_ID and/or GOOGLE_ZONE not set in .env file.")
+    return vertexai
+
+
+lazy_clients.register("vertexai", _init_vertexai)
+
+
+def get_remote_agent(resource_name: str):
+    """Returns the Agent Engine handle for ``resource_name``, resolving it only once."""
+    handle = _handles.get(resource_name)
+    if handle is None:
+        with _handles_lock:
+            handle = _handles.get(resource_name)
+            if handle is None:
+                lazy_clients.get("vertexai")
+                import vertexai.agent_engines
+                handle = vertexai.agent_engines.get(resource_name)
+                _handles[resource_name] = handle
+    return handle
+
+
+def set_remote_agent(resource_name: str, handle):
+    """Seeds the handle cache, e.g. with a local stand-in for offline benchmarks."""
+    with _handles_lock:
+        _handles[resource_name] = handle
+
+
+def forget_remote_agent(resource_name: str):
+    """Drops a cached handle, e.g. after the remote agent was redeployed."""
+    with _handles_lock:
+        _handles.pop(resource_name, None)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("REMOTE_AGENT_MAX_WORKERS", "8")),
+                    thread_name_prefix="remote-agent-stream",
+                )
+    return _executor
+
+
+def extract_text_chunks(event) -> list:
+    """Returns the non-empty ``text`` parts of one streamed event dict."""
+    if not isinstance(event, dict):
+        return []
+    content = event.get("content")
+    if not isinstance(content, dict) or not isinstance(content.get("parts"), list):
+        return []
+    return [part["text"] for part in content["parts"] if isinstance(part, dict) and part.get("text")]
+
+
+def _pump_sync_stream(handle, query: str, user_id: str, loop, queue, cancelled: threading.Event):
+    # Runs on the bounded executor; hands chunks to the event loop as they arrive.
+    try:
+        for event in handle.stream_query(message=query, user_id=user_id):
+            if cancelled.is_set():
+                break
+            for chunk in extract_text_chunks(event):
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        loop.call_soon_threadsafe(queue.put_nowait, _END_OF_STREAM)
+    except BaseException as e:
+        loop.call_soon_threadsafe(queue.put_nowait, e)
+
+
+async def stream_text(query: str, resource_name: str, user_id: str = "local-orchestrator-agent"):
+    """Async generator yielding text chunks from a remote agent as they arrive.
+
+    Args:
+        query: The message sent to the remote agent.
+        resource_name: Full Agent Engine resource name.
+        user_id: User ID the remote agent sees for this stream.
+
+    Yields:
+        Each non-empty text part, in stream order.
+    """
+    loop = asyncio.get_running_loop()
+    handle = await loop.run_in_executor(_get_executor(), get_remote_agent, resource_name)
+
+    if callable(getattr(handle, "async_stream_query", None)):
+        async for event in handle.async_stream_query(message=query, user_id=user_id):
+            for chunk in extract_text_chunks(event):
+                yield chunk
+        return
+
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+    loop.run_in_executor(_get_executor(), _pump_sync_stream, handle, query, user_id, loop, queue, cancelled)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+def get_breaker(resource_name: str) -> CircuitBreaker:
+    """Returns the circuit breaker guarding calls to ``resource_name``."""
+    breaker = _breakers.get(resource_name)
+    if breaker is None:
+        with _handles_lock:
+            breaker = _breakers.setdefault(resource_name, CircuitBreaker(
+                failure_threshold=int(os.getenv("REMOTE_AGENT_BREAKER_FAILURES", "3")),
+                reset_timeout=float(os.getenv("REMOTE_AGENT_BREAKER_RESET", "60")),
+            ))
+    return breaker
+
+
+async def _collect_text(query: str, resource_name: str, user_id: str) -> str:
+    parts = [chunk async for chunk in stream_text(query, resource_name, user_id=user_id)]
+    return "".join(parts).strip()
+
+
+async def query_text(query: str, resource_name: str, user_id: str = "local-orchestrator-agent",
+                     deadline: float = None) -> str:
+    """Streams a remote agent's answer and returns the concatenated text.
+
+    Args:
+        query: The message sent to the remote agent.
+        resource_name: Full Agent Engine resource name.
+        user_id: User ID the remote agent sees for this stream.
+        deadline: Seconds the whole answer may take; defaults to REMOTE_AGENT_DEADLINE.
+
+    Raises:
+        CircuitOpenError: Recent calls to this agent kept failing; failing fast.
+        TimeoutError: The answer did not complete within the deadline.
+    """
+    breaker = get_breaker(resource_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit breaker for remote agent '{resource_name}' is open; failing fast.")
+    deadline = deadline if deadline is not None else float(os.getenv("REMOTE_AGENT_DEADLINE", "120"))
+    try:
+        text = await asyncio.wait_for(_collect_text(query, resource_name, user_id), timeout=deadline)
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise TimeoutError(f"Remote agent did not answer within {deadline}s.")
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return text
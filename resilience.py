@@ -0,0 +1,264 @@
+"""Deadlines, retries, hedged requests and circuit breaking for remote tool calls.
+
+``ResilientClient.post_json`` wraps ``PooledHttpClient.post_json`` and applies
+the policy stored on each ``Endpoint``:
+
+    deadline      Total time budget for the call, including retries and hedges.
+                  Each attempt's read timeout is capped at the budget left.
+    retries       Only for endpoints marked ``idempotent``. An attempt is
+                  retried after a timeout, a connection error, a 5xx or a 429.
+                  The delay between attempts is jittered exponential backoff.
+                  There is no retry if the delay would overrun the deadline.
+    hedging       For idempotent endpoints with ``hedge_after`` set. If the
+                  first request has not answered ``hedge_after`` seconds
+                  after it was sent, a second identical request is sent and
+                  whichever answers first wins. A single cold Cloud Run
+                  instance then costs ``hedge_after`` instead of its whole
+                  start-up time. The first request gets its own thread, so it
+                  never queues; only hedges share the bounded hedge pool.
+    breaker       One ``CircuitBreaker`` per endpoint. After
+                  ``failure_threshold`` consecutive failures, calls fail
+                  immediately with ``CircuitOpenError`` for ``reset_timeout``
+                  seconds. After that a single probe call decides whether the
+                  breaker closes again.
+
+``CircuitOpenError`` is a ``requests.exceptions.ConnectionError``. The tools'
+existing ``except RequestException`` handling therefore covers it unchanged.
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import requests
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for errors that say the endpoint is slow or unhealthy, not the request wrong."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        return status is None or status >= 500 or status == 429
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half_open -> closed).
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit.
+        reset_timeout: Seconds the circuit stays open before one probe is let through.
+        clock: Monotonic time source (seconds).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a call may go out now; in half_open only one probe at a time."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+                self._probing = False
+
+
+class ResilientClient:
+    """Applies each endpoint's deadline, retry, hedging and breaker policy.
+
+    Args:
+        client: The ``PooledHttpClient`` that sends the requests.
+        failure_threshold: Consecutive failures that open an endpoint's breaker.
+        reset_timeout: Seconds an open breaker waits before probing.
+        initial_backoff: Delay before the first retry, in seconds (jittered ±50%).
+        max_backoff: Upper bound for the delay between retries.
+        hedge_workers: Threads available for hedge requests across all endpoints.
+    """
+
+    _COUNTERS = ("calls", "attempts", "retries", "hedges", "hedge_wins",
+                 "short_circuited", "deadline_exceeded", "failed")
+
+    def __init__(self, client, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 initial_backoff: float = 0.2, max_backoff: float = 2.0, hedge_workers: int = 16):
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.hedge_workers = hedge_workers
+        self._breakers = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def breaker(self, endpoint_name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint_name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    endpoint_name, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+        return breaker
+
+    def _count(self, endpoint_name: str, counter: str):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint_name, dict.fromkeys(self._COUNTERS, 0))
+            counters[counter] += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers,
+                                                        thread_name_prefix="http-hedge")
+        return self._executor
+
+    def post_json(self, endpoint_name: str, payload: dict):
+        """POSTs ``payload`` to a named endpoint under that endpoint's policy.
+
+        Returns:
+            The first successful response.
+
+        Raises:
+            CircuitOpenError: The endpoint's breaker is open.
+            requests.exceptions.Timeout: The deadline passed before any attempt succeeded.
+            requests.exceptions.RequestException: The last attempt's error.
+        """
+        endpoint = self.client.endpoint(endpoint_name)
+        breaker = self.breaker(endpoint_name)
+        deadline = time.monotonic() + endpoint.deadline
+        attempts = endpoint.max_attempts if endpoint.idempotent else 1
+        backoff = self.initial_backoff
+        self._count(endpoint_name, "calls")
+        for attempt in range(1, attempts + 1):
+            if not breaker.allow():
+                self._count(endpoint_name, "short_circuited")
+                raise CircuitOpenError(f"Circuit breaker for '{endpoint_name}' is open; failing fast.")
+            self._count(endpoint_name, "attempts")
+            try:
+                response = self._attempt(endpoint, payload, deadline)
+            except requests.exceptions.RequestException as e:
+                if not is_retryable(e):
+                    breaker.record_success()  # The endpoint answered; the request was wrong.
+                    raise
+                breaker.record_failure()
+                delay = backoff * random.uniform(0.5, 1.5)
+                backoff = min(backoff * 2, self.max_backoff)
+                if attempt == attempts or time.monotonic() + delay >= deadline:
+                    self._count(endpoint_name, "failed")
+                    raise
+                self._count(endpoint_name, "retries")
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            return response
+
+    def _send(self, endpoint, payload: dict, deadline: float):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._count(endpoint.name, "deadline_exceeded")
+            raise requests.exceptions.Timeout(f"Deadline of {endpoint.deadline}s for '{endpoint.name}' exceeded.")
+        timeout = (min(endpoint.connect_timeout, remaining), min(endpoint.read_timeout, remaining))
+        return self.client.post_json(endpoint.name, payload, timeout=timeout)
+
+    def _attempt(self, endpoint, payload: dict, deadline: float):
+        if not (endpoint.idempotent and endpoint.hedge_after):
+            return self._send(endpoint, payload, deadline)
+
+        # The primary runs on a thread of its own rather than on the hedge
+        # pool. Under a wide fan-out (collect_inventory) primaries would
+        # otherwise wait in the pool's queue, look slow from the moment they
+        # were submitted and trigger hedges that queue behind them too.
+        primary = Future()
+        threading.Thread(target=self._run_primary, args=(primary, endpoint, payload, deadline),
+                         name="http-primary", daemon=True).start()
+        done, _ = wait([primary], timeout=max(0.0, min(endpoint.hedge_after, deadline - time.monotonic())))
+        if done:
+            return primary.result()
+        hedge = self._get_executor().submit(self._send_hedge, endpoint, payload, deadline)
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self._count(endpoint.name, "hedge_wins")
+                        return future.result()
+                    error = error or future.exception()
+        finally:
+            # A hedge still waiting for a pool thread is never sent.
+            hedge.cancel()
+        if error is not None and not pending:
+            raise error
+        # The losing requests finish in the background; their read timeout is
+        # already capped at the deadline.
+        self._count(endpoint.name, "deadline_exceeded")
+        raise requests.exceptions.Timeout(f"Deadline of {endpoint.deadline}s for '{endpoint.name}' exceeded.")
+
+    def _run_primary(self, future: Future, endpoint, payload: dict, deadline: float):
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(self._send(endpoint, payload, deadline))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _send_hedge(self, endpoint, payload: dict, deadline: float):
+        # Counted when it is actually sent, not when it is queued.
+        self._count(endpoint.name, "hedges")
+        return self._send(endpoint, payload, deadline)
+
+    def stats(self) -> dict:
+        """Per-endpoint counters plus the breaker state and how often it opened."""
+        with self._lock:
+            result = {name: dict(counters) for name, counters in self._counters.items()}
+            breakers = dict(self._breakers)
+        for name, breaker in breakers.items():
+            entry = result.setdefault(name, dict.fromkeys(self._COUNTERS, 0))
+            entry.update(breaker=breaker.state, breaker_opened=breaker.opened)
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,175 @@
+"""LLM response cache consulted from the before-model callback.
+
+A request is fingerprinted by the model name, the system instruction, the
+tool declarations and the contents. Text is whitespace-normalised, user text
+is also case-folded, and the per-call ids ADK puts on function calls and
+responses are dropped. When the same fingerprint was answered within
+``ttl_seconds``, the stored ``LlmResponse`` is returned from the callback and
+ADK skips the model call (the same path the callback's BLOCK example uses).
+
+Turns that touch tools with side effects are never cached. If the current
+turn already contains a call to one of ``side_effect_tools``, the cache is
+bypassed. A response that itself asks for such a call is never stored.
+
+``scope`` controls how much of the conversation is part of the key:
+
+    conversation  All contents. Safe, but a question only repeats across sessions.
+    turn          Contents from the last user message on. Repeated questions hit
+                  inside one session too, at the cost of ignoring earlier context.
+"""
+import hashlib
+import json
+import threading
+
+from google.genai import types
+
+from .ttl_cache import TTLCache
+
+_MAX_PENDING = 1024
+
+
+def _normalize_text(text: str, fold_case: bool) -> str:
+    text = " ".join((text or "").split())
+    return text.casefold() if fold_case else text
+
+
+def _instruction_text(instruction) -> str:
+    if isinstance(instruction, types.Content):
+        return "".join(part.text or "" for part in instruction.parts or [])
+    return "" if instruction is None else str(instruction)
+
+
+def _part_key(part: types.Part, fold_case: bool):
+    if part.text is not None:
+        return ["text", _normalize_text(part.text, fold_case)]
+    if part.function_call is not None:
+        return ["call", part.function_call.name, part.function_call.args or {}]
+    if part.function_response is not None:
+        return ["response", part.function_response.name, part.function_response.response or {}]
+    return ["part", part.model_dump(mode="json", exclude_none=True)]
+
+
+def _is_user_message(content: types.Content) -> bool:
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+def current_turn(contents: list) -> list:
+    """The contents from the last user text message on."""
+    for i in range(len(contents) - 1, -1, -1):
+        if _is_user_message(contents[i]):
+            return contents[i:]
+    return contents
+
+
+def called_tools(contents: list) -> set:
+    """Names of all functions called or answered in ``contents``."""
+    names = set()
+    for content in contents:
+        for part in content.parts or []:
+            if part.function_call is not None:
+                names.add(part.function_call.name)
+            elif part.function_response is not None:
+                names.add(part.function_response.name)
+    return names
+
+
+def request_fingerprint(llm_request, scope: str = "conversation") -> str:
+    """SHA-256 over the normalised model, instruction, tools and contents of a request."""
+    config = llm_request.config or types.GenerateContentConfig()
+    contents = llm_request.contents or []
+    if scope == "turn":
+        contents = current_turn(contents)
+    tools = [tool.model_dump(mode="json", exclude_none=True) for tool in config.tools or []
+             if isinstance(tool, types.Tool)]
+    payload = {
+        "model": llm_request.model,
+        "instruction": _normalize_text(_instruction_text(config.system_instruction), False),
+        "tools": tools,
+        "contents": [
+            [content.role, [_part_key(part, content.role == "user") for part in content.parts or []]]
+            for content in contents
+        ],
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """TTL/LRU cache of model responses with side-effect opt-out and counters.
+
+    Args:
+        maxsize: Maximum number of cached responses.
+        ttl_seconds: Response lifetime. 0 disables the cache.
+        side_effect_tools: Tool names whose turns are never cached.
+        scope: "conversation" or "turn", see the module docstring.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl_seconds: float = 300.0,
+                 side_effect_tools=(), scope: str = "conversation"):
+        self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self.side_effect_tools = frozenset(side_effect_tools)
+        self.scope = scope
+        self._lock = threading.Lock()
+        # (invocation_id, agent_name) -> fingerprint of the request now at the model
+        self._pending = {}
+        self.bypassed = 0
+        self.stored = 0
+        self.not_stored = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def lookup(self, call_id: tuple, llm_request):
+        """Returns a copy of the cached response for ``llm_request`` or None.
+
+        On a miss the request's fingerprint is remembered under ``call_id``
+        so ``store`` can file the model's answer under it.
+        """
+        if not self.enabled:
+            return None
+        if called_tools(current_turn(llm_request.contents or [])) & self.side_effect_tools:
+            self._count("bypassed")
+            return None
+        key = request_fingerprint(llm_request, self.scope)
+        cached = self._cache.get(key)
+        if cached is not None:
+            # ADK fills in function-call ids on the response it gets, so each
+            # hit must hand out its own copy.
+            return cached.model_copy(deep=True)
+        with self._lock:
+            self._pending[call_id] = key
+            if len(self._pending) > _MAX_PENDING:
+                # Model calls that errored never reach store().
+                self._pending.pop(next(iter(self._pending)))
+        return None
+
+    def store(self, call_id: tuple, llm_response):
+        """Caches ``llm_response`` for the request last looked up under ``call_id``."""
+        if llm_response.partial:
+            # Streaming chunk; the aggregated final response follows.
+            return
+        with self._lock:
+            key = self._pending.pop(call_id, None)
+        if key is None:
+            return
+        if (llm_response.error_code or not llm_response.content
+                or called_tools([llm_response.content]) & self.side_effect_tools):
+            self._count("not_stored")
+            return
+        self._cache.put(key, llm_response.model_copy(deep=True))
+        self._count("stored")
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        with self._lock:
+            stats.update(scope=self.scope, bypassed=self.bypassed, stored=self.stored,
+                         not_stored=self.not_stored, pending=len(self._pending))
+        return stats
@@ -0,0 +1,219 @@
+"""Vectorized fleet rightsizing: percentiles, idle ratios and sustained-low windows.
+
+The deletion rule in root_agent's instruction was one "CPU below N%" check
+that the model read off a report. This module scores a whole fleet at once.
+It takes a utilization matrix with one row per VM and one column per time
+step; NaN marks a missing sample. Every VM gets one of "delete",
+"downsize" or "keep".
+
+Rows are processed in chunks. Each chunk is sorted once along the time
+axis, which puts the NaNs last. On the sorted rows:
+
+    percentiles  are read off by index (linear interpolation, as in
+                 ``np.percentile``).
+    counts       "samples below X" come from a vectorized binary search over
+                 all rows, about 10 gathers for 720 samples, instead of
+                 another pass over the matrix.
+
+Sustained-low windows need time order, so they come from a single boolean
+pass over the unsorted chunk. The last ``window_samples * k`` samples are
+split into k windows (days, for hourly data). A window is low when none of
+its samples reaches ``low_cpu_percent``; missing samples do not break it.
+
+100k VMs x 30 days of hourly samples are scored in about 0.6 s on one core
+(see benchmarks/bench_rightsizing.py). ``np.nanpercentile`` needs about 10 s
+for the percentiles alone.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+ACTIONS = ("keep", "downsize", "delete")
+KEEP, DOWNSIZE, DELETE = range(3)
+
+
+@dataclass(frozen=True)
+class RightsizingPolicy:
+    """Thresholds for classifying a VM; CPU values are percentages.
+
+    A VM is "delete" when at least ``delete_min_idle_ratio`` of its samples
+    are below ``idle_cpu_percent`` and its p99 is below ``delete_max_p99``.
+    It is "downsize" when its p95 is below ``downsize_max_p95`` and it had
+    ``downsize_min_low_windows`` consecutive low windows. Everything else,
+    and every VM with less than ``min_coverage`` of its samples present, is
+    "keep"; ``analyze`` reports the latter separately as insufficient data.
+    """
+    idle_cpu_percent: float = 5.0
+    delete_min_idle_ratio: float = 0.95
+    delete_max_p99: float = 10.0
+    low_cpu_percent: float = 20.0
+    window_samples: int = 24
+    downsize_max_p95: float = 40.0
+    downsize_min_low_windows: int = 7
+    min_coverage: float = 0.5
+
+
+def _count_below(sorted_rows: np.ndarray, threshold: float) -> np.ndarray:
+    """Per row, how many values are < ``threshold`` (rows sorted, NaNs last)."""
+    n, t = sorted_rows.shape
+    lo = np.zeros(n, dtype=np.intp)
+    hi = np.full(n, t, dtype=np.intp)
+    rows = np.arange(n)
+    for _ in range(max(1, int(t).bit_length())):
+        mid = (lo + hi) // 2
+        below = sorted_rows[rows, np.minimum(mid, t - 1)] < threshold
+        active = lo < hi
+        lo = np.where(active & below, mid + 1, lo)
+        hi = np.where(active & ~below, mid, hi)
+    return lo
+
+
+def _percentile(sorted_rows: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Per-row ``q``-th percentile over the first ``counts`` values (NaN when empty)."""
+    rows = np.arange(len(sorted_rows))
+    position = (q / 100.0) * np.maximum(counts - 1, 0)
+    low = np.floor(position).astype(np.intp)
+    high = np.minimum(low + 1, np.maximum(counts - 1, 0))
+    below, above = sorted_rows[rows, low], sorted_rows[rows, high]
+    values = below + (above - below) * (position - low)
+    return np.where(counts > 0, values, np.nan)
+
+
+def _longest_run(flags: np.ndarray) -> np.ndarray:
+    """Per row, the length of the longest run of True values."""
+    if flags.shape[1] == 0:
+        return np.zeros(len(flags), dtype=np.int32)
+    totals = np.cumsum(flags, axis=1, dtype=np.int32)
+    run = totals - np.maximum.accumulate(np.where(flags, 0, totals), axis=1)
+    return run.max(axis=1)
+
+
+def fleet_metrics(utilization: np.ndarray, policy: RightsizingPolicy = RightsizingPolicy(),
+                  chunk_rows: int = 8192) -> dict:
+    """Per-VM utilization metrics for a VMs x time matrix.
+
+    Args:
+        utilization: 2-D array of CPU percentages, one row per VM, NaN for
+            missing samples. float32 is fastest.
+        policy: Supplies the idle/low thresholds and the window length.
+        chunk_rows: Rows processed per chunk (bounds the temporary memory).
+
+    Returns:
+        A dict of 1-D arrays, one value per VM: "samples", "coverage",
+        "p50", "p95", "p99", "max", "idle_ratio", "low_windows" and
+        "longest_low_streak".
+    """
+    utilization = np.asarray(utilization)
+    if utilization.ndim != 2:
+        raise ValueError("utilization must be a 2-D (VMs x time) array.")
+    n, t = utilization.shape
+    windows = t // max(1, policy.window_samples)
+    span = windows * policy.window_samples
+    out = {
+        "samples": np.zeros(n, dtype=np.int32),
+        "coverage": np.zeros(n, dtype=np.float32),
+        "p50": np.full(n, np.nan, dtype=np.float32),
+        "p95": np.full(n, np.nan, dtype=np.float32),
+        "p99": np.full(n, np.nan, dtype=np.float32),
+        "max": np.full(n, np.nan, dtype=np.float32),
+        "idle_ratio": np.zeros(n, dtype=np.float32),
+        "low_windows": np.zeros(n, dtype=np.int32),
+        "longest_low_streak": np.zeros(n, dtype=np.int32),
+    }
+    if t == 0:
+        return out
+    for start in range(0, n, chunk_rows):
+        chunk = utilization[start:start + chunk_rows]
+        part = slice(start, start + len(chunk))
+        ordered = np.sort(chunk, axis=1)
+        counts = _count_below(ordered, np.inf)
+        out["samples"][part] = counts
+        out["coverage"][part] = counts / t
+        out["p50"][part] = _percentile(ordered, counts, 50)
+        out["p95"][part] = _percentile(ordered, counts, 95)
+        out["p99"][part] = _percentile(ordered, counts, 99)
+        out["max"][part] = _percentile(ordered, counts, 100)
+        out["idle_ratio"][part] = _count_below(ordered, policy.idle_cpu_percent) / np.maximum(counts, 1)
+        if windows:
+            # NaN >= x is False, so a missing sample does not break a low window.
+            high = (chunk[:, t - span:] >= policy.low_cpu_percent).reshape(len(chunk), windows, policy.window_samples)
+            low_windows = ~high.any(axis=2)
+            out["low_windows"][part] = low_windows.sum(axis=1)
+            out["longest_low_streak"][part] = _longest_run(low_windows)
+    return out
+
+
+def classify(metrics: dict, policy: RightsizingPolicy = RightsizingPolicy()) -> np.ndarray:
+    """Action code per VM (``KEEP``, ``DOWNSIZE`` or ``DELETE``; see ``ACTIONS``)."""
+    enough = metrics["coverage"] >= policy.min_coverage
+    with np.errstate(invalid="ignore"):
+        delete = enough & (metrics["idle_ratio"] >= policy.delete_min_idle_ratio) & (metrics["p99"] < policy.delete_max_p99)
+        downsize = (enough & ~delete & (metrics["p95"] < policy.downsize_max_p95)
+                    & (metrics["longest_low_streak"] >= policy.downsize_min_low_windows))
+    actions = np.full(len(enough), KEEP, dtype=np.int8)
+    actions[downsize] = DOWNSIZE
+    actions[delete] = DELETE
+    return actions
+
+
+def _round(value) -> float:
+    return round(float(value), 2) if np.isfinite(value) else None
+
+
+def analyze(instance_ids: list, utilization: np.ndarray, policy: RightsizingPolicy = RightsizingPolicy(),
+            limit: int = 50, names: list = None) -> dict:
+    """Scores a fleet and returns a compact, ranked list of delete/downsize candidates.
+
+    Args:
+        instance_ids: One id per row of ``utilization``.
+        utilization: VMs x time matrix of CPU percentages (NaN = missing).
+        policy: Classification thresholds.
+        limit: Maximum number of candidates returned.
+        names: Optional VM names, one per row.
+
+    Returns:
+        A dict with "vms_analyzed", "counts" per action, "insufficient_data"
+        (how many VMs had too few samples to be judged), "insufficient_data_vms"
+        (those VMs with their "samples" and "coverage", least covered first)
+        and "candidates". VMs with insufficient data are not counted as
+        "keep". Candidates are all "delete" VMs first, then "downsize", each
+        sorted by p95 ascending.
+    """
+    if len(instance_ids) != len(utilization):
+        raise ValueError("instance_ids and utilization rows must have the same length.")
+    metrics = fleet_metrics(utilization, policy)
+    actions = classify(metrics, policy)
+    insufficient = metrics["coverage"] < policy.min_coverage
+    candidates = np.flatnonzero(actions != KEEP)
+    p95 = np.nan_to_num(metrics["p95"][candidates], nan=np.inf)
+    candidates = candidates[np.lexsort((p95, -actions[candidates]))][:max(0, limit)]
+    uncovered = np.flatnonzero(insufficient)
+    uncovered = uncovered[np.argsort(metrics["coverage"][uncovered], kind="stable")][:max(0, limit)]
+    return {
+        "vms_analyzed": len(actions),
+        "counts": {action: int(np.count_nonzero((actions == code) & ~insufficient)) for code, action in enumerate(ACTIONS)},
+        "insufficient_data": int(np.count_nonzero(insufficient)),
+        "insufficient_data_vms": [
+            {
+                "instance_id": instance_ids[i],
+                **({"name": names[i]} if names is not None else {}),
+                "samples": int(metrics["samples"][i]),
+                "coverage": _round(metrics["coverage"][i]),
+            }
+            for i in uncovered
+        ],
+        "candidates": [
+            {
+                "instance_id": instance_ids[i],
+                **({"name": names[i]} if names is not None else {}),
+                "action": ACTIONS[actions[i]],
+                "p50": _round(metrics["p50"][i]),
+                "p95": _round(metrics["p95"][i]),
+                "p99": _round(metrics["p99"][i]),
+                "idle_ratio": _round(metrics["idle_ratio"][i]),
+                "longest_low_streak": int(metrics["longest_low_streak"][i]),
+                "coverage": _round(metrics["coverage"][i]),
+            }
+            for i in candidates
+        ],
+    }
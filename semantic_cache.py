@@ -0,0 +1,163 @@
+"""Semantic response cache: exact-match fast path, then cosine-similarity lookup.
+
+A query is first normalised (case, whitespace, punctuation) and looked up in
+a dict. On a miss it is embedded and compared against the cached query
+vectors. The best match is returned if its cosine similarity reaches
+``threshold``. Entries expire after ``ttl_seconds``, and the least recently
+used entry is evicted once ``maxsize`` is reached.
+
+Vectors live in one pre-allocated NumPy matrix of L2-normalised rows, so a
+lookup is a single matrix-vector product.
+
+Tuning ``threshold``: a wrong semantic hit serves the wrong answer for the
+whole TTL, so the threshold must sit above the similarity of related but
+different questions. Where that lies depends on the embedding model.
+text-embedding-ada-002 packs almost every text into cosine 0.7-1.0, and
+different FinOps questions such as "committed use discounts" vs "sustained
+use discounts" often score above 0.9, hence the default of 0.97. Models
+with a wider spread (e.g. text-embedding-3-*) need a lower value, and the
+local hashing provider only measures shared words. To calibrate a model,
+embed pairs of queries that should and should not share an answer, and set
+the threshold between the highest "should not" and the lowest "should"
+score. With DEBUG logging, every lookup that falls short logs its best
+similarity.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", (query or "").lower())).strip()
+
+
+class SemanticCache:
+    """Bounded TTL cache keyed by query meaning.
+
+    Args:
+        embed_fn: Callable ``(text) -> list[float]`` or None on failure.
+        threshold: Minimum cosine similarity for a semantic hit (see the
+            module docstring for tuning it to an embedding model).
+        ttl_seconds: Entry lifetime.
+        maxsize: Maximum number of cached answers.
+        clock: Monotonic time source.
+    """
+
+    def __init__(self, embed_fn, threshold: float = 0.97, ttl_seconds: float = 86400.0,
+                 maxsize: int = 512, clock=time.monotonic):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        # normalised query -> (expires_at, answer, row index or None)
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._row_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _embed(self, text: str):
+        try:
+            vector = self.embed_fn(text)
+        except Exception as e:
+            logger.warning("[SemanticCache] Embedding failed, exact matching only: %s", e)
+            return None
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _drop_locked(self, key: str):
+        _, _, row = self._entries.pop(key)
+        if row is None:
+            return
+        # Swap-remove keeps the matrix dense.
+        last = len(self._row_keys) - 1
+        if row != last:
+            moved_key = self._row_keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._row_keys[row] = moved_key
+            expires_at, answer, _ = self._entries[moved_key]
+            self._entries[moved_key] = (expires_at, answer, row)
+        self._row_keys.pop()
+
+    def _purge_expired_locked(self, now: float):
+        for key in [k for k, (expires_at, _, _) in self._entries.items() if expires_at <= now]:
+            self._drop_locked(key)
+
+    def lookup(self, query: str):
+        """Returns ``(answer, match)`` for a cached equivalent of ``query``, else None.
+
+        ``match`` describes the hit: {"kind": "exact"|"semantic", "similarity", "query"}.
+        """
+        key = normalize_query(query)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1], {"kind": "exact", "similarity": 1.0, "query": key}
+            self._purge_expired_locked(now)
+            if not self._row_keys:
+                self.misses += 1
+                return None
+        vector = self._embed(key)
+        with self._lock:
+            if vector is None or not self._row_keys or vector.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+            scores = self._matrix[:len(self._row_keys)] @ vector
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                logger.debug("[SemanticCache] Best match %.4f < %.4f for %r (cached: %r)",
+                             similarity, self.threshold, key, self._row_keys[best])
+                return None
+            match_key = self._row_keys[best]
+            self._entries.move_to_end(match_key)
+            self.semantic_hits += 1
+            return self._entries[match_key][1], {"kind": "semantic", "similarity": round(similarity, 4), "query": match_key}
+
+    def store(self, query: str, answer):
+        key = normalize_query(query)
+        vector = self._embed(key)
+        with self._lock:
+            if key in self._entries:
+                self._drop_locked(key)
+            while len(self._entries) >= self.maxsize:
+                self._drop_locked(next(iter(self._entries)))
+            row = None
+            if vector is not None:
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+                if vector.shape[0] == self._matrix.shape[1]:
+                    row = len(self._row_keys)
+                    self._matrix[row] = vector
+                    self._row_keys.append(key)
+            self._entries[key] = (self._clock() + self.ttl_seconds, answer, row)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,361 @@
+"""Concurrent multi-session serving of root_agent over HTTP.
+
+One asyncio event loop runs one ADK Runner over the shared root_agent (an
+AgentServer belongs to the loop it first serves on). Many
+users' turns are in flight on it at the same time:
+
+    sessions      Every user gets their own session id, created on their first
+                  turn and reused after that. A client may also pass its own
+                  "session_id". Turns of one session run one at a time, in
+                  arrival order. Turns of different sessions run concurrently.
+                  The user -> session map is an LRU of at most ``max_users``
+                  entries, and a user idle for ``session_idle_seconds`` starts
+                  a new session. Evicted sessions are deleted from an
+                  in-memory session service; persistent services keep them.
+    concurrency   At most ``max_concurrent_turns`` turns run at once. The rest
+                  wait in line. Once ``max_pending_turns`` are waiting, new
+                  turns are rejected with 503 instead of queueing without
+                  bound.
+    blocking work Synchronous tools (list/delete VMs, search) run on ADK's
+                  tool thread pool (RunConfig.tool_thread_pool_config) with
+                  ``tool_threads`` workers. The async tools, the response
+                  cache and the CPU store move their blocking I/O and NumPy
+                  work to threads too. The loop still runs ADK's own per-event
+                  work (request assembly, event and id creation, session
+                  appends) and every callback. Threads also share one GIL. So a
+                  busy turn still delays other sessions somewhat, which the
+                  "loop lag" column of benchmarks/bench_serving.py measures.
+
+Turn and queue-wait latencies are recorded by instrumentation.py under the
+"turn" and "turn_wait" kinds.
+
+HTTP API (JSON, HTTP/1.1 keep-alive):
+
+    POST /turn     {"user_id": ..., "message": ..., "session_id": optional}
+                   -> {"user_id", "session_id", "reply", "latency_ms", "wait_ms"}
+    GET  /stats    serving counters and latency summary
+    GET  /healthz  {"status": "ok"}
+
+Run it with:
+
+    python -m <agent_package>.serving --port 8080
+
+Load-test it with benchmarks/bench_serving.py.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from http import HTTPStatus
+
+from google.adk.agents.run_config import RunConfig, ToolThreadPoolConfig
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from . import instrumentation
+from .singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class ServerBusyError(RuntimeError):
+    """Raised when ``max_pending_turns`` turns are already waiting for a slot."""
+
+
+class AgentServer:
+    """Runs turns of many user sessions concurrently against one agent.
+
+    Args:
+        agent: The root agent shared by every session.
+        app_name: ADK app name the sessions are stored under.
+        session_service: ADK session service (in-memory by default).
+        max_concurrent_turns: Turns allowed to run at the same time.
+        max_pending_turns: Turns allowed to wait for a slot before new ones
+            are rejected with ``ServerBusyError``.
+        tool_threads: Worker threads for synchronous tools; 0 runs them on
+            the event loop (for comparison only).
+        plugins: Extra ADK plugins for the runner.
+        max_users: Users whose session id is remembered (least recently
+            active ones are evicted first).
+        session_idle_seconds: A user idle this long gets a new session;
+            0 keeps sessions until they are evicted by ``max_users``.
+    """
+
+    def __init__(self, agent, app_name: str, session_service=None, max_concurrent_turns: int = 32,
+                 max_pending_turns: int = 1024, tool_threads: int = 16, plugins=None,
+                 max_users: int = 100000, session_idle_seconds: float = 3600.0):
+        self.agent = agent
+        self.app_name = app_name
+        self.runner = Runner(app_name=app_name, agent=agent,
+                             session_service=session_service or InMemorySessionService(),
+                             plugins=plugins or [])
+        self.tool_threads = tool_threads
+        self.run_config = RunConfig(
+            tool_thread_pool_config=ToolThreadPoolConfig(max_workers=tool_threads) if tool_threads else None)
+        self.max_concurrent_turns = max_concurrent_turns
+        self.max_pending_turns = max_pending_turns
+        self._slots = asyncio.Semaphore(max_concurrent_turns)
+        self.max_users = max(1, max_users)
+        self.session_idle_seconds = session_idle_seconds
+        # user_id -> [session_id, last turn (monotonic)], least recently used first
+        self._user_sessions = OrderedDict()
+        self._session_flight = AsyncSingleFlight()
+        # session_id -> [lock, turns holding or waiting for it]
+        self._session_locks = {}
+        self.active = 0
+        self.waiting = 0
+        self.turns = 0
+        self.errors = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    async def session_for(self, user_id: str, session_id: str = None) -> str:
+        """Returns the session to use for ``user_id``, creating it if needed.
+
+        Concurrent first turns of one user share a single creation.
+        """
+        if session_id is None:
+            entry = self._user_sessions.get(user_id)
+            now = time.monotonic()
+            if entry is not None and self.session_idle_seconds and now - entry[1] >= self.session_idle_seconds:
+                await self._evict([(user_id, entry[0])])
+                entry = None
+            if entry is None:
+                return await self._session_flight.do(user_id, lambda: self._create_user_session(user_id))
+            entry[1] = now
+            self._user_sessions.move_to_end(user_id)
+            return entry[0]
+        return await self._session_flight.do((user_id, session_id),
+                                             lambda: self._ensure_session(user_id, session_id))
+
+    async def _create_user_session(self, user_id: str) -> str:
+        session = await self.runner.session_service.create_session(
+            app_name=self.app_name, user_id=user_id, session_id=f"{user_id}-{uuid.uuid4().hex[:12]}")
+        self._user_sessions[user_id] = [session.id, time.monotonic()]
+        self._user_sessions.move_to_end(user_id)
+        evicted = []
+        while len(self._user_sessions) > self.max_users:
+            evicted.append(self._user_sessions.popitem(last=False))
+        await self._evict([(evicted_user, entry[0]) for evicted_user, entry in evicted])
+        return session.id
+
+    async def _evict(self, sessions: list):
+        """Forgets (user_id, session_id) pairs; drops them from an in-memory service when idle."""
+        for user_id, session_id in sessions:
+            if self._user_sessions.get(user_id, [None])[0] == session_id:
+                del self._user_sessions[user_id]
+            self.evicted += 1
+            # A session with a turn running or waiting is left to finish.
+            if isinstance(self.runner.session_service, InMemorySessionService) and session_id not in self._session_locks:
+                await self.runner.session_service.delete_session(
+                    app_name=self.app_name, user_id=user_id, session_id=session_id)
+
+    async def _ensure_session(self, user_id: str, session_id: str) -> str:
+        session_service = self.runner.session_service
+        if await session_service.get_session(app_name=self.app_name, user_id=user_id, session_id=session_id) is None:
+            await session_service.create_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+        return session_id
+
+    async def turn(self, user_id: str, message: str, session_id: str = None) -> dict:
+        """Runs one user turn and returns the final reply text with its latencies.
+
+        Raises:
+            ServerBusyError: Too many turns are already waiting.
+        """
+        if self.waiting >= self.max_pending_turns:
+            self.rejected += 1
+            raise ServerBusyError(f"{self.waiting} turns are already waiting; try again later.")
+        start = time.perf_counter()
+        self.waiting += 1
+        admitted = False
+        try:
+            session_id = await self.session_for(user_id, session_id)
+            entry = self._session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                async with entry[0], self._slots:
+                    admitted = True
+                    self.waiting -= 1
+                    self.active += 1
+                    started = time.perf_counter()
+                    instrumentation.observe("turn_wait", self.app_name, started - start)
+                    try:
+                        with instrumentation.span("turn", self.app_name):
+                            reply = await self._run(user_id, session_id, message)
+                    except Exception:
+                        self.errors += 1
+                        raise
+                    finally:
+                        self.active -= 1
+                        self.turns += 1
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._session_locks[session_id]
+        finally:
+            if not admitted:
+                self.waiting -= 1
+        finished = time.perf_counter()
+        return {
+            "user_id": user_id,
+            "session_id": session_id,
+            "reply": reply,
+            "latency_ms": round((finished - start) * 1000.0, 2),
+            "wait_ms": round((started - start) * 1000.0, 2),
+        }
+
+    async def _run(self, user_id: str, session_id: str, message: str) -> str:
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        reply = []
+        async for event in self.runner.run_async(user_id=user_id, session_id=session_id,
+                                                 new_message=content, run_config=self.run_config):
+            if event.is_final_response() and event.content and event.content.parts:
+                reply.extend(part.text for part in event.content.parts if part.text)
+        return "".join(reply)
+
+    def stats(self) -> dict:
+        summary = instrumentation.summary()
+        return {
+            "turns": self.turns,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "active": self.active,
+            "waiting": self.waiting,
+            "users": len(self._user_sessions),
+            "evicted_sessions": self.evicted,
+            "max_concurrent_turns": self.max_concurrent_turns,
+            "tool_threads": self.tool_threads,
+            "turn_latency": summary.get(f"turn:{self.app_name}", {}),
+            "turn_wait": summary.get(f"turn_wait:{self.app_name}", {}),
+        }
+
+    async def close(self):
+        await self.runner.close()
+
+    # --- HTTP front end ---------------------------------------------------
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        """Starts the HTTP front end on the running loop and returns the asyncio server."""
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info("Serving %s on http://%s:%d (%d concurrent turns, %d tool threads)",
+                    self.app_name, host, server.sockets[0].getsockname()[1], self.max_concurrent_turns,
+                    self.tool_threads)
+        return server
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request body too large."}
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._dispatch(method, path.split("?", 1)[0], body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> tuple:
+        if method == "GET" and path == "/healthz":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method == "GET" and path == "/stats":
+            return HTTPStatus.OK, self.stats()
+        if path != "/turn":
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown path {path}."}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST /turn."}
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"}
+        if not isinstance(request, dict) or not request.get("user_id") or not request.get("message"):
+            return HTTPStatus.BAD_REQUEST, {"error": '"user_id" and "message" are required.'}
+        try:
+            result = await self.turn(str(request["user_id"]), str(request["message"]), request.get("session_id"))
+        except ServerBusyError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        except Exception as e:
+            logger.exception("Turn failed for user %s", request["user_id"])
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        return HTTPStatus.OK, result
+
+
+def _session_service():
+    # SESSION_DB_PATH keeps sessions in SQLite (write-behind, see
+    # session_store.py); without it they live in memory.
+    path = os.getenv("SESSION_DB_PATH")
+    if not path:
+        return InMemorySessionService()
+    from .session_store import WriteBehindSqliteSessionService
+    return WriteBehindSqliteSessionService(path)
+
+
+def create_server(**overrides) -> AgentServer:
+    """Builds an AgentServer for root_agent, configured from the environment."""
+    from . import agent as agent_module
+    options = {
+        "session_service": _session_service(),
+        "max_concurrent_turns": int(os.getenv("SERVE_MAX_CONCURRENT_TURNS", "32")),
+        "max_pending_turns": int(os.getenv("SERVE_MAX_PENDING_TURNS", "1024")),
+        "tool_threads": int(os.getenv("SERVE_TOOL_THREADS", "16")),
+        "max_users": int(os.getenv("SERVE_MAX_USERS", "100000")),
+        "session_idle_seconds": float(os.getenv("SERVE_SESSION_IDLE_SECONDS", "3600")),
+    }
+    options.update(overrides)
+    return AgentServer(agent_module.root_agent, agent_module.APP_NAME, **options)
+
+
+async def _serve_forever(server: AgentServer, host: str, port: int):
+    from . import agent as agent_module
+    http_server = await server.serve(host, port)
+    try:
+        async with http_server:
+            await http_server.serve_forever()
+    finally:
+        await server.close()
+        agent_module.interaction_logger.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("SERVE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVE_PORT", "8080")))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve_forever(create_server(), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""SQLite session service with WAL, a connection pool and write-behind events.
+
+``append_event`` used to be one synchronous SQLite transaction per event, so
+concurrent sessions queued up on the database write lock.
+``WriteBehindSqliteSessionService`` applies the event to the in-memory
+session, appends it to a write-behind buffer and returns. A writer thread
+commits the buffer in one transaction every ``flush_interval`` seconds, or
+as soon as ``batch_size`` events are waiting. It also merges the state
+deltas of a batch, so each session, user and app row is written once per
+batch.
+
+Reads stay consistent with writes that are still buffered.
+``get_session``, ``list_sessions`` and ``get_user_state`` overlay the
+buffered events and state deltas on top of what is stored. A caller
+therefore always sees its own appends, even before they are committed.
+The writer commits a batch and drops it from the buffer under one lock, and
+a read opens its SQLite read transaction and copies the buffer under the
+same lock. Every event is therefore either in the read's snapshot or in its
+overlay, never in both or neither.
+
+The database runs in WAL mode, with synchronous=NORMAL and a busy timeout.
+Readers take connections from a small pool and never wait for the writer.
+The tables use the same layout as ADK's SqliteSessionService.
+
+Trade-off: events appended in the last ``flush_interval`` seconds are lost
+if the process dies without ``close`` (``flush`` and ``close`` write them
+out). There is no stale-session check on append, because appends do not
+touch the database.
+"""
+import asyncio
+import copy
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY, state TEXT NOT NULL, update_time REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, state TEXT NOT NULL, update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id));
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL, state TEXT NOT NULL,
+    create_time REAL NOT NULL, update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id));
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT NOT NULL, app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    invocation_id TEXT NOT NULL, timestamp REAL NOT NULL, event_data TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, id),
+    FOREIGN KEY (app_name, user_id, session_id) REFERENCES sessions(app_name, user_id, id) ON DELETE CASCADE);
+"""
+
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+
+def _split_delta(delta: dict) -> tuple:
+    """Splits a state delta into (app, user, session) parts; temp keys are dropped."""
+    app, user, session = {}, {}, {}
+    for key, value in (delta or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+def _merge_state(app_state: dict, user_state: dict, session_state: dict) -> dict:
+    merged = copy.deepcopy(session_state)
+    merged.update({State.APP_PREFIX + key: value for key, value in app_state.items()})
+    merged.update({State.USER_PREFIX + key: value for key, value in user_state.items()})
+    return merged
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str)
+
+
+class WriteBehindSqliteSessionService(BaseSessionService):
+    """ADK session service on one SQLite file, with batched event writes.
+
+    Args:
+        db_path: SQLite file path (a "sqlite:///" URL is accepted too).
+        pool_size: Reader connections kept open.
+        batch_size: Flush as soon as this many events are buffered.
+        flush_interval: Flush at least this often (seconds) while events wait.
+        max_buffered: ``append_event`` waits for a flush beyond this many events.
+        busy_timeout_ms: SQLite busy timeout for every connection.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = 4, batch_size: int = 256,
+                 flush_interval: float = 0.05, max_buffered: int = 10000, busy_timeout_ms: int = 5000):
+        if db_path.startswith("sqlite:///"):
+            db_path = db_path[len("sqlite:///"):]
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.busy_timeout_ms = busy_timeout_ms
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._writer.commit()
+        self._readers = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            self._readers.put(self._connect())
+        # Lock order: _write_lock, then _buffer_lock.
+        self._write_lock = threading.Lock()
+        self._buffer_lock = threading.Lock()
+        # (app_name, user_id, session_id) -> [(event, app_delta, user_delta, session_delta)]
+        self._buffer = defaultdict(list)
+        self._buffered = 0
+        self._stats_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.stats = {"appended": 0, "flushed": 0, "batches": 0, "failed_batches": 0, "waited_for_flush": 0}
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    @contextmanager
+    def _reader(self):
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    # --- write-behind buffer -------------------------------------------------
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush_once()
+
+    def _flush_once(self) -> int:
+        with self._write_lock:
+            with self._buffer_lock:
+                batch = {key: list(items) for key, items in self._buffer.items() if items}
+            if not batch:
+                return 0
+            db = self._writer
+            written = 0
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._write_batch(batch)
+                    # Commit and unbuffer atomically for readers (see _snapshot).
+                    with self._buffer_lock:
+                        db.execute("COMMIT")
+                        for key, items in batch.items():
+                            del self._buffer[key][:len(items)]
+                            if not self._buffer[key]:
+                                del self._buffer[key]
+                            written += len(items)
+                        self._buffered -= written
+                except BaseException:
+                    if db.in_transaction:
+                        db.execute("ROLLBACK")
+                    raise
+            except Exception as e:
+                # The events stay buffered and are retried on the next flush.
+                self._count("failed_batches")
+                logger.error("[SessionStore] Failed to write %d buffered events: %s", sum(map(len, batch.values())), e)
+                return 0
+            self._count("batches")
+            self._count("flushed", written)
+            return written
+
+    def _write_batch(self, batch: dict):
+        """Writes a batch inside the writer's open transaction; the caller commits."""
+        app_deltas, user_deltas = defaultdict(dict), defaultdict(dict)
+        session_updates, event_rows = {}, []
+        for (app_name, user_id, session_id), items in batch.items():
+            session_delta, update_time = {}, 0.0
+            for event, app_delta, user_delta, delta in items:
+                app_deltas[app_name].update(app_delta)
+                user_deltas[(app_name, user_id)].update(user_delta)
+                session_delta.update(delta)
+                update_time = max(update_time, event.timestamp)
+                event_rows.append((event.id, app_name, user_id, session_id, event.invocation_id,
+                                   event.timestamp, event.model_dump_json(exclude_none=True)))
+            session_updates[(app_name, user_id, session_id)] = (session_delta, update_time)
+
+        db = self._writer
+        now = time.time()
+        for app_name, delta in app_deltas.items():
+            if delta:
+                self._merge_row(db, "app_states", "app_name=?", (app_name,), delta, now)
+        for (app_name, user_id), delta in user_deltas.items():
+            if delta:
+                self._merge_row(db, "user_states", "app_name=? AND user_id=?", (app_name, user_id), delta, now)
+        for (app_name, user_id, session_id), (delta, update_time) in session_updates.items():
+            if delta:
+                row = db.execute("SELECT state FROM sessions WHERE app_name=? AND user_id=? AND id=?",
+                                 (app_name, user_id, session_id)).fetchone()
+                if row is None:
+                    continue
+                state = json.loads(row["state"])
+                state.update(delta)
+                db.execute("UPDATE sessions SET state=?, update_time=? WHERE app_name=? AND user_id=? AND id=?",
+                           (_dumps(state), update_time, app_name, user_id, session_id))
+            else:
+                db.execute("UPDATE sessions SET update_time=? WHERE app_name=? AND user_id=? AND id=?",
+                           (update_time, app_name, user_id, session_id))
+        # Events of sessions deleted meanwhile are skipped, not failed.
+        db.executemany(
+            "INSERT OR REPLACE INTO events (id, app_name, user_id, session_id, invocation_id, timestamp, event_data) "
+            "SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS "
+            "(SELECT 1 FROM sessions WHERE app_name=?2 AND user_id=?3 AND id=?4)",
+            event_rows,
+        )
+
+    @staticmethod
+    def _merge_row(db, table: str, where: str, params: tuple, delta: dict, now: float):
+        row = db.execute(f"SELECT state FROM {table} WHERE {where}", params).fetchone()
+        state = json.loads(row["state"]) if row else {}
+        state.update(delta)
+        if row:
+            db.execute(f"UPDATE {table} SET state=?, update_time=? WHERE {where}", (_dumps(state), now) + params)
+        else:
+            columns = "app_name" if len(params) == 1 else "app_name, user_id"
+            placeholders = ", ".join("?" * len(params))
+            db.execute(f"INSERT INTO {table} ({columns}, state, update_time) VALUES ({placeholders}, ?, ?)",
+                       params + (_dumps(state), now))
+
+    def _pending(self, app_name: str, user_id: str = None) -> list:
+        """Buffered (key, event, app_delta, user_delta, session_delta) entries, oldest first.
+
+        The caller holds ``_buffer_lock``.
+        """
+        return [(key,) + item for key, items in self._buffer.items()
+                if key[0] == app_name and user_id in (None, key[1])
+                for item in items]
+
+    @contextmanager
+    def _snapshot(self, app_name: str, user_id: str = None):
+        """A reader inside a read transaction, and the buffered entries it does not see yet."""
+        with self._reader() as db:
+            with self._buffer_lock:
+                db.execute("BEGIN")
+                # The first read pins the WAL snapshot. Commits happen under
+                # _buffer_lock, so no batch lands between it and the copy.
+                db.execute("SELECT 1 FROM sessions LIMIT 1").fetchall()
+                pending = self._pending(app_name, user_id)
+            try:
+                yield db, pending
+            finally:
+                db.execute("COMMIT")
+
+    # --- BaseSessionService --------------------------------------------------
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        self._apply_temp_state(session, event)
+        event = self._trim_temp_delta_state(event)
+        app_delta, user_delta, session_delta = _split_delta(event.actions.state_delta if event.actions else None)
+        with self._buffer_lock:
+            self._buffer[(session.app_name, session.user_id, session.id)].append(
+                (event.model_copy(deep=True), app_delta, user_delta, session_delta))
+            self._buffered += 1
+            buffered = self._buffered
+        self._count("appended")
+        if buffered >= self.batch_size:
+            self._wakeup.set()
+        if buffered >= self.max_buffered:
+            self._count("waited_for_flush")
+            await asyncio.to_thread(self._flush_once)
+        session.last_update_time = event.timestamp
+        return self._commit_event_to_session(session, event)
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        return await asyncio.to_thread(self._create_session, app_name, user_id, state, session_id)
+
+    def _create_session(self, app_name, user_id, state, session_id) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_delta(state)
+        now = time.time()
+        with self._write_lock:
+            db = self._writer
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT 1 FROM sessions WHERE app_name=? AND user_id=? AND id=?",
+                              (app_name, user_id, session_id)).fetchone():
+                    raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+                if app_delta:
+                    self._merge_row(db, "app_states", "app_name=?", (app_name,), app_delta, now)
+                if user_delta:
+                    self._merge_row(db, "user_states", "app_name=? AND user_id=?", (app_name, user_id), user_delta, now)
+                db.execute("INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (app_name, user_id, session_id, _dumps(session_state), now, now))
+                app_state = self._read_state(db, "app_states", "app_name=?", (app_name,))
+                user_state = self._read_state(db, "user_states", "app_name=? AND user_id=?", (app_name, user_id))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            # Still under _write_lock, so nothing was flushed since the reads above.
+            with self._buffer_lock:
+                pending = self._pending(app_name)
+        for key, _, app_pending, user_pending, _ in pending:
+            app_state.update(app_pending)
+            if key[1] == user_id:
+                user_state.update(user_pending)
+        return Session(app_name=app_name, user_id=user_id, id=session_id,
+                       state=_merge_state(app_state, user_state, session_state), events=[], last_update_time=now)
+
+    @staticmethod
+    def _read_state(db, table: str, where: str, params: tuple) -> dict:
+        row = db.execute(f"SELECT state FROM {table} WHERE {where}", params).fetchone()
+        return json.loads(row["state"]) if row else {}
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        return await asyncio.to_thread(self._get_session, app_name, user_id, session_id, config)
+
+    def _get_session(self, app_name, user_id, session_id, config) -> Optional[Session]:
+        with self._snapshot(app_name) as (db, pending):
+            row = db.execute("SELECT state, update_time FROM sessions WHERE app_name=? AND user_id=? AND id=?",
+                             (app_name, user_id, session_id)).fetchone()
+            if row is None:
+                return None
+            session_state, update_time = json.loads(row["state"]), row["update_time"]
+            query, params = ("SELECT event_data FROM events WHERE app_name=? AND user_id=? AND session_id=?",
+                             [app_name, user_id, session_id])
+            if config and config.after_timestamp:
+                query += " AND timestamp >= ?"
+                params.append(config.after_timestamp)
+            query += " ORDER BY timestamp DESC, rowid DESC"
+            if config and config.num_recent_events is not None:
+                query += " LIMIT ?"
+                params.append(config.num_recent_events)
+            event_rows = db.execute(query, params).fetchall()
+            app_state = self._read_state(db, "app_states", "app_name=?", (app_name,))
+            user_state = self._read_state(db, "user_states", "app_name=? AND user_id=?", (app_name, user_id))
+
+        events = [Event.model_validate_json(r["event_data"]) for r in reversed(event_rows)]
+        stored_ids = {event.id for event in events}
+        for key, event, app_delta, user_delta, session_delta in pending:
+            app_state.update(app_delta)
+            if key[1] != user_id:
+                continue
+            user_state.update(user_delta)
+            if key[2] != session_id:
+                continue
+            session_state.update(session_delta)
+            update_time = max(update_time, event.timestamp)
+            if event.id not in stored_ids and not (config and config.after_timestamp
+                                                    and event.timestamp < config.after_timestamp):
+                events.append(event.model_copy(deep=True))
+        if config and config.num_recent_events is not None:
+            events = events[-config.num_recent_events:] if config.num_recent_events else []
+        return Session(app_name=app_name, user_id=user_id, id=session_id,
+                       state=_merge_state(app_state, user_state, session_state),
+                       events=events, last_update_time=update_time)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await asyncio.to_thread(self._list_sessions, app_name, user_id)
+
+    def _list_sessions(self, app_name, user_id) -> ListSessionsResponse:
+        with self._snapshot(app_name) as (db, pending):
+            if user_id is None:
+                rows = db.execute("SELECT id, user_id, state, update_time FROM sessions WHERE app_name=? "
+                                  "ORDER BY update_time, user_id, id", (app_name,)).fetchall()
+                user_rows = db.execute("SELECT user_id, state FROM user_states WHERE app_name=?", (app_name,)).fetchall()
+            else:
+                rows = db.execute("SELECT id, user_id, state, update_time FROM sessions WHERE app_name=? AND user_id=? "
+                                  "ORDER BY update_time, user_id, id", (app_name, user_id)).fetchall()
+                user_rows = db.execute("SELECT user_id, state FROM user_states WHERE app_name=? AND user_id=?",
+                                       (app_name, user_id)).fetchall()
+            app_state = self._read_state(db, "app_states", "app_name=?", (app_name,))
+        user_states = {r["user_id"]: json.loads(r["state"]) for r in user_rows}
+        sessions = {(r["user_id"], r["id"]): [json.loads(r["state"]), r["update_time"]] for r in rows}
+        for (_, pending_user, pending_session), event, app_delta, user_delta, session_delta in pending:
+            app_state.update(app_delta)
+            if user_id is not None and pending_user != user_id:
+                continue
+            user_states.setdefault(pending_user, {}).update(user_delta)
+            entry = sessions.get((pending_user, pending_session))
+            if entry is not None:
+                entry[0].update(session_delta)
+                entry[1] = max(entry[1], event.timestamp)
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=uid, id=sid,
+                    state=_merge_state(app_state, user_states.get(uid, {}), state),
+                    events=[], last_update_time=update_time)
+            for (uid, sid), (state, update_time) in sorted(sessions.items(), key=lambda item: item[1][1])
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await asyncio.to_thread(self._delete_session, app_name, user_id, session_id)
+
+    def _delete_session(self, app_name, user_id, session_id):
+        with self._write_lock:
+            with self._buffer_lock:
+                dropped = self._buffer.pop((app_name, user_id, session_id), [])
+                self._buffered -= len(dropped)
+            self._writer.execute("DELETE FROM sessions WHERE app_name=? AND user_id=? AND id=?",
+                                 (app_name, user_id, session_id))
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> dict[str, Any]:
+        def read():
+            with self._snapshot(app_name, user_id) as (db, pending):
+                state = self._read_state(db, "user_states", "app_name=? AND user_id=?", (app_name, user_id))
+            for _, _, _, user_delta, _ in pending:
+                state.update(user_delta)
+            return state
+        return await asyncio.to_thread(read)
+
+    async def flush(self) -> None:
+        """Commits every buffered event before returning."""
+        await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self):
+        while self._buffered and self._flush_once():
+            pass
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.close_sync)
+
+    def close_sync(self):
+        """Flushes the buffer, stops the writer thread and closes all connections."""
+        if self._closed:
+            return
+        self.flush_sync()
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush_sync()
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
@@ -0,0 +1,152 @@
+"""Single-flight coalescing of concurrent identical calls.
+
+When several sessions, or several tool calls in one model turn, ask for the
+same thing at once, only the first caller (the leader) runs the call. The
+others wait for it and get the same result, or the same exception. Once the
+call finishes its key is released, so the next call goes out fresh. Results
+are never kept, which is what separates this from the caches.
+
+``SingleFlight`` is for blocking callables that run on worker threads.
+``AsyncSingleFlight`` is for coroutines. Its shared call runs as a task
+shielded from the callers, so one caller being cancelled does not cancel it
+for everybody else.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Counters:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.calls = 0
+        self.executed = 0
+        self.deduplicated = 0
+        self.forgotten = 0
+
+    def stats(self, in_flight: int) -> dict:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+            "dedup_rate": round(self.deduplicated / self.calls, 4) if self.calls else 0.0,
+            "in_flight": in_flight,
+            "forgotten": self.forgotten,
+        }
+
+
+class SingleFlight(_Counters):
+    """Coalesces concurrent blocking calls that share a key.
+
+    Args:
+        enabled: False runs every call directly (the counters still count).
+    """
+
+    def __init__(self, enabled: bool = True):
+        super().__init__(enabled)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns ``fn()``, or the result of the identical call already in flight."""
+        with self._lock:
+            self.calls += 1
+            if not self.enabled:
+                self.executed += 1
+                call, leader = None, True
+            elif key in self._calls:
+                self.deduplicated += 1
+                call, leader = self._calls[key], False
+            else:
+                self.executed += 1
+                call = self._calls[key] = _Call()
+                leader = True
+        if call is None:
+            return fn()
+        return self._lead(key, call, fn) if leader else self._follow(call)
+
+    def _lead(self, key, call, fn):
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    @staticmethod
+    def _follow(call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def forget(self, key):
+        """Lets the next call for ``key`` start fresh instead of joining the one in flight.
+
+        Call after a write that makes an in-flight read stale (e.g. a delete).
+        """
+        with self._lock:
+            if self._calls.pop(key, None) is not None:
+                self.forgotten += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return super().stats(len(self._calls))
+
+
+class AsyncSingleFlight(_Counters):
+    """Coalesces concurrent coroutine calls that share a key, per event loop.
+
+    Args:
+        enabled: False awaits every call directly (the counters still count).
+    """
+
+    def __init__(self, enabled: bool = True):
+        super().__init__(enabled)
+        self._tasks = {}
+
+    async def do(self, key, coro_fn):
+        """Awaits ``coro_fn()``, or joins the identical call already in flight."""
+        self.calls += 1
+        if not self.enabled:
+            self.executed += 1
+            return await coro_fn()
+        loop_key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(loop_key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[loop_key] = task
+            task.add_done_callback(lambda t: self._release(loop_key, t))
+        return await asyncio.shield(task)
+
+    def _release(self, loop_key, task):
+        if self._tasks.get(loop_key) is task:
+            del self._tasks[loop_key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved; every waiter already got it.
+
+    def forget(self, key):
+        """Lets the next call for ``key`` start fresh instead of joining the one in flight."""
+        for loop_key in [k for k in self._tasks if k[1] == key]:
+            del self._tasks[loop_key]
+            self.forgotten += 1
+
+    def stats(self) -> dict:
+        return super().stats(len(self._tasks))
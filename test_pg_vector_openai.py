@@ -1,38 +1,82 @@
-import openai
 import json # To convert JSON objects to strings
+import logging
 import os
 from dotenv import load_dotenv
 
+from .embedding_cache import EmbeddingCache
+from .embedding_providers import get_embedding_provider
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 OPENAI_KEY = os.getenv("OPENAI_KEY")
 
-# Assuming you have your OpenAI API key set up as an environment variable
-openai.api_key = OPENAI_KEY
+# EMBEDDING_PROVIDER=openai (default) uses the OpenAI API with OPENAI_KEY;
+# EMBEDDING_PROVIDER=local embeds deterministically without any network.
+embedding_provider = get_embedding_provider()
+EMBEDDING_MODEL = embedding_provider.model
 
-def generate_combined_embedding(user_id: str, action: dict, result: dict) -> list[float]:
-    """
-    Generates a vector embedding from user_id, action, and result using OpenAI.
-    """
-    # 1. Concatenate the data into a single string
+# Identical combined texts are embedded once. Set EMBEDDING_CACHE_PATH to a
+# file (e.g. ./embedding_cache.db) to keep the cache across restarts.
+embedding_cache = EmbeddingCache(
+    maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+    path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+)
+
+def embedding_cache_stats() -> dict:
+    """Returns hit/miss counters and the hit rate of the embedding cache."""
+    return embedding_cache.stats()
+
+def combined_text(user_id: str, action: dict, result: dict) -> str:
+    """Builds the single string that is embedded for one interaction."""
     # Convert JSON objects to compact strings for embedding
     action_str = json.dumps(action, separators=(',', ':'))
     result_str = json.dumps(result, separators=(',', ':'))
+    return f"user_id: {user_id} action: {action_str} result: {result_str}"
+
+def generate_combined_embedding(user_id: str, action: dict, result: dict) -> list[float]:
+    """
+    Generates a vector embedding from user_id, action, and result.
+    Repeated texts are served from embedding_cache without a network call.
+    """
+    return generate_combined_embeddings([(user_id, action, result)])[0]
+
+def generate_combined_embeddings(records: list) -> list:
+    """
+    Bulk variant of generate_combined_embedding.
+
+    Args:
+        records: (user_id, action, result) tuples.
+
+    Returns:
+        One vector per record, in order; None for records whose embedding failed.
+        Cache misses are de-duplicated and packed into as few embedding
+        requests as the provider's per-request limits allow.
+    """
+    texts = [combined_text(user_id, action, result) for user_id, action, result in records]
+    return generate_text_embeddings(texts)
+
+def generate_text_embedding(text: str) -> list[float]:
+    """Embeds one arbitrary text through the same cache and provider."""
+    return generate_text_embeddings([text])[0]
 
-    combined_text = f"user_id: {user_id} action: {action_str} result: {result_str}"
+def generate_text_embeddings(texts: list) -> list:
+    """Embeds ``texts`` (cached, de-duplicated, batched); None where embedding failed."""
+    vectors = [embedding_cache.get(text, EMBEDDING_MODEL) for text in texts]
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if not missing:
+        return vectors
 
     try:
-        # 2. Send to an embedding model
-        response = openai.embeddings.create(
-            input=combined_text,
-            model="text-embedding-ada-002" # Or your chosen embedding model
-        )
-        # 3. Receive the vector
-        # The embedding is usually in response.data[0].embedding
-        vector_value = response.data[0].embedding
-        return vector_value
+        with instrumentation.span("embedding", EMBEDDING_MODEL, batch_size=len(missing)):
+            fresh = dict(zip(missing, embedding_provider.embed(missing)))
     except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return None
+        logger.error("Error generating embeddings: %s", e)
+        return vectors
+    for text, vector in fresh.items():
+        embedding_cache.put(text, EMBEDDING_MODEL, vector)
+    return [vector if vector is not None else fresh.get(text) for text, vector in zip(texts, vectors)]
 """
 # --- Example Usage ---
 if __name__ == "__main__":
@@ -46,6 +90,7 @@ if __name__ == "__main__":
         print(f"Generated embedding (first 5 elements): {embedding[:5]}...")
         print(f"Generated embedding (all elements): {embedding}")
         print(f"Embedding dimension: {len(embedding)}")
+        print(f"Embedding cache: {embedding_cache_stats()}")
         # Now you would insert this 'embedding' into your 'vector_value' column
         # using your PostgreSQL client library (e.g., psycopg2 in Python)
-        """
\ No newline at end of file
+        """
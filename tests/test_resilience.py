@@ -0,0 +1,74 @@
+"""Hedging behaviour of ResilientClient under concurrent fan-out."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..http_client import Endpoint
+from ..resilience import ResilientClient
+
+
+class _SlowBackend:
+    """Stand-in for PooledHttpClient whose every request takes ``latency`` seconds.
+
+    ``slow_first`` extra seconds are added to the first request only, as a
+    cold instance would.
+    """
+
+    def __init__(self, endpoint: Endpoint, latency: float, slow_first: float = 0.0):
+        self._endpoint = endpoint
+        self.latency = latency
+        self.slow_first = slow_first
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def endpoint(self, name: str) -> Endpoint:
+        return self._endpoint
+
+    def post_json(self, endpoint_name: str, payload: dict, timeout=None):
+        with self._lock:
+            self.requests += 1
+            first = self.requests == 1
+        time.sleep(self.latency + (self.slow_first if first else 0.0))
+        return payload
+
+
+def _list_vms_endpoint(hedge_after: float) -> Endpoint:
+    return Endpoint("list_vms", "http://stand-in/list_vms", 1.0, 5.0, deadline=5.0,
+                    idempotent=True, max_attempts=3, hedge_after=hedge_after)
+
+
+def test_fan_out_wider_than_hedge_pool_sends_no_hedges():
+    # 50 zones through collect_inventory's 32-way fan-out, a 16-thread hedge
+    # pool, a backend that always answers in 0.12s and a 0.2s hedge delay.
+    backend = _SlowBackend(_list_vms_endpoint(hedge_after=0.2), latency=0.12)
+    client = ResilientClient(backend, hedge_workers=16)
+    try:
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda zone: client.post_json("list_vms", {"zone": zone}), range(50)))
+        elapsed = time.monotonic() - start
+    finally:
+        client.close()
+
+    assert [r["zone"] for r in results] == list(range(50))
+    stats = client.stats()["list_vms"]
+    assert stats["hedges"] == 0
+    assert backend.requests == 50
+    # Two waves of 32-way fan-out, not four waves of the hedge pool.
+    assert elapsed < 0.45
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    backend = _SlowBackend(_list_vms_endpoint(hedge_after=0.05), latency=0.02, slow_first=1.0)
+    client = ResilientClient(backend)
+    try:
+        start = time.monotonic()
+        assert client.post_json("list_vms", {"zone": "us-central1-a"}) == {"zone": "us-central1-a"}
+        elapsed = time.monotonic() - start
+    finally:
+        client.close()
+
+    stats = client.stats()["list_vms"]
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert elapsed < 0.5
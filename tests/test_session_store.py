@@ -0,0 +1,102 @@
+"""Read-your-writes, flush on close and reload of WriteBehindSqliteSessionService."""
+import asyncio
+import sqlite3
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from ..session_store import WriteBehindSqliteSessionService
+
+APP_NAME = "test_app"
+USER_ID = "user-1"
+
+
+def _event(i: int) -> Event:
+    return Event(
+        invocation_id=f"inv-{i}",
+        author="finops_optimization_agent",
+        content=types.Content(role="model", parts=[types.Part(text=f"step {i}")]),
+        actions=EventActions(state_delta={"task_status": f"step-{i}", "user:last_step": i, "app:turns": i + 1}),
+    )
+
+
+def _stored_events(db_path: str) -> int:
+    with sqlite3.connect(db_path) as db:
+        return db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+def _service(db_path: str) -> WriteBehindSqliteSessionService:
+    # A flush interval far beyond the test keeps every append buffered until
+    # flush() or close().
+    return WriteBehindSqliteSessionService(db_path, flush_interval=3600.0)
+
+
+def test_get_session_sees_events_before_they_are_flushed(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+
+    async def scenario():
+        service = _service(db_path)
+        try:
+            session = await service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id="s1")
+            appended = [await service.append_event(session, _event(i)) for i in range(3)]
+            assert _stored_events(db_path) == 0
+
+            loaded = await service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id="s1")
+            assert [e.id for e in loaded.events] == [e.id for e in appended]
+            assert loaded.state["task_status"] == "step-2"
+            assert loaded.state["user:last_step"] == 2
+            assert await service.get_user_state(app_name=APP_NAME, user_id=USER_ID) == {"last_step": 2}
+        finally:
+            await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_persists_buffered_events(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+
+    async def scenario():
+        service = _service(db_path)
+        session = await service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id="s1")
+        for i in range(5):
+            await service.append_event(session, _event(i))
+        assert _stored_events(db_path) == 0
+        await service.close()
+
+    asyncio.run(scenario())
+    assert _stored_events(db_path) == 5
+
+
+def test_reload_from_disk_matches_in_memory_state(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+
+    async def write():
+        service = _service(db_path)
+        try:
+            for session_id in ("s1", "s2"):
+                session = await service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id,
+                                                       state={"task_status": "idle"})
+                for i in range(4):
+                    await service.append_event(session, _event(i))
+            await service.flush()
+            session = await service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id="s1")
+            await service.append_event(session, _event(4))  # Left buffered until close().
+            return session
+        finally:
+            await service.close()
+
+    async def reload():
+        service = _service(db_path)
+        try:
+            return (await service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id="s1"),
+                    await service.list_sessions(app_name=APP_NAME, user_id=USER_ID))
+        finally:
+            await service.close()
+
+    in_memory = asyncio.run(write())
+    reloaded, listed = asyncio.run(reload())
+
+    assert reloaded.state == in_memory.state
+    assert [e.id for e in reloaded.events] == [e.id for e in in_memory.events]
+    assert [e.actions.state_delta for e in reloaded.events] == [e.actions.state_delta for e in in_memory.events]
+    assert sorted(s.id for s in listed.sessions) == ["s1", "s2"]
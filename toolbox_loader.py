@@ -0,0 +1,114 @@
+"""Background preload of the MCP logging toolset with retry, backoff and readiness.
+
+The toolset used to be loaded inside the first after-model callback, which
+added the load to a user turn. When the load failed, logging was disabled
+for the rest of the process. ``ToolsetLoader.start`` schedules the load on
+the interaction logger's event loop as soon as the agent starts. That same
+loop later runs every insert, so the ToolboxClient's pooled aiohttp
+connections are reused.
+
+Failed attempts retry with jittered exponential backoff. Once
+``max_attempts`` is used up the loader reports "failed", and the next
+``get_tools`` starts a fresh round of attempts, so logging recovers when the
+toolbox comes back.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ToolsetLoader:
+    """Loads a toolset once, in the background, on a given event loop.
+
+    Args:
+        load_fn: Async callable returning the loaded tools (truthy on success).
+        schedule_fn: Callable that runs a coroutine on the owning loop and
+            returns a concurrent.futures.Future (e.g. InteractionLogger.schedule).
+        max_attempts: Attempts per round before reporting "failed".
+        initial_backoff: Delay before the first retry, in seconds.
+        max_backoff: Upper bound for the delay between retries.
+    """
+
+    def __init__(self, load_fn, schedule_fn, max_attempts: int = 5,
+                 initial_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.load_fn = load_fn
+        self.schedule_fn = schedule_fn
+        self.max_attempts = max(1, max_attempts)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.tools = None
+        self.state = "idle"
+        self.attempts = 0
+        self.last_error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._future = None
+
+    def start(self):
+        """Schedules a load round unless one is running or the tools are loaded."""
+        with self._lock:
+            if self.state in ("loading", "ready"):
+                return self._future
+            self.state = "loading"
+            self._future = self.schedule_fn(self._load_with_retry())
+            return self._future
+
+    async def _load_with_retry(self):
+        backoff = self.initial_backoff
+        started = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            self.attempts += 1
+            try:
+                tools = await self.load_fn()
+                if not tools:
+                    raise RuntimeError("Toolset loading returned no tools.")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("[ToolsetLoader] Attempt %d/%d failed: %s", attempt, self.max_attempts, e)
+                if attempt == self.max_attempts:
+                    break
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self.tools = tools
+            self.load_seconds = time.monotonic() - started
+            with self._lock:
+                self.state = "ready"
+            self._ready.set()
+            logger.info("[ToolsetLoader] Toolset ready after %d attempt(s) in %.2fs", attempt, self.load_seconds)
+            return tools
+        with self._lock:
+            self.state = "failed"
+        return None
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Blocks (from any thread except the loader's loop) until ready or timeout."""
+        self.start()
+        return self._ready.wait(timeout)
+
+    async def get_tools(self):
+        """Awaitable from the owning loop: returns the tools or raises if this round failed."""
+        if self.tools is not None:
+            return self.tools
+        future = self.start()
+        tools = await asyncio.wrap_future(future)
+        if tools is None:
+            raise RuntimeError(f"MCP toolset unavailable: {self.last_error}")
+        return tools
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.is_ready(),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "load_seconds": self.load_seconds,
+        }
@@ -0,0 +1,119 @@
+"""Thread-safe TTL + LRU cache with hit/miss counters.
+
+Used under list_vm_instances so repeated reads of the same (project, zone)
+inside a conversation are served locally. Writers call ``invalidate`` after a
+successful mutation. A per-key generation counter stops an in-flight load
+that started before the invalidation from writing stale data back.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire ``ttl_seconds`` after being stored.
+
+    Args:
+        maxsize: Maximum number of entries; the least recently used is evicted.
+        ttl_seconds: Entry lifetime. 0 disables caching entirely.
+        clock: Monotonic time source, injectable for benchmarks.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.maxsize > 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def _get_locked(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value, generation=None):
+        """Stores ``value`` unless ``key`` was invalidated since ``generation`` was read."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and self._generations.get(key, 0) != generation:
+                return
+            self._data[key] = (self._clock() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self, key) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for ``key`` or calls ``loader()`` and caches its result.
+
+        Exceptions from ``loader`` propagate and nothing is cached.
+        """
+        if not self.enabled:
+            return loader()
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+        value = loader()
+        self.put(key, value, generation=generation)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._data):
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
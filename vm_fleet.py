@@ -0,0 +1,196 @@
+"""Fleet-wide VM operations that fan out over many (project, zone, instance) keys.
+
+The single-VM tools in agent.py cost one LLM turn and one serial HTTP call
+each. The helpers here take the whole work list in one tool call and issue
+the requests concurrently, bounded by a configurable concurrency limit.
+The per-call function is passed in so this module stays free of transport
+and agent imports.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_BATCH_DELETE_CONCURRENCY = int(os.getenv("BATCH_DELETE_MAX_CONCURRENCY", "16"))
+DEFAULT_INVENTORY_CONCURRENCY = int(os.getenv("INVENTORY_MAX_CONCURRENCY", "32"))
+
+# Zones scanned when the caller asks for "all" zones. Override with a
+# comma-separated GCE_ZONES value to match the zones your projects use.
+DEFAULT_GCE_ZONES = (
+    "us-central1-a", "us-central1-b", "us-central1-c", "us-central1-f",
+    "us-east1-b", "us-east1-c", "us-east1-d",
+    "us-east4-a", "us-east4-b", "us-east4-c",
+    "us-west1-a", "us-west1-b", "us-west1-c",
+    "europe-west1-b", "europe-west1-c", "europe-west1-d",
+    "europe-west4-a", "europe-west4-b", "europe-west4-c",
+    "asia-south1-a", "asia-south1-b", "asia-south1-c",
+    "asia-southeast1-a", "asia-southeast1-b", "asia-southeast1-c",
+)
+
+INVENTORY_COLUMNS = ("project_id", "zone", "instance_id", "name", "status", "machine_type")
+
+_REQUIRED_DELETE_FIELDS = ("project_id", "zone", "instance_id")
+
+
+def _normalize_delete_records(instances: list) -> tuple:
+    """Splits ``instances`` into unique (project, zone, instance) keys and per-record entries.
+
+    Returns:
+        ``(keys, entries, duplicates)``: the unique valid keys, one entry per
+        record in input order (its key, or an "invalid" result) with repeated
+        keys left out, and how many repeated keys were left out.
+    """
+    keys, entries, seen, duplicates = [], [], set(), 0
+    for record in instances or []:
+        if not isinstance(record, dict):
+            entries.append({"record": record, "status": "invalid", "error": "Record must be an object."})
+            continue
+        missing = [field for field in _REQUIRED_DELETE_FIELDS if not record.get(field)]
+        if missing:
+            entries.append({**record, "status": "invalid", "error": f"Missing fields: {', '.join(missing)}"})
+            continue
+        key = (str(record["project_id"]), str(record["zone"]), str(record["instance_id"]))
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        keys.append(key)
+        entries.append(key)
+    return keys, entries, duplicates
+
+
+def batch_delete(instances: list, delete_fn, max_concurrency: int = DEFAULT_BATCH_DELETE_CONCURRENCY) -> dict:
+    """Deletes many VMs concurrently and collects one result per instance.
+
+    Args:
+        instances: Records with ``project_id``, ``zone`` and ``instance_id``.
+            Duplicates are deleted once and reported once.
+        delete_fn: Callable ``(project_id, instance_id, zone)`` that deletes a
+            single VM, returning the API response or raising on failure.
+        max_concurrency: Maximum number of deletes in flight at once.
+
+    Returns:
+        A summary dict with counts (``requested`` counts every record,
+        ``duplicates`` the repeated ones that were skipped) and a
+        ``results`` list with one entry per unique or invalid record, in
+        input order.
+    """
+    keys, entries, duplicates = _normalize_delete_records(instances)
+    outcomes = {}
+    if keys:
+        workers = max(1, min(max_concurrency, len(keys)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-delete") as pool:
+            futures = {
+                pool.submit(delete_fn, project_id, instance_id, zone): (project_id, zone, instance_id)
+                for project_id, zone, instance_id in keys
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    outcomes[key] = {"status": "deleted", "response": future.result()}
+                except Exception as e:
+                    outcomes[key] = {"status": "failed", "error": str(e)}
+
+    results = [
+        {"project_id": entry[0], "zone": entry[1], "instance_id": entry[2], **outcomes[entry]}
+        if isinstance(entry, tuple) else entry
+        for entry in entries
+    ]
+    return {
+        "requested": len(instances or []),
+        "duplicates": duplicates,
+        "deleted": sum(1 for r in results if r["status"] == "deleted"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "invalid": sum(1 for r in results if r["status"] == "invalid"),
+        "results": results,
+    }
+
+
+def resolve_zones(zones: list) -> list:
+    """Expands an empty list or ["all"] into the configured zone list."""
+    requested = [z.strip() for z in zones or [] if z and z.strip()]
+    if not requested or any(z.lower() == "all" for z in requested):
+        configured = os.getenv("GCE_ZONES")
+        if configured:
+            return [z.strip() for z in configured.split(",") if z.strip()]
+        return list(DEFAULT_GCE_ZONES)
+    return list(dict.fromkeys(requested))
+
+
+def _instances_from_response(response) -> list:
+    # /list_vms has answered both with a bare list and with a wrapping object.
+    if response is None:
+        return []
+    if isinstance(response, list):
+        return response
+    if isinstance(response, dict):
+        for key in ("instances", "vms", "items", "result"):
+            if isinstance(response.get(key), list):
+                return response[key]
+    return []
+
+
+def _last_path_segment(value) -> str:
+    # machine_type may arrive as ".../zones/us-central1-a/machineTypes/e2-medium".
+    return str(value).rsplit("/", 1)[-1] if value else ""
+
+
+def normalize_instance(project_id: str, zone: str, instance) -> tuple:
+    """Maps one /list_vms instance onto a row ordered like ``INVENTORY_COLUMNS``."""
+    if not isinstance(instance, dict):
+        return (project_id, zone, "", str(instance), "", "")
+    return (
+        project_id,
+        _last_path_segment(instance.get("zone")) or zone,
+        str(instance.get("id") or instance.get("instance_id") or ""),
+        instance.get("name") or instance.get("instance_name") or "",
+        instance.get("status") or "",
+        _last_path_segment(instance.get("machine_type") or instance.get("machineType")),
+    )
+
+
+def collect_inventory(project_ids: list, zones: list, list_fn,
+                      max_concurrency: int = DEFAULT_INVENTORY_CONCURRENCY, on_rows=None) -> dict:
+    """Lists VMs across every (project, zone) pair concurrently.
+
+    Rows are merged into one table as each zone answers, so a slow zone
+    never holds back the others. A failing zone is reported in ``failures``
+    and does not fail the whole inventory.
+
+    Args:
+        project_ids: Projects to scan.
+        zones: Zones to scan; an empty list or ["all"] scans ``resolve_zones``.
+        list_fn: Callable ``(project_id, zone)`` returning the /list_vms JSON
+            or raising on failure.
+        max_concurrency: Maximum number of list calls in flight at once.
+        on_rows: Optional callback ``(project_id, zone, rows)`` invoked as soon
+            as a zone's rows are merged.
+
+    Returns:
+        A dict with ``columns``, ``rows`` (sorted by project, zone, name),
+        ``total``, ``zones_scanned`` and per-zone ``failures``.
+    """
+    projects = list(dict.fromkeys(p.strip() for p in project_ids or [] if p and p.strip()))
+    pairs = [(project_id, zone) for project_id in projects for zone in resolve_zones(zones)]
+    rows, failures = [], []
+    if pairs:
+        workers = max(1, min(max_concurrency, len(pairs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inventory") as pool:
+            futures = {pool.submit(list_fn, project_id, zone): (project_id, zone) for project_id, zone in pairs}
+            for future in as_completed(futures):
+                project_id, zone = futures[future]
+                try:
+                    zone_rows = [normalize_instance(project_id, zone, i) for i in _instances_from_response(future.result())]
+                except Exception as e:
+                    failures.append({"project_id": project_id, "zone": zone, "error": str(e)})
+                    continue
+                rows.extend(zone_rows)
+                if on_rows is not None:
+                    on_rows(project_id, zone, zone_rows)
+    rows.sort(key=lambda row: (row[0], row[1], row[3]))
+    failures.sort(key=lambda f: (f["project_id"], f["zone"]))
+    return {
+        "columns": list(INVENTORY_COLUMNS),
+        "rows": [list(row) for row in rows],
+        "total": len(rows),
+        "zones_scanned": len(pairs) - len(failures),
+        "failures": failures,
+    }